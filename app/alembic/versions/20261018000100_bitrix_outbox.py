@@ -0,0 +1,44 @@
+"""bitrix outbox
+
+Revision ID: 20261018000100
+Revises: 20251210000100
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018000100"
+down_revision: Union[str, None] = "20251210000100"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "bitrix_outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_bitrix_outbox_id"), "bitrix_outbox", ["id"], unique=False)
+    op.create_index(op.f("ix_bitrix_outbox_user_id"), "bitrix_outbox", ["user_id"], unique=False)
+    op.create_index(op.f("ix_bitrix_outbox_status"), "bitrix_outbox", ["status"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_bitrix_outbox_status"), table_name="bitrix_outbox")
+    op.drop_index(op.f("ix_bitrix_outbox_user_id"), table_name="bitrix_outbox")
+    op.drop_index(op.f("ix_bitrix_outbox_id"), table_name="bitrix_outbox")
+    op.drop_table("bitrix_outbox")
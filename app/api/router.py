@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, status
-from fastapi.responses import HTMLResponse
+import json
+import logging
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, Response, status
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
 from app.schema import FormCreate, FormDTO, UserCreate, UserDTO
 from app.schema.form import FormUpdate
-from app.schema.rag import Message
+from app.config.settings import settings
+from app.schema.rag import BatchMessage, Message
 from app.service.errors import UserAlreadyExists
-from app.service.ai import answer_user_message
+from app.service.ai import answer_batch, answer_user_message, stream_user_message
 from app.service.service import Service, get_service
+from app.utils.ai.scheduler import SchedulerRejected, UserQueueFull, get_scheduler
+from app.utils.metrics import metrics
+from app.utils.timing import server_timing, stage, start_timing
 
 router = APIRouter(prefix="/api", tags=["api"])
+logger = logging.getLogger(__name__)
 templates = Jinja2Templates(directory="app/templates")
 
 
@@ -154,7 +163,94 @@ async def web_form_submit(
 
 
 
+def _overloaded(exc: SchedulerRejected) -> HTTPException:
+    """503 при общей перегрузке, 429 — если лимит исчерпал конкретный пользователь."""
+    code = status.HTTP_503_SERVICE_UNAVAILABLE
+    if isinstance(exc, UserQueueFull):
+        code = status.HTTP_429_TOO_MANY_REQUESTS
+    return HTTPException(
+        status_code=code,
+        detail=exc.reason,
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
+
+
 @router.post("/answer")
-async def rag_answer(msg: Message):
-    reply = await answer_user_message(msg.text)
-    return {"answer": reply}
\ No newline at end of file
+async def rag_answer(msg: Message, response: Response):
+    timings = start_timing()
+    try:
+        with stage("total"):
+            reply = await answer_user_message(msg.text, msg.telegram_id)
+    except SchedulerRejected as exc:
+        raise _overloaded(exc) from exc
+    response.headers["Server-Timing"] = server_timing(timings)
+    return {"answer": reply}
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+async def _answer_events(msg: Message) -> AsyncIterator[str]:
+    try:
+        async for token in stream_user_message(msg.text, msg.telegram_id):
+            yield _sse({"token": token})
+    except SchedulerRejected as exc:
+        yield _sse({"detail": exc.reason, "retry_after": exc.retry_after}, event="error")
+        return
+    except Exception:
+        logger.exception("Ошибка потоковой генерации ответа")
+        yield _sse({"detail": "generation failed"}, event="error")
+        return
+    yield _sse({}, event="done")
+
+
+@router.post("/answer/stream")
+async def rag_answer_stream(msg: Message) -> StreamingResponse:
+    """Ответ ИИ в виде Server-Sent Events: токены по мере генерации."""
+    try:
+        get_scheduler().check_admission(msg.telegram_id)
+    except SchedulerRejected as exc:
+        raise _overloaded(exc) from exc
+    return StreamingResponse(
+        _answer_events(msg),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _batch_lines(questions: list[str]) -> AsyncIterator[str]:
+    try:
+        async for index, answer in answer_batch(questions):
+            if answer is None:
+                line = {"index": index, "question": questions[index], "error": "generation failed"}
+            else:
+                line = {"index": index, "question": questions[index], "answer": answer}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    except Exception:
+        logger.exception("Ошибка пакетной генерации ответов")
+        yield json.dumps({"error": "batch failed"}, ensure_ascii=False) + "\n"
+
+
+@router.post("/answer/batch")
+async def rag_answer_batch(batch: BatchMessage) -> StreamingResponse:
+    """Ответы на пачку вопросов в NDJSON: по строке на вопрос в порядке готовности."""
+    if len(batch.questions) > settings.AI_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Не больше {settings.AI_BATCH_MAX_QUESTIONS} вопросов в пачке",
+        )
+    return StreamingResponse(
+        _batch_lines(batch.questions),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """Метрики процесса в формате Prometheus"""
+    return metrics.render()
@@ -0,0 +1,187 @@
+"""
+Локальные заменители внешних сервисов для бенчмарков и тестов без сети.
+
+FakeOllama — HTTP-сервер с API Ollama (/api/chat, /api/embed, /api/version):
+ответ стримится NDJSON-чанками по токену, как у настоящей Ollama, с заданными
+задержкой до первого токена и скоростью генерации. Одновременно генерируется
+не больше parallel ответов (аналог OLLAMA_NUM_PARALLEL), остальные ждут.
+
+FakeCatalogSource — источник каталога с синтетическими листами и задержкой
+выгрузки, подставляется вместо Google Sheets.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Optional
+
+import numpy as np
+from aiohttp import web
+
+from app.benchmarks.ngram import make_catalog
+from app.utils.ai.catalog import CatalogSource
+from app.utils.ai.llm import CLASSIFY_SYSTEM_PROMPT
+
+PRODUCTS_SHEET = "Товары"
+PRODUCT_COLUMNS = ["Название", "Цена за шт в рублях", "Группа"]
+GENERAL_ROWS = [
+    ["О компании"],
+    ["Название", "ООО «Бытовая техника»"],
+    ["Год основания", "2009"],
+    ["Доставка"],
+    ["По городу", "бесплатно от 3000 руб., иначе 300 руб."],
+    ["По области", "от 500 руб., 1–3 дня"],
+    ["График работы"],
+    ["Будни", "9:00–20:00"],
+    ["Выходные", "10:00–18:00"],
+    ["Контакты"],
+    ["Телефон", "+7 800 000-00-00"],
+    ["Адрес", "г. Москва, ул. Примерная, 1"],
+    ["Гарантия и возврат"],
+    ["Гарантия", "12 месяцев на всю технику"],
+    ["Возврат", "14 дней при сохранении упаковки"],
+]
+# Слова общих вопросов — по ним фейковая модель отвечает "general" на классификацию
+GENERAL_STEMS = ("компан", "доставк", "график", "работ", "адрес", "телефон", "гаранти", "возврат", "основан")
+
+
+class FakeOllama:
+    """
+    Фейковый сервер Ollama на локальном порту.
+
+        async with FakeOllama(latency=0.05, token_rate=50) as ollama:
+            client = OllamaClient(ollama.url, "fake")
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        token_rate: float = 50.0,
+        answer_tokens: int = 12,
+        parallel: int = 4,
+        embedding_dim: int = 64,
+    ):
+        # latency — обработка промпта до первого токена, token_rate — токенов в секунду
+        self.latency = latency
+        self.token_rate = token_rate
+        self.answer_tokens = answer_tokens
+        self.parallel = parallel
+        self.embedding_dim = embedding_dim
+        self.requests: dict[str, int] = {"chat": 0, "classify": 0, "embed": 0}
+        self._slots = asyncio.Semaphore(parallel)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/api/version", self._version)
+        app.router.add_post("/api/chat", self._chat)
+        app.router.add_post("/api/embed", self._embed)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeOllama":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def _version(self, request: web.Request) -> web.Response:
+        return web.json_response({"version": "0.0.0-fake"})
+
+    def _reply(self, messages: list[dict]) -> list[str]:
+        """Токены ответа: слово-категория для классификации, иначе начало данных."""
+        if not messages:
+            return []
+        if messages[0].get("content") == CLASSIFY_SYSTEM_PROMPT:
+            self.requests["classify"] += 1
+            question = messages[-1].get("content", "").lower()
+            return ["general" if any(stem in question for stem in GENERAL_STEMS) else "product"]
+
+        self.requests["chat"] += 1
+        content = messages[-1].get("content", "")
+        data = content.split("\n\nВопрос:")[0].removeprefix("Данные:\n")
+        words = data.split() or ["не", "знаю"]
+        return [(" " if i else "") + words[i % len(words)] for i in range(self.answer_tokens)]
+
+    def _done(self, payload: dict, messages: list[dict], tokens: list[str], prompt_seconds: float, eval_seconds: float) -> dict:
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        return {
+            "model": payload.get("model", ""),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        messages = payload.get("messages", [])
+        tokens = self._reply(messages)
+        async with self._slots:
+            started = time.perf_counter()
+            await asyncio.sleep(self.latency)
+            prompt_seconds = time.perf_counter() - started
+
+            if not payload.get("stream", True):
+                await asyncio.sleep(len(tokens) / self.token_rate)
+                done = self._done(payload, messages, tokens, prompt_seconds, time.perf_counter() - started - prompt_seconds)
+                done["message"]["content"] = "".join(tokens)
+                return web.json_response(done)
+
+            resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await resp.prepare(request)
+            for token in tokens:
+                await asyncio.sleep(1 / self.token_rate)
+                chunk = {"model": payload.get("model", ""), "message": {"role": "assistant", "content": token}, "done": False}
+                await resp.write(json.dumps(chunk, ensure_ascii=False).encode() + b"\n")
+            done = self._done(payload, messages, tokens, prompt_seconds, time.perf_counter() - started - prompt_seconds)
+            await resp.write(json.dumps(done, ensure_ascii=False).encode() + b"\n")
+            await resp.write_eof()
+            return resp
+
+    async def _embed(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        texts = payload.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        self.requests["embed"] += 1
+        async with self._slots:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"model": payload.get("model", ""), "embeddings": [self._vector(t) for t in texts]})
+
+    def _vector(self, text: str) -> list[float]:
+        # Детерминированный вектор по тексту: одинаковые тексты — одинаковые эмбеддинги
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.embedding_dim).round(6).tolist()
+
+
+class FakeCatalogSource(CatalogSource):
+    """Синтетический каталог: лист товаров на products строк и лист общей информации."""
+
+    def __init__(self, products: int = 1000, latency: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.catalog = make_catalog(products, random.Random(seed))
+        self.fetches = 0
+
+    def fetch(self, doc: str, worksheet: str) -> list[list[str]]:
+        # Вызывается в потоке, как настоящая выгрузка, поэтому обычный sleep
+        time.sleep(self.latency)
+        self.fetches += 1
+        if worksheet == PRODUCTS_SHEET:
+            return [PRODUCT_COLUMNS] + [[str(p[c]) for c in PRODUCT_COLUMNS] for p in self.catalog]
+        return [row + [""] * (2 - len(row)) for row in GENERAL_ROWS]
@@ -0,0 +1,118 @@
+"""
+Бенчмарк триграммного индекса против полного прохода по каталогу.
+
+    python -m app.benchmarks.ngram --sizes 10000 100000 1000000 --queries 20
+
+Для каждого размера синтетического каталога печатает время построения,
+задержку поиска (p50/p95) обоими способами и recall@k индекса
+относительно полного прохода.
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Optional
+
+from app.utils.ai.filter import ProductMatcher
+
+KINDS = [
+    "чайник", "утюг", "пылесос", "сковорода", "кастрюля", "миксер", "блендер",
+    "тостер", "фен", "кофеварка", "мультиварка", "холодильник", "обогреватель",
+    "вентилятор", "увлажнитель", "соковыжималка", "мясорубка", "лампа", "весы", "плойка",
+]
+BRANDS = ["бош", "филипс", "самсунг", "тефаль", "редмонд", "поларис", "витек", "скарлетт", "браун", "мулинекс"]
+COLORS = ["белый", "черный", "серый", "красный", "синий", "зеленый"]
+GROUPS = ["Кухня", "Дом", "Климат", "Красота", "Свет"]
+TEMPLATES = ["сколько стоит {}", "есть ли {}", "цена на {}", "{}"]
+
+
+def make_catalog(size: int, rng: random.Random) -> list[dict]:
+    return [
+        {
+            "Название": f"{rng.choice(KINDS)} {rng.choice(BRANDS)} {rng.choice('ABCDEFGHKMPX')}{rng.randint(100, 9999)} {rng.choice(COLORS)}",
+            "Цена за шт в рублях": rng.randint(500, 50000),
+            "Группа": rng.choice(GROUPS),
+        }
+        for _ in range(size)
+    ]
+
+
+def make_questions(
+    catalog: list[dict], count: int, rng: random.Random, words: Optional[int] = 3
+) -> list[str]:
+    """Вопросы по первым words словам названия (None — по названию целиком), часть с опечаткой."""
+    questions = []
+    for product in rng.sample(catalog, count):
+        text = " ".join(product["Название"].split()[:words])
+        if rng.random() < 0.3:
+            # Опечатка: выкидываем букву
+            pos = rng.randrange(1, len(text))
+            text = text[:pos - 1] + text[pos:]
+        questions.append(rng.choice(TEMPLATES).format(text))
+    return questions
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(size: int, queries: int, limit: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    catalog = make_catalog(size, rng)
+    questions = make_questions(catalog, queries, rng)
+
+    started = time.perf_counter()
+    full = ProductMatcher(catalog, index_min_rows=size + 1)
+    full_build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = ProductMatcher(catalog, index_min_rows=0)
+    index_build = time.perf_counter() - started
+
+    full_times, index_times, recalls = [], [], []
+    for question in questions:
+        started = time.perf_counter()
+        expected = full.search(question, limit=limit)
+        full_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        got = indexed.search(question, limit=limit)
+        index_times.append(time.perf_counter() - started)
+
+        if expected:
+            got_ids = {id(p) for p in got}
+            recalls.append(sum(id(p) in got_ids for p in expected) / len(expected))
+
+    return {
+        "size": size,
+        "build_full_s": full_build,
+        "build_index_s": index_build,
+        "full_p50_ms": _percentile(full_times, 0.5) * 1000,
+        "full_p95_ms": _percentile(full_times, 0.95) * 1000,
+        "index_p50_ms": _percentile(index_times, 0.5) * 1000,
+        "index_p95_ms": _percentile(index_times, 0.95) * 1000,
+        "recall": statistics.mean(recalls) if recalls else 1.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'build full/idx, s':>18} {'full p50/p95, ms':>18} {'idx p50/p95, ms':>17} {'recall@' + str(args.limit):>9}")
+    for size in args.sizes:
+        r = run(size, args.queries, args.limit, args.seed)
+        print(
+            f"{r['size']:>9} {r['build_full_s']:>8.2f}/{r['build_index_s']:<9.2f}"
+            f" {r['full_p50_ms']:>8.1f}/{r['full_p95_ms']:<9.1f}"
+            f" {r['index_p50_ms']:>7.1f}/{r['index_p95_ms']:<9.1f} {r['recall']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
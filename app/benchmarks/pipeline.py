@@ -0,0 +1,250 @@
+"""
+Нагрузочный бенчмарк всего конвейера ответа (ask_questioin) без сети.
+
+    python -m app.benchmarks.pipeline --requests 500 --concurrency 16
+    python -m app.benchmarks.pipeline --save app/benchmarks/baseline_pipeline.json
+    python -m app.benchmarks.pipeline --baseline app/benchmarks/baseline_pipeline.json
+
+Ollama заменяется локальным FakeOllama (задержка и скорость генерации задаются
+флагами), Google Sheets — FakeCatalogSource. Вопросы — смесь простых вопросов
+о цене, сравнений товаров (идут в LLM) и общих вопросов о компании.
+Закрытая нагрузка: concurrency воркеров шлют вопросы подряд. Печатает
+p50/p95/p99 задержки, пропускную способность и задержку event loop; с --baseline
+завершается с кодом 1, если p95 или пропускная способность хуже базовой
+больше чем на --tolerance.
+
+Сеть не нужна, поэтому SHEET_DOC_ID и CHROMA_PERSIST_DIR, без которых не
+загружаются настройки, получают фиктивные значения, если не заданы; BOT_TOKEN
+берется из окружения или .env как обычно.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+# До импорта настроек: бенчмарк подменяет и таблицу, и каталог индекса
+os.environ.setdefault("SHEET_DOC_ID", "benchmark")
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.gettempdir())
+
+from app.benchmarks.fakes import FakeCatalogSource, FakeOllama
+from app.benchmarks.ngram import make_questions
+from app.config.settings import settings
+from app.utils.ai import engine, llm, sheets
+from app.utils.ai.answer_cache import AnswerCache
+from app.utils.ai.llm import OllamaClient
+from app.utils.ai.scheduler import LLMScheduler, SchedulerRejected
+
+GENERAL_QUESTIONS = [
+    "какой график работы",
+    "сколько стоит доставка по городу",
+    "какая гарантия на технику",
+    "какой адрес магазина",
+    "можно ли вернуть товар",
+    "какой у вас телефон",
+]
+COMPARE_TEMPLATE = "чем {} отличается от {}"
+# Метрики, по которым --baseline ищет регрессию: (ключ, больше — хуже)
+REGRESSION_KEYS = (("p95_ms", True), ("throughput_rps", False))
+
+
+def make_workload(catalog: list[dict], count: int, rng: random.Random, general: float, compare: float) -> list[str]:
+    """Вопросы в случайном порядке: доли general и compare, остальное — простые о товарах."""
+    n_general = int(count * general)
+    n_compare = int(count * compare)
+    # Полные названия: простой вопрос уверенно совпадает с одним товаром и отвечается шаблоном
+    simple = make_questions(catalog, count - n_general - n_compare, rng, words=None)
+    names = [" ".join(p["Название"].split()[:3]) for p in rng.sample(catalog, 2 * n_compare)]
+    questions = (
+        simple
+        + [rng.choice(GENERAL_QUESTIONS) + "?" * rng.randint(0, 3) for _ in range(n_general)]
+        + [COMPARE_TEMPLATE.format(a, b) for a, b in zip(names[::2], names[1::2])]
+    )
+    rng.shuffle(questions)
+    return questions
+
+
+class LoopLagMonitor:
+    """Задержка event loop: насколько позже заказанного просыпается sleep(interval)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+@asynccontextmanager
+async def fake_pipeline(
+    ollama: FakeOllama,
+    source: FakeCatalogSource,
+    llm_slots: int,
+    max_queue: int,
+    embedding_model: Optional[str] = None,
+) -> AsyncIterator[OllamaClient]:
+    """Подключает движок к фейковым Ollama и каталогу; по выходу возвращает все как было."""
+    saved = (sheets.sheet_cache, llm._client, engine.answer_cache, engine._product_index)
+    saved_settings = (settings.EMBEDDING_MODEL, settings.CHROMA_PERSIST_DIR)
+    client = OllamaClient(
+        ollama.url,
+        model="fake",
+        scheduler=LLMScheduler(max_concurrency=llm_slots, max_queue=max_queue, max_queue_per_user=max_queue),
+    )
+    with tempfile.TemporaryDirectory() as chroma:
+        sheets.sheet_cache = sheets.SheetSnapshotCache(source.fetch, ttl=settings.CACHE_TTL)
+        llm._client = client
+        # Кэш ответов выключен: меряем сам конвейер, а не попадания в кэш
+        engine.answer_cache = AnswerCache(max_size=0)
+        engine._product_index = None
+        settings.EMBEDDING_MODEL = embedding_model
+        settings.CHROMA_PERSIST_DIR = chroma
+        try:
+            yield client
+        finally:
+            await client.close()
+            sheets.sheet_cache, llm._client, engine.answer_cache, engine._product_index = saved
+            settings.EMBEDDING_MODEL, settings.CHROMA_PERSIST_DIR = saved_settings
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def drive(questions: list[str], concurrency: int) -> dict:
+    """Гоняет вопросы через ask_questioin в concurrency воркеров и собирает статистику."""
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for question in questions:
+        queue.put_nowait(question)
+    latencies: list[float] = []
+    counts = {"errors": 0, "rejected": 0}
+
+    async def worker() -> None:
+        while not queue.empty():
+            question = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await engine.ask_questioin(question)
+            except SchedulerRejected:
+                counts["rejected"] += 1
+                continue
+            except Exception:
+                counts["errors"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    return {
+        "requests": len(questions),
+        "completed": len(latencies),
+        **counts,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "loop_lag_p99_ms": round(_percentile(monitor.samples, 0.99) * 1000, 1),
+        "loop_lag_max_ms": round(max(monitor.samples, default=0.0) * 1000, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    source = FakeCatalogSource(args.products, latency=args.sheet_latency, seed=args.seed)
+    questions = make_workload(source.catalog, args.requests, rng, args.general, args.compare)
+    async with FakeOllama(
+        latency=args.latency, token_rate=args.token_rate, answer_tokens=args.answer_tokens, parallel=args.parallel,
+    ) as ollama:
+        async with fake_pipeline(ollama, source, args.llm_slots, args.max_queue, args.embedding_model):
+            # Первые запросы загружают листы и строят индексы — это в замер не идет
+            await drive(make_workload(source.catalog, args.warmup, rng, 0.5, 0.0), 1)
+            before = dict(ollama.requests)
+            report = await drive(questions, args.concurrency)
+        report["llm_calls"] = {k: v - before[k] for k, v in ollama.requests.items()}
+    report["config"] = {
+        k: getattr(args, k) for k in (
+            "products", "latency", "token_rate", "answer_tokens", "parallel",
+            "llm_slots", "general", "compare", "seed",
+        )
+    }
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии относительно базового отчета (пустой список — все в норме)."""
+    problems = []
+    for key, higher_is_worse in REGRESSION_KEYS:
+        base, value = baseline[key], report[key]
+        if not base:
+            continue
+        change = (value - base) / base if higher_is_worse else (base - value) / base
+        if change > tolerance:
+            problems.append(f"{key}: {value} против {base} в базовом отчете ({change:+.0%})")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--general-share", dest="general", type=float, default=0.2, help="доля общих вопросов о компании")
+    parser.add_argument("--compare-share", dest="compare", type=float, default=0.2, help="доля сравнений товаров (всегда LLM)")
+    parser.add_argument("--latency", type=float, default=0.05, help="до первого токена у фейковой Ollama, с")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="токенов в секунду")
+    parser.add_argument("--answer-tokens", type=int, default=12)
+    parser.add_argument("--parallel", type=int, default=4, help="одновременных генераций у фейковой Ollama")
+    parser.add_argument("--llm-slots", type=int, default=settings.LLM_MAX_CONCURRENCY)
+    parser.add_argument("--max-queue", type=int, default=1000)
+    parser.add_argument("--sheet-latency", type=float, default=0.2, help="выгрузка листа, с")
+    parser.add_argument("--embedding-model", default=None, help="включить векторный поиск через фейковый /api/embed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", type=Path, help="сохранить отчет как базовый")
+    parser.add_argument("--baseline", type=Path, help="сравнить с базовым отчетом")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save:
+        args.save.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n")
+    if args.baseline:
+        problems = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        for problem in problems:
+            print(f"РЕГРЕССИЯ {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Бенчмарк времени до первого токена (TTFT) у Ollama.
+
+    python -m app.benchmarks.ttft --host http://localhost:11434 --model llama3.2:3b --runs 10
+
+Сравнивает три сценария:
+  cold    — модель выгружена (keep_alive=0), первый запрос после простоя;
+  inline  — прежняя раскладка: инструкции и вопрос в одном сообщении пользователя,
+            поэтому префикс промпта разный у каждого запроса;
+  prefix  — фиксированный системный промпт + вопрос отдельным сообщением,
+            модель прогрета и удерживается keep_alive.
+Печатает p50/p95 TTFT и время обработки промпта по данным Ollama (prompt_eval_duration).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from app.utils.ai.llm import _answer_messages
+
+CONTEXT = "\n".join(
+    f"Чайник модель {i} — {1000 + 37 * i} руб. (Кухня)" for i in range(3)
+)
+QUESTIONS = [
+    "сколько стоит чайник модель 1",
+    "есть ли чайник модель 2",
+    "цена на чайник модель 0",
+    "почем чайник модель 2",
+]
+
+
+def _inline_messages(context: str, question: str) -> list[dict]:
+    # Дословно прежний _answer_prompt: инструкции, затем данные и вопрос — одним сообщением
+    prompt = f"""\
+    Ты — точный ассистент по товарам и бизнесу. Тебе даны только следующие данные:
+
+    {context}
+
+    Ответь **строго и только** на основе этих данных на вопрос: "{question}"
+
+    Правила:
+    - Если в данных есть точный ответ — выведи его кратко и без пояснений.
+    - Если данных недостаточно или ответа нет — ответь только: "Не знаю".
+    - Никогда не придумывай, не дополняй, не объясняй и не извиняйся.
+    - Не добавляй пунктуацию, кроме необходимой (например, точки в конце не ставь).
+    - Ответ должен быть **одним предложением или фразой**, максимум — коротким перечислением.
+
+    Ответ:"""
+    return [{"role": "user", "content": prompt}]
+
+
+async def _ttft(client: httpx.AsyncClient, model: str, messages: list[dict], keep_alive: str) -> tuple[float, float]:
+    """(секунды до первого токена, prompt_eval_duration в секундах)."""
+    payload = {"model": model, "messages": messages, "stream": True, "keep_alive": keep_alive,
+               "options": {"num_predict": 8}}
+    started = time.perf_counter()
+    first = None
+    prompt_eval = 0.0
+    async with client.stream("POST", "/api/chat", json=payload) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if first is None and chunk.get("message", {}).get("content"):
+                first = time.perf_counter() - started
+            if chunk.get("done"):
+                prompt_eval = chunk.get("prompt_eval_duration", 0) / 1e9
+    return (first if first is not None else time.perf_counter() - started), prompt_eval
+
+
+async def _unload(client: httpx.AsyncClient, model: str) -> None:
+    resp = await client.post("/api/chat", json={"model": model, "messages": [], "keep_alive": 0})
+    resp.raise_for_status()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(host: str, model: str, runs: int, keep_alive: str) -> dict[str, list[tuple[float, float]]]:
+    results: dict[str, list[tuple[float, float]]] = {"cold": [], "inline": [], "prefix": []}
+    async with httpx.AsyncClient(base_url=host, timeout=httpx.Timeout(600, connect=5)) as client:
+        for i in range(runs):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            await _unload(client, model)
+            results["cold"].append(await _ttft(client, model, _answer_messages(CONTEXT, question), keep_alive))
+
+        for i in range(runs):
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} #{i}"
+            results["inline"].append(await _ttft(client, model, _inline_messages(CONTEXT, question), keep_alive))
+
+        for i in range(runs):
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} #{i}"
+            results["prefix"].append(await _ttft(client, model, _answer_messages(CONTEXT, question), keep_alive))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="http://localhost:11434")
+    parser.add_argument("--model", default="llama3.2:3b")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--keep-alive", default="30m")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.host, args.model, args.runs, args.keep_alive))
+    print(f"{'scenario':>8} {'ttft p50/p95, ms':>20} {'prompt eval p50, ms':>20}")
+    for name, samples in results.items():
+        ttft = [s[0] for s in samples]
+        prompt = [s[1] for s in samples]
+        print(
+            f"{name:>8} {_percentile(ttft, 0.5) * 1000:>9.0f}/{_percentile(ttft, 0.95) * 1000:<10.0f}"
+            f" {_percentile(prompt, 0.5) * 1000:>20.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
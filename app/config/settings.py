@@ -30,6 +30,28 @@ class Settings(BaseSettings):
 
     # ========== Битрикс24 ==========
     BITRIX24_WEBHOOK_URL: Optional[str] = None
+    BITRIX24_TIMEOUT: float = 10.0
+    BITRIX24_CONNECT_TIMEOUT: float = 5.0
+    BITRIX24_MAX_CONNECTIONS: int = 10
+    # Сколько держать простаивающее соединение открытым, сек
+    BITRIX24_KEEPALIVE_EXPIRY: float = 30.0
+    # HTTP/2 требует пакет h2 (pip install "httpx[http2]"), без него — HTTP/1.1
+    BITRIX24_HTTP2: bool = False
+    # Операции с лидами копятся столько секунд (или до BATCH_SIZE штук) и уходят одним batch; 0 — без склейки
+    BITRIX24_BATCH_WINDOW: float = 0.05
+    BITRIX24_BATCH_SIZE: int = 50
+    # Лимит вебхука портала, запросов в секунду (при QUERY_LIMIT_EXCEEDED темп снижается сам); 0 — без лимита
+    BITRIX24_RATE_LIMIT: float = 2.0
+    BITRIX24_RATE_BURST: int = 2
+    # Outbox лидов: как часто проверять, сколько записей за проход, попытки и базовая пауза, сек
+    BITRIX24_OUTBOX_INTERVAL: float = 1.0
+    BITRIX24_OUTBOX_BATCH_SIZE: int = 50
+    BITRIX24_OUTBOX_MAX_ATTEMPTS: int = 10
+    BITRIX24_OUTBOX_BACKOFF: float = 5.0
+    # Правки формы подряд: в Bitrix уходит последняя, через столько секунд после нее,
+    # но не позже MAX_WAIT после первой неотправленной
+    BITRIX24_DEBOUNCE_SECONDS: float = 30.0
+    BITRIX24_DEBOUNCE_MAX_WAIT: float = 120.0
 
     # ========== Веб-приложение ==========
     WEBAPP_HOST: str = "0.0.0.0"
@@ -50,8 +72,58 @@ class Settings(BaseSettings):
     SHEET_DOC_ID: str = None
     CHROMA_PERSIST_DIR: str = None
     CACHE_TTL: int = 300
+    # Книга .xlsx или каталог с <лист>.csv/.xlsx/.parquet вместо Google Sheets
+    CATALOG_PATH: Optional[str] = None
 
     OLLAMA_HOST: str = "http://ollama:11434"
+    # Несколько серверов Ollama через запятую; если не задано — используется OLLAMA_HOST
+    OLLAMA_HOSTS: Optional[str] = None
+    # Проверка здоровья бэкендов и вывод из ротации после ошибок подряд
+    OLLAMA_PROBE_INTERVAL: float = 10.0
+    OLLAMA_EJECT_AFTER: int = 2
+    OLLAMA_EJECT_SECONDS: float = 30.0
+    OLLAMA_MODEL: str = "llama3.2:3b"
+    OLLAMA_TIMEOUT: float = 120.0
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_MAX_CONNECTIONS: int = 10
+    # Модель не выгружается между запросами; при старте API она прогревается
+    OLLAMA_KEEP_ALIVE: Optional[str] = "30m"
+    OLLAMA_WARMUP: bool = True
+
+    # Планировщик запросов к LLM: одновременные генерации (на один бэкенд), очередь и дедлайн запроса
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_MAX_QUEUE: int = 32
+    LLM_MAX_QUEUE_PER_USER: int = 3
+    AI_REQUEST_TIMEOUT: float = 300.0
+    # Пакетные ответы (/api/answer/batch): запросов к LLM разом и вопросов в пачке
+    AI_BATCH_CONCURRENCY: int = 2
+    AI_BATCH_MAX_QUESTIONS: int = 5000
+
+    # Семантический поиск по каталогу включается, если задана модель эмбеддингов
+    EMBEDDING_MODEL: Optional[str] = None
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_MIN_SCORE: float = 0.5
+
+    # Классификация и выборка данных для обеих категорий идут параллельно
+    AI_SPECULATIVE_RETRIEVAL: bool = True
+    # Бюджет токенов на контекст из листа общей информации и размер одного куска
+    AI_CONTEXT_TOKEN_BUDGET: int = 400
+    AI_CHUNK_TOKENS: int = 120
+    # Вопросы о цене/наличии одного товара отвечаются шаблоном без LLM
+    AI_FAST_PATH: bool = True
+    AI_FAST_PATH_MIN_SCORE: int = 90
+
+    # Кэш готовых ответов ИИ (ANSWER_CACHE_DB — путь к SQLite, если нужен между рестартами)
+    ANSWER_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_TTL: int = 3600
+    ANSWER_CACHE_SIMILARITY: int = 92
+    ANSWER_CACHE_DB: Optional[str] = None
+
+    @property
+    def ollama_hosts(self) -> list[str]:
+        if self.OLLAMA_HOSTS:
+            return [h.strip() for h in self.OLLAMA_HOSTS.split(",") if h.strip()]
+        return [self.OLLAMA_HOST]
 
     # Настройки для pydantic
     model_config = SettingsConfigDict(
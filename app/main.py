@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -6,6 +7,10 @@ from fastapi import FastAPI
 from app.api.router import router as api_router
 from app.db.asyncSession import init_db
 from app.config.settings import settings
+from app.utils.ai.answer_cache import answer_cache
+from app.utils.ai.llm import close_ollama_client, init_ollama_client, warm_up_ollama
+from app.service.outbox import start_outbox_worker, stop_outbox_worker
+from app.utils.bitrix import close_bitrix_client, init_bitrix_client
 
 import logging
 
@@ -20,7 +25,21 @@ logger.setLevel(logging.DEBUG)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    yield
+    await init_ollama_client(settings)
+    # Лиды уходят в Bitrix24 из outbox фоновым воркером, а не из запросов
+    start_outbox_worker(await init_bitrix_client(settings), settings)
+    await answer_cache.open()
+    # Прогрев идет в фоне: API принимает запросы, пока модель грузится
+    warmup = asyncio.create_task(warm_up_ollama()) if settings.OLLAMA_WARMUP else None
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+        await answer_cache.close()
+        await close_ollama_client()
+        await stop_outbox_worker()
+        await close_bitrix_client()
 
 
 app = FastAPI(title="Test API", version="0.1.0", lifespan=lifespan)
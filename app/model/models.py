@@ -7,6 +7,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Integer,
+    JSON,
     String,
 )
 from sqlalchemy.orm import declarative_base, relationship
@@ -51,6 +52,28 @@ class BitrixLead(Base):
         return f"<BitrixLead>(user_id={self.user_id}, lead_id={self.lead_id})"
 
 
+class BitrixOutbox(Base):
+    """Отложенные операции с лидами Bitrix24 (transactional outbox)"""
+    __tablename__ = 'bitrix_outbox'
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    # create — создать лид, если его еще нет; sync — создать или обновить
+    action = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+
+    # pending — ждет отправки, sending — забрана воркером, failed — попытки исчерпаны
+    status = Column(String, nullable=False, default='pending', index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<BitrixOutbox>(user_id={self.user_id}, action={self.action}, status={self.status})"
+
+
 
 class FormHistory(Base):
     """История заполнений"""
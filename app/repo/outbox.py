@@ -0,0 +1,124 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.model.models import BitrixOutbox
+from app.schema import BitrixOutboxCreate, BitrixOutboxDTO
+
+PENDING = "pending"
+SENDING = "sending"
+FAILED = "failed"
+# Еще не отправленные: ждут очереди или уже забраны воркером
+ACTIVE = (PENDING, SENDING)
+
+
+class OutboxRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def add(
+        self,
+        data: BitrixOutboxCreate,
+        next_attempt_at: Optional[datetime] = None,
+        created_at: Optional[datetime] = None,
+    ) -> BitrixOutboxDTO:
+        """created_at передается, когда запись заменяет более старые: отсчет max wait идет от первой."""
+        now = datetime.utcnow()
+        db_item = BitrixOutbox(
+            user_id=data.user_id,
+            action=data.action,
+            payload=data.payload,
+            status=PENDING,
+            attempts=0,
+            next_attempt_at=next_attempt_at or now,
+            created_at=created_at or now,
+        )
+        self.db.add(db_item)
+        await self.db.flush()
+        await self.db.refresh(db_item)
+        return BitrixOutboxDTO.from_orm(db_item)
+
+    async def has_pending(self, user_id: int, action: str) -> bool:
+        stmt = select(BitrixOutbox.id).where(
+            BitrixOutbox.user_id == user_id,
+            BitrixOutbox.action == action,
+            BitrixOutbox.status.in_(ACTIVE),
+        ).limit(1)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def supersede(self, user_id: int, action: str) -> Optional[datetime]:
+        """
+        Удаляет ждущие отправки записи пользователя с этим действием — их заменит
+        более свежая. Уже забранные воркером не трогаются.
+        Возвращает время создания самой старой удаленной записи (None — удалять было нечего).
+        """
+        condition = (
+            (BitrixOutbox.user_id == user_id)
+            & (BitrixOutbox.action == action)
+            & (BitrixOutbox.status == PENDING)
+        )
+        result = await self.db.execute(select(func.min(BitrixOutbox.created_at)).where(condition))
+        oldest = result.scalar_one_or_none()
+        if oldest is not None:
+            await self.db.execute(delete(BitrixOutbox).where(condition))
+        return oldest
+
+    async def claim_due(self, now: datetime, limit: int, lease_until: datetime) -> list[BitrixOutboxDTO]:
+        """
+        Забирает готовые к отправке записи: по одной самой ранней на пользователя,
+        чтобы операции одного лида шли строго по порядку.
+        Забранные записи помечаются sending и откладываются до lease_until —
+        если воркер упадет, их подберет следующий проход. В Postgres параллельные воркеры не пересекаются
+        (SKIP LOCKED).
+        """
+        heads = (
+            select(func.min(BitrixOutbox.id))
+            .where(BitrixOutbox.status.in_(ACTIVE))
+            .group_by(BitrixOutbox.user_id)
+        )
+        stmt = (
+            select(BitrixOutbox)
+            .where(BitrixOutbox.id.in_(heads), BitrixOutbox.next_attempt_at <= now)
+            .order_by(BitrixOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(stmt)
+        items = list(result.scalars())
+        for item in items:
+            item.status = SENDING
+            item.next_attempt_at = lease_until
+        await self.db.flush()
+        return [BitrixOutboxDTO.from_orm(item) for item in items]
+
+    async def extend_lease(self, item_ids: list[int], lease_until: datetime) -> None:
+        """Продлевает аренду записей, которые воркер еще отправляет."""
+        await self.db.execute(
+            update(BitrixOutbox)
+            .where(BitrixOutbox.id.in_(item_ids), BitrixOutbox.status == SENDING)
+            .values(next_attempt_at=lease_until)
+        )
+
+    async def delete(self, item_id: int) -> None:
+        await self.db.execute(delete(BitrixOutbox).where(BitrixOutbox.id == item_id))
+
+    async def reschedule(self, item_id: int, error: str, next_attempt_at: Optional[datetime]) -> None:
+        """Неудачная попытка: следующая в next_attempt_at, None — попытки исчерпаны."""
+        values = {
+            "attempts": BitrixOutbox.attempts + 1,
+            "last_error": error[:500],
+        }
+        if next_attempt_at is None:
+            values["status"] = FAILED
+        else:
+            values["status"] = PENDING
+            values["next_attempt_at"] = next_attempt_at
+        await self.db.execute(update(BitrixOutbox).where(BitrixOutbox.id == item_id).values(**values))
+
+    async def count_pending(self) -> int:
+        stmt = select(func.count(BitrixOutbox.id)).where(BitrixOutbox.status.in_(ACTIVE))
+        result = await self.db.execute(stmt)
+        return result.scalar_one() or 0
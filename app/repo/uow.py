@@ -8,6 +8,7 @@ from app.db.asyncSession import AsyncSessionLocal, get_async_db
 from app.repo.admin import AdminRepository
 from app.repo.bitrix import BitrixRepository
 from app.repo.form import FormRepository
+from app.repo.outbox import OutboxRepository
 from app.repo.user import UserRepository
 
 
@@ -51,6 +52,12 @@ class UnitOfWork:
             self._repositories["bitrix"] = BitrixRepository(self.db)
         return self._repositories["bitrix"]
 
+    @property
+    def outbox(self) -> OutboxRepository:
+        if "outbox" not in self._repositories:
+            self._repositories["outbox"] = OutboxRepository(self.db)
+        return self._repositories["outbox"]
+
     @property
     def admins(self) -> AdminRepository:
         if "admins" not in self._repositories:
@@ -1,11 +1,12 @@
 from .user import UserCreate, UserDTO, UserUpdate
 from .admin import AdminDto
 from .form import FormDTO, FormCreate
-from .bitrix import BitrixLeadDTO, BitrixLeadCreate
+from .bitrix import BitrixLeadDTO, BitrixLeadCreate, BitrixOutboxCreate, BitrixOutboxDTO
 
 __all__ = [
     "UserCreate", "UserUpdate", "UserDTO",
     "AdminDto",
     "FormCreate", "FormDTO",
     "BitrixLeadDTO", "BitrixLeadCreate",
+    "BitrixOutboxCreate", "BitrixOutboxDTO",
 ]
\ No newline at end of file
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Any, Optional
 
 from pydantic import BaseModel, Field
 
@@ -14,3 +15,20 @@ class BitrixLeadDTO(BitrixLeadCreate):
 
     class Config:
         from_attributes = True
+
+
+class BitrixOutboxCreate(BaseModel):
+    user_id: int = Field(..., gt=0)
+    action: str
+    payload: dict[str, Any]
+
+
+class BitrixOutboxDTO(BitrixOutboxCreate):
+    id: int
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -1,4 +1,11 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field
 
 class Message(BaseModel):
-    text: str
\ No newline at end of file
+    text: str
+    telegram_id: Optional[int] = None
+
+
+class BatchMessage(BaseModel):
+    questions: list[str] = Field(..., min_length=1)
@@ -1,4 +1,67 @@
-from app.utils.ai.engine import ask_questioin
+import contextvars
+from typing import AsyncIterator, Optional
 
-async def answer_user_message(text: str) -> str:
-    return await ask_questioin(text)
\ No newline at end of file
+from app.config.settings import settings
+from app.utils.ai.answer_cache import question_key
+from app.utils.ai.engine import ask_questioin, ask_questioin_stream, ask_questions_batch
+from app.utils.ai.scheduler import bind_request, request_deadline, request_user
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight, StreamFlight
+from app.utils.timing import bind_timings, current_timings
+
+# Одинаковые (после нормализации) вопросы в полете ждут один общий ответ
+_inflight = SingleFlight()
+# То же для потоковых ответов: токены одной генерации раздаются всем спросившим
+_streams = StreamFlight()
+
+COALESCED = metrics.counter(
+    "ai_coalesced_requests_total",
+    "Вопросы, которые дождались уже идущего ответа на такой же вопрос",
+)
+
+
+def _shared_context() -> contextvars.Context:
+    """
+    Контекст общего вызова — чистый, без переменных запроса, который его запустил.
+    Явно передаются только пользователь, за которым числится слот LLM (тот, кто спросил
+    первым), и дедлайн: у первого он самый ранний, то есть самый строгий из всех ждущих.
+    """
+    user, deadline, timings = request_user.get(), request_deadline.get(), current_timings()
+    context = contextvars.Context()
+    context.run(request_user.set, user)
+    context.run(request_deadline.set, deadline)
+    context.run(bind_timings, timings)
+    return context
+
+
+async def answer_user_message(text: str, telegram_id: Optional[int] = None) -> str:
+    bind_request(telegram_id, settings.AI_REQUEST_TIMEOUT)
+    key = question_key(text)
+    context = None
+    if key in _inflight:
+        COALESCED.inc()
+    else:
+        context = _shared_context()
+    return await _inflight.do(key, lambda: ask_questioin(text), context)
+
+
+async def stream_user_message(text: str, telegram_id: Optional[int] = None) -> AsyncIterator[str]:
+    bind_request(telegram_id, settings.AI_REQUEST_TIMEOUT)
+    key = question_key(text)
+    context = None
+    if key in _streams:
+        COALESCED.inc()
+    else:
+        context = _shared_context()
+    async for token in _streams.stream(key, lambda: ask_questioin_stream(text), context):
+        yield token
+
+
+# Пакетные вопросы стоят в планировщике LLM одной очередью и без дедлайна
+BATCH_USER = "batch"
+
+
+async def answer_batch(questions: list[str]) -> AsyncIterator[tuple[int, Optional[str]]]:
+    bind_request(BATCH_USER, None)
+    async for index, answer in ask_questions_batch(questions, settings.AI_BATCH_CONCURRENCY):
+        yield index, answer
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.asyncSession import AsyncSessionLocal
+from app.repo.uow import create_uow
+from app.schema import BitrixLeadCreate, BitrixLeadDTO, BitrixOutboxDTO
+from app.utils.bitrix import Bitrix24Client, BitrixClientError
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Действия outbox: create — только создать лид, если его нет; sync — создать или обновить
+CREATE = "create"
+SYNC = "sync"
+
+OUTBOX_RESULTS = metrics.counter(
+    "bitrix_outbox_total",
+    "Обработанные записи outbox Bitrix24 (sent — отправлено, retry — отложено, failed — попытки исчерпаны)",
+    labels=("result",),
+)
+
+
+class OutboxWorker:
+    """
+    Фоновая отправка лидов из таблицы bitrix_outbox в Bitrix24.
+
+    Проход: короткой транзакцией забрать готовые записи (по одной на пользователя),
+    вызвать Bitrix вне транзакции, второй транзакцией записать связку BitrixLead
+    и удалить запись. Ошибка Bitrix откладывает запись с экспоненциальной паузой.
+    Доставка «хотя бы один раз»: если упасть между ответом Bitrix и коммитом,
+    операция повторится.
+    """
+
+    def __init__(
+        self,
+        client: Bitrix24Client,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        interval: float = 1.0,
+        batch_size: int = 50,
+        max_attempts: int = 10,
+        backoff: float = 5.0,
+        max_backoff: float = 600.0,
+        lease: float = 60.0,
+    ):
+        self.client = client
+        self._session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # На сколько запись скрывается от других проходов; пока идет отправка,
+        # аренда продлевается каждую треть срока — ожидание лимитера и ретраи ее не съедят
+        self.lease = lease
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception:
+                logger.exception("Ошибка обработки outbox Bitrix24")
+                processed = 0
+            # Полная пачка — вероятно, есть еще: следующий проход сразу
+            if processed < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    async def drain_once(self) -> int:
+        """Один проход по outbox; возвращает число забранных записей."""
+        now = datetime.utcnow()
+        async with create_uow(self._session_factory) as uow:
+            items = await uow.outbox.claim_due(now, self.batch_size, now + timedelta(seconds=self.lease))
+            leads = {item.user_id: await uow.bitrix.get_by_user_id(item.user_id) for item in items}
+        if not items:
+            return 0
+
+        heartbeat = asyncio.create_task(self._keep_leases([item.id for item in items]))
+        try:
+            # Записи разных пользователей независимы
+            results = await asyncio.gather(
+                *(self._process(item, leads[item.user_id]) for item in items),
+                return_exceptions=True,
+            )
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                logger.error("Не удалось обработать запись outbox %s", item.id, exc_info=result)
+        return len(items)
+
+    async def _keep_leases(self, item_ids: list[int]) -> None:
+        """Пока пачка отправляется, не дает другим проходам забрать ее записи повторно."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with create_uow(self._session_factory) as uow:
+                    await uow.outbox.extend_lease(item_ids, datetime.utcnow() + timedelta(seconds=self.lease))
+            except Exception:
+                logger.exception("Не удалось продлить аренду записей outbox")
+
+    async def _send(self, item: BitrixOutboxDTO, lead: Optional[BitrixLeadDTO]) -> int:
+        if lead is None:
+            return await self.client.create_lead(item.payload)
+        if item.action == SYNC:
+            await self.client.update_lead(lead.lead_id, item.payload)
+        return lead.lead_id
+
+    async def _process(self, item: BitrixOutboxDTO, lead: Optional[BitrixLeadDTO]) -> None:
+        try:
+            lead_id = await self._send(item, lead)
+        except BitrixClientError as exc:
+            await self._retry(item, exc)
+            return
+
+        async with create_uow(self._session_factory) as uow:
+            if lead is None:
+                await uow.bitrix.create(BitrixLeadCreate(user_id=item.user_id, lead_id=lead_id))
+            await uow.outbox.delete(item.id)
+        OUTBOX_RESULTS.inc(result="sent")
+
+    async def _retry(self, item: BitrixOutboxDTO, exc: Exception) -> None:
+        attempt = item.attempts + 1
+        if attempt >= self.max_attempts:
+            next_attempt_at = None
+            logger.error("Лид пользователя %s не отправлен в Bitrix24 за %s попыток: %s", item.user_id, attempt, exc)
+            OUTBOX_RESULTS.inc(result="failed")
+        else:
+            delay = min(self.backoff * 2 ** item.attempts, self.max_backoff)
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning("Bitrix24 недоступен (попытка %s), повтор через %.0f с: %s", attempt, delay, exc)
+            OUTBOX_RESULTS.inc(result="retry")
+
+        async with create_uow(self._session_factory) as uow:
+            await uow.outbox.reschedule(item.id, str(exc), next_attempt_at)
+
+
+_worker: Optional[OutboxWorker] = None
+
+
+def start_outbox_worker(client: Optional[Bitrix24Client], settings: Any) -> Optional[OutboxWorker]:
+    """Запускает воркер при старте приложения; без клиента Bitrix24 отправлять некуда."""
+    global _worker
+    if _worker is None and client is not None:
+        _worker = OutboxWorker(
+            client,
+            interval=settings.BITRIX24_OUTBOX_INTERVAL,
+            batch_size=settings.BITRIX24_OUTBOX_BATCH_SIZE,
+            max_attempts=settings.BITRIX24_OUTBOX_MAX_ATTEMPTS,
+            backoff=settings.BITRIX24_OUTBOX_BACKOFF,
+        )
+        _worker.start()
+    return _worker
+
+
+async def stop_outbox_worker() -> None:
+    """Останавливает воркер; незавершенные записи останутся в outbox до следующего запуска."""
+    global _worker
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
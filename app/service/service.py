@@ -1,19 +1,22 @@
+from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends
 
 from app.repo.uow import UnitOfWork, get_uow
-from app.schema import BitrixLeadCreate, FormCreate, FormDTO, UserCreate, UserDTO
+from app.schema import BitrixOutboxCreate, FormCreate, FormDTO, UserCreate, UserDTO
 from app.schema.form import FormUpdate
 from app.service.errors import UserAlreadyExists
-from app.utils.bitrix import Bitrix24Client, BitrixClientError
+from app.service.outbox import CREATE, SYNC
+from app.utils.bitrix import Bitrix24Client, get_bitrix_client
 from app.config.settings import settings
 
 
 class Service:
-    def __init__(self, uow: UnitOfWork):
+    def __init__(self, uow: UnitOfWork, bitrix_client: Optional[Bitrix24Client] = None):
         self.uow = uow
-        self.bitrix_client = Bitrix24Client.from_settings(settings)
+        # Общий клиент из lifespan; None — синхронизация с Bitrix24 выключена
+        self.bitrix_client = bitrix_client
 
     async def get_user(self, telegram_id: int) -> Optional[UserDTO]:
         return await self.uow.users.get_by_telegram_id(telegram_id)
@@ -78,7 +81,8 @@ class Service:
 
     async def create_lead_on_start(self, telegram_id: int) -> Optional[int]:
         """
-        Создает лид в Bitrix24 при старте бота (только с TelegramID).
+        Ставит в outbox создание лида в Bitrix24 при старте бота (только с TelegramID).
+        Возвращает id уже существующего лида; новый создаст воркер outbox.
         Если клиент не сконфигурирован, просто пропускаем синхронизацию.
         """
         if not self.bitrix_client:
@@ -93,27 +97,27 @@ class Service:
         if existing_lead:
             return existing_lead.lead_id
 
-        # Создаем новый лид только с TelegramID
+        if await self.uow.outbox.has_pending(user.id, CREATE):
+            return None
+
+        # Лид только с TelegramID
         payload = {
             "TITLE": f"Лид: Telegram ID {telegram_id}",
             "COMMENTS": f"Telegram ID: {telegram_id}",
         }
+        await self.uow.outbox.add(BitrixOutboxCreate(user_id=user.id, action=CREATE, payload=payload))
+        return None
 
-        try:
-            lead_id = await self.bitrix_client.create_lead(payload)
-            await self.uow.bitrix.create(
-                BitrixLeadCreate(
-                    user_id=user.id,
-                    lead_id=lead_id,
-                )
-            )
-            return lead_id
-        except BitrixClientError:
-            return None
-
-    async def _sync_bitrix_lead(self, form: FormCreate) -> Optional[int]:
+    async def _sync_bitrix_lead(self, form: FormCreate) -> None:
         """
-        Создает или обновляет лид в Bitrix24 на основе последних данных формы.
+        Ставит в outbox создание или обновление лида в Bitrix24 по данным формы —
+        в той же транзакции, что и сама форма. В Bitrix ходит воркер outbox,
+        поэтому запрос не ждет Bitrix и не держит соединение с БД.
+
+        Повторные отправки формы подряд склеиваются: еще не отправленное обновление
+        заменяется новым, и в Bitrix уходит только последнее состояние — через
+        BITRIX24_DEBOUNCE_SECONDS после последней правки, но не позже
+        BITRIX24_DEBOUNCE_MAX_WAIT после первой. История форм при этом хранится целиком.
         Если клиент не сконфигурирован, просто пропускаем синхронизацию.
         """
         if not self.bitrix_client:
@@ -125,24 +129,17 @@ class Service:
             "PHONE": [{"VALUE": form.phone, "VALUE_TYPE": "WORK"}],
             "COMMENTS": f"Получено через бота: {form.via_bot}",
         }
-
-        existing_lead = await self.uow.bitrix.get_by_user_id(form.user_id)
-
-        try:
-            if existing_lead:
-                await self.bitrix_client.update_lead(existing_lead.lead_id, payload)
-                return existing_lead.lead_id
-
-            lead_id = await self.bitrix_client.create_lead(payload)
-            await self.uow.bitrix.create(
-                BitrixLeadCreate(
-                    user_id=form.user_id,
-                    lead_id=lead_id,
-                )
-            )
-            return lead_id
-        except BitrixClientError:
-            return None
+        now = datetime.utcnow()
+        send_at = now + timedelta(seconds=settings.BITRIX24_DEBOUNCE_SECONDS)
+        first_queued = await self.uow.outbox.supersede(form.user_id, SYNC)
+        if first_queued is not None:
+            send_at = min(send_at, max(now, first_queued + timedelta(seconds=settings.BITRIX24_DEBOUNCE_MAX_WAIT)))
+        await self.uow.outbox.add(
+            BitrixOutboxCreate(user_id=form.user_id, action=SYNC, payload=payload),
+            next_attempt_at=send_at,
+            # Новая запись наследует время первой: иначе каждая правка сдвигала бы предел max wait
+            created_at=first_queued,
+        )
 
     async def get_users_statistics(self) -> dict[str, int]:
         """Получить статистику пользователей"""
@@ -156,8 +153,12 @@ class Service:
         }
 
 
-async def get_service(uow: UnitOfWork = Depends(get_uow)) -> Service:
+async def get_service(
+    uow: UnitOfWork = Depends(get_uow),
+    bitrix_client: Optional[Bitrix24Client] = Depends(get_bitrix_client),
+) -> Service:
     """
-    FastAPI dependency для получения Service c активной транзакцией UnitOfWork.
+    FastAPI dependency для получения Service c активной транзакцией UnitOfWork
+    и общим клиентом Bitrix24.
     """
-    return Service(uow)
\ No newline at end of file
+    return Service(uow, bitrix_client)
\ No newline at end of file
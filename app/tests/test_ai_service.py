@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from unittest import mock
+
+import pytest
+
+from app.service import ai
+from app.utils.ai.scheduler import request_deadline, request_user
+
+_caller_tag: contextvars.ContextVar[str] = contextvars.ContextVar("caller_tag", default="")
+
+
+@pytest.mark.asyncio
+async def test_identical_questions_share_one_pipeline_run():
+    calls = []
+
+    async def ask(text: str) -> str:
+        calls.append(text)
+        await asyncio.sleep(0.02)
+        return f"ответ на {text}"
+
+    with mock.patch.object(ai, "ask_questioin", ask):
+        answers = await asyncio.gather(
+            *(ai.answer_user_message(q) for q in ["Где вы?", "где  вы", "ГДЕ ВЫ?!", "Сколько стоит чайник"])
+        )
+
+    assert len(calls) == 2
+    assert answers[0] == answers[1] == answers[2]
+    assert answers[3] == "ответ на Сколько стоит чайник"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_others():
+    async def ask(text: str) -> str:
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    with mock.patch.object(ai, "ask_questioin", ask):
+        first = asyncio.create_task(ai.answer_user_message("вопрос"))
+        second = asyncio.create_task(ai.answer_user_message("вопрос"))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "ok"
+
+
+@pytest.mark.asyncio
+async def test_identical_streams_share_one_generation():
+    calls = []
+    release = asyncio.Event()
+
+    async def ask_stream(text: str):
+        calls.append(text)
+        yield "чайник"
+        await release.wait()
+        yield " 1500"
+
+    async def collect(text: str, telegram_id: int) -> list[str]:
+        return [token async for token in ai.stream_user_message(text, telegram_id)]
+
+    with mock.patch.object(ai, "ask_questioin_stream", ask_stream):
+        first = asyncio.create_task(collect("Сколько стоит чайник?", 1))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # Второй подключается посреди генерации и получает ответ с начала
+        second = asyncio.create_task(collect("сколько стоит  чайник", 2))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await first == await second == ["чайник", " 1500"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_error_reaches_every_follower():
+    async def ask_stream(text: str):
+        yield "нач"
+        raise RuntimeError("ollama down")
+
+    async def collect(telegram_id: int) -> list[str]:
+        return [token async for token in ai.stream_user_message("вопрос", telegram_id)]
+
+    with mock.patch.object(ai, "ask_questioin_stream", ask_stream):
+        results = await asyncio.gather(collect(1), collect(2), return_exceptions=True)
+
+    assert [str(r) for r in results] == ["ollama down", "ollama down"]
+
+
+@pytest.mark.asyncio
+async def test_shared_call_runs_in_clean_context_with_explicit_user_and_deadline():
+    seen = []
+
+    async def ask(text: str) -> str:
+        seen.append((request_user.get(), request_deadline.get(), _caller_tag.get()))
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def call(telegram_id: int) -> tuple[str, float]:
+        _caller_tag.set(f"caller {telegram_id}")
+        answer = await ai.answer_user_message("вопрос", telegram_id)
+        return answer, request_deadline.get()
+
+    with mock.patch.object(ai, "ask_questioin", ask):
+        (_, first_deadline), (_, second_deadline) = await asyncio.gather(call(1), call(2))
+
+    # Слот числится за первым, дедлайн — самый ранний; прочее состояние запроса не протекает
+    assert seen == [(1, first_deadline, "")]
+    assert first_deadline <= second_deadline
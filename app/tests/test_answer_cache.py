@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import pytest
+
+from app.utils.ai.answer_cache import AnswerCache
+
+
+@pytest.mark.asyncio
+async def test_normalized_and_near_duplicate_questions_hit():
+    cache = AnswerCache(similarity=90)
+    await cache.set("Сколько стоит чайник?", "v1", "1500")
+
+    assert await cache.get("сколько  стоит ЧАЙНИК", "v1") == "1500"
+    assert await cache.get("скольо стоит чайник", "v1") == "1500"
+    assert await cache.get("сколько стоит утюг", "v1") is None
+
+
+@pytest.mark.asyncio
+async def test_numbers_must_match_for_near_duplicates():
+    cache = AnswerCache(similarity=80)
+    await cache.set("цена модели 1200", "v1", "100")
+
+    assert await cache.get("цена модели 1300", "v1") is None
+
+
+@pytest.mark.asyncio
+async def test_new_catalog_version_misses():
+    cache = AnswerCache()
+    await cache.set("где вы находитесь", "v1", "Москва")
+
+    assert await cache.get("где вы находитесь", "v2") is None
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl():
+    cache = AnswerCache(max_size=2, similarity=100)
+    await cache.set("a", "v1", "1")
+    await cache.set("b", "v1", "2")
+    await cache.get("a", "v1")
+    await cache.set("c", "v1", "3")
+
+    assert await cache.get("b", "v1") is None
+    assert await cache.get("a", "v1") == "1"
+
+    expired = AnswerCache(ttl=0)
+    await expired.set("a", "v1", "1")
+    assert await expired.get("a", "v1") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_persistence(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = AnswerCache(db_path=db_path)
+    await cache.open()
+    await cache.set("где вы находитесь", "v1", "Москва")
+    await cache.close()
+
+    restored = AnswerCache(db_path=db_path)
+    await restored.open()
+    try:
+        assert await restored.get("где вы находитесь", "v1") == "Москва"
+    finally:
+        await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_rows_are_deleted_on_eviction(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = AnswerCache(max_size=2, db_path=db_path)
+    await cache.open()
+    for i in range(5):
+        await cache.set(f"вопрос номер {i}", "v1", str(i))
+    await cache.close()
+
+    restored = AnswerCache(max_size=100, db_path=db_path)
+    await restored.open()
+    try:
+        assert len(restored) == 2
+        assert await restored.get("вопрос номер 0", "v1") is None
+        assert await restored.get("вопрос номер 4", "v1") == "4"
+    finally:
+        await restored.close()
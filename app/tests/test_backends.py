@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils.ai.backends import BackendPool, NoBackendAvailable
+from app.utils.ai.llm import OllamaClient
+
+HOSTS = ["http://a:11434", "http://b:11434"]
+
+
+class StubServers:
+    """Несколько фейковых серверов Ollama за одним MockTransport."""
+
+    def __init__(self):
+        self.down: set[str] = set()
+        # Хосты, до которых соединение не устанавливается за connect-таймаут
+        self.unreachable: set[str] = set()
+        self.slow: set[str] = set()
+        self.hits: dict[str, int] = {"a": 0, "b": 0}
+        self.delay = 0.0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        if host in self.unreachable:
+            raise httpx.ConnectTimeout("connect timed out", request=request)
+        if request.url.path == "/api/version":
+            return httpx.Response(200, json={"version": "stub"})
+        self.hits[host] += 1
+        if host in self.slow:
+            raise httpx.ReadTimeout("timed out", request=request)
+        await asyncio.sleep(self.delay)
+        body = {"message": {"role": "assistant", "content": host}, "done": True}
+        return httpx.Response(200, content=json.dumps(body).encode())
+
+
+@pytest.fixture()
+def servers() -> StubServers:
+    return StubServers()
+
+
+@pytest_asyncio.fixture()
+async def client(servers: StubServers):
+    client = OllamaClient(HOSTS, "m", transport=httpx.MockTransport(servers), eject_after=1, eject_seconds=60)
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_spread_by_outstanding(client: OllamaClient, servers: StubServers):
+    servers.delay = 0.02
+    answers = await asyncio.gather(*(client.chat([]) for _ in range(4)))
+
+    assert sorted(answers) == ["a", "a", "b", "b"]
+    assert all(b.outstanding == 0 for b in client.pool.backends)
+
+
+@pytest.mark.asyncio
+async def test_failed_backend_is_ejected_and_readmitted(client: OllamaClient, servers: StubServers):
+    servers.down.add("a")
+
+    # Запрос не падает: соединение с "a" не установилось, ответил "b"
+    assert await client.chat([]) == "b"
+    a, b = client.pool.backends
+    assert not a.healthy
+    assert await client.chat([]) == "b"
+    assert servers.hits["a"] == 0
+
+    servers.down.clear()
+    await client.pool.probe_all()
+    assert a.healthy
+    assert await client.chat([]) == "a"
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_fails_over_to_next_backend(client: OllamaClient, servers: StubServers):
+    servers.unreachable.add("a")
+
+    assert await client.chat([]) == "b"
+    chunks = [chunk async for chunk in client.stream_chat([])]
+    assert chunks[-1]["message"]["content"] == "b"
+    assert not client.pool.backends[0].healthy
+
+
+@pytest.mark.asyncio
+async def test_read_timeout_does_not_eject_backend(client: OllamaClient, servers: StubServers):
+    servers.slow.add("a")
+
+    # Долгая генерация — не повод выводить сервер из ротации
+    for _ in range(3):
+        with pytest.raises(httpx.ReadTimeout):
+            await client.chat([])
+    a, _ = client.pool.backends
+    assert a.healthy and a.failures == 0
+    assert servers.hits == {"a": 3, "b": 0}
+
+
+@pytest.mark.asyncio
+async def test_all_backends_down(client: OllamaClient, servers: StubServers):
+    servers.down.update({"a", "b"})
+
+    with pytest.raises(httpx.ConnectError):
+        await client.chat([])
+    with pytest.raises(NoBackendAvailable):
+        client.pool.pick()
+
+
+@pytest.mark.asyncio
+async def test_ejected_backend_gets_trial_request_after_timeout():
+    pool = BackendPool(["http://a:11434"], eject_after=1, eject_seconds=0)
+    try:
+        backend = pool.backends[0]
+        pool.mark_failure(backend)
+        assert not backend.healthy
+        assert pool.pick() is backend
+    finally:
+        await pool.close()
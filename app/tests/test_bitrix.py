@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+from app.utils.bitrix import Bitrix24Client, BitrixClientError, build_query
+from app.utils.ratelimit import AdaptiveRateLimiter
+
+
+@pytest.mark.asyncio
+async def test_requests_share_one_pooled_client():
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.path)
+        return httpx.Response(200, json={"result": 7})
+
+    client = Bitrix24Client("https://b24.example/rest/1/token/", transport=httpx.MockTransport(handler))
+    pool = client.client
+    try:
+        assert await client.create_lead({"TITLE": "a"}) == 7
+        await client.update_lead(7, {"TITLE": "b"})
+    finally:
+        await client.close()
+
+    assert client.client is pool and pool.is_closed
+    assert seen == ["/rest/1/token/crm.lead.add.json", "/rest/1/token/crm.lead.update.json"]
+
+
+@pytest.mark.asyncio
+async def test_retries_on_the_same_client_then_fails():
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503)
+
+    client = Bitrix24Client("https://b24.example/rest/", retries=3, backoff=0, transport=httpx.MockTransport(handler))
+    try:
+        with pytest.raises(BitrixClientError):
+            await client.create_lead({})
+    finally:
+        await client.close()
+
+    assert calls == 3
+
+
+@pytest.mark.asyncio
+async def test_http2_falls_back_without_h2(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+
+    # Без фолбэка httpx падает с ImportError при http2=True и отсутствующем h2
+    client = Bitrix24Client("https://b24.example/rest/", http2=True)
+    await client.close()
+
+
+def test_build_query_encodes_nested_fields_like_php():
+    query = build_query({"ID": 5, "fields": {"TITLE": "Лид & co", "PHONE": [{"VALUE": "+7 900", "VALUE_TYPE": "WORK"}]}})
+
+    assert parse_qsl(query) == [
+        ("ID", "5"),
+        ("fields[TITLE]", "Лид & co"),
+        ("fields[PHONE][0][VALUE]", "+7 900"),
+        ("fields[PHONE][0][VALUE_TYPE]", "WORK"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced_into_one_batch():
+    requests: list[tuple[str, dict]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append((request.url.path.rsplit("/", 1)[-1], body))
+        cmd = body["cmd"]
+        return httpx.Response(200, json={"result": {
+            "result": {key: 100 + int(key[1:]) for key, command in cmd.items() if "BAD" not in command},
+            "result_error": {key: {"error": "ERR", "error_description": "bad"} for key, command in cmd.items() if "BAD" in command},
+        }})
+
+    client = Bitrix24Client("https://b24.example/rest/", batch_window=0.01, transport=httpx.MockTransport(handler))
+    try:
+        results = await asyncio.gather(
+            client.create_lead({"TITLE": "a"}),
+            client.update_lead(7, {"TITLE": "b"}),
+            client.create_lead({"TITLE": "BAD"}),
+            return_exceptions=True,
+        )
+    finally:
+        await client.close()
+
+    assert [path for path, _ in requests] == ["batch.json"]
+    assert requests[0][1]["cmd"] == {
+        "c0": "crm.lead.add?fields[TITLE]=a",
+        "c1": "crm.lead.update?ID=7&fields[TITLE]=b",
+        "c2": "crm.lead.add?fields[TITLE]=BAD",
+    }
+    assert results[:2] == [100, None]
+    assert isinstance(results[2], BitrixClientError) and "ERR: bad" in str(results[2])
+
+
+@pytest.mark.asyncio
+async def test_batch_flushes_at_max_size_and_single_command_goes_direct():
+    paths: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path.rsplit("/", 1)[-1])
+        body = json.loads(request.content)
+        if "cmd" in body:
+            return httpx.Response(200, json={"result": {"result": {k: 1 for k in body["cmd"]}, "result_error": []}})
+        return httpx.Response(200, json={"result": 2})
+
+    client = Bitrix24Client(
+        "https://b24.example/rest/", batch_window=10, batch_size=2, transport=httpx.MockTransport(handler),
+    )
+    try:
+        pair = asyncio.gather(client.create_lead({}), client.create_lead({}))
+        assert await asyncio.wait_for(pair, 1) == [1, 1]  # не ждали окно в 10 с
+        single = asyncio.ensure_future(client.create_lead({}))
+        await asyncio.sleep(0)
+    finally:
+        await client.close()  # отправляет накопленное
+
+    assert single.result() == 2
+    assert paths == ["batch.json", "crm.lead.add.json"]
+
+
+@pytest.mark.asyncio
+async def test_throttling_slows_limiter_and_retries_without_backoff():
+    responses = [
+        httpx.Response(503, json={"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}),
+        httpx.Response(200, json={"result": 9}),
+    ]
+    limiter = AdaptiveRateLimiter(rate=100, burst=1)
+    client = Bitrix24Client(
+        "https://b24.example/rest/",
+        backoff=10,
+        limiter=limiter,
+        transport=httpx.MockTransport(lambda request: responses.pop(0)),
+    )
+    try:
+        # backoff=10 с не применяется: темп повтора задает лимитер
+        assert await asyncio.wait_for(client.create_lead({}), 1) == 9
+    finally:
+        await client.close()
+
+    assert limiter.rate == pytest.approx(50 + limiter.increase)
+
+
+@pytest.mark.asyncio
+async def test_throttled_command_inside_batch_slows_limiter():
+    def handler(request: httpx.Request) -> httpx.Response:
+        error = {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}
+        return httpx.Response(200, json={"result": {"result": {"a": 1}, "result_error": {"b": error}}})
+
+    limiter = AdaptiveRateLimiter(rate=100, burst=2)
+    client = Bitrix24Client("https://b24.example/rest/", limiter=limiter, transport=httpx.MockTransport(handler))
+    try:
+        results, errors = await client.batch({"a": ("crm.lead.add", {}), "b": ("crm.lead.add", {})})
+    finally:
+        await client.close()
+
+    assert results == {"a": 1}
+    assert errors == {"b": "QUERY_LIMIT_EXCEEDED: Too many requests"}
+    assert limiter.rate == pytest.approx(50)
+
+
+@pytest.mark.asyncio
+async def test_batch_accepts_list_shaped_results_for_numeric_keys():
+    def handler(request: httpx.Request) -> httpx.Response:
+        # json_encode в PHP: ключи 0..n-1 — список, а не объект
+        return httpx.Response(200, json={"result": {"result": [11, 12], "result_error": [{"error": "E", "error_description": "d"}]}})
+
+    client = Bitrix24Client("https://b24.example/rest/", transport=httpx.MockTransport(handler))
+    try:
+        results, errors = await client.batch({"0": ("crm.lead.add", {}), "1": ("crm.lead.add", {})})
+    finally:
+        await client.close()
+
+    assert results == {"0": 11, "1": 12}
+    assert errors == {"0": "E: d"}
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+from gspread.utils import numericise_all, to_records
+
+from app.utils.ai.catalog import LocalFileSource, read_xlsx
+from app.utils.ai.table import ProductTable
+
+VALUES = [
+    ["Название", "Цена за шт в рублях", "Группа"],
+    ["Чайник Bosch", "2500", "Кухня"],
+    ["Утюг Philips", "", "Дом"],
+    ["Тостер Redmond", "1999.5", "Кухня"],
+]
+
+
+def _write_xlsx(path: Path, sheet: str, rows: list[list[str]]) -> None:
+    cells = "".join(
+        f'<row r="{i + 1}">'
+        + "".join(
+            f'<c r="{chr(65 + j)}{i + 1}" t="inlineStr"><is><t>{v}</t></is></c>'
+            if not v.replace(".", "").isdigit() else f'<c r="{chr(65 + j)}{i + 1}"><v>{v}</v></c>'
+            for j, v in enumerate(row) if v
+        )
+        + "</row>"
+        for i, row in enumerate(rows)
+    )
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr(
+            "xl/workbook.xml",
+            f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+            f'<sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        )
+        z.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>',
+        )
+        z.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="{main}"><sheetData>{cells}</sheetData></worksheet>')
+
+
+def test_table_rows_match_records():
+    table = ProductTable.from_values(VALUES)
+    keys, *rows = VALUES
+    records = to_records(keys, [numericise_all(row) for row in rows])
+
+    assert len(table) == 3
+    assert [dict(row) for row in table] == records
+    assert table[0]["Цена за шт в рублях"] == 2500
+    assert table[1].get("Цена за шт в рублях") == ""
+    assert table[-1]["Название"] == "Тостер Redmond"
+
+
+def test_table_interns_repeated_strings():
+    rows = [VALUES[0]] + [["Чайник", "100", "Кухня"]] * 1000
+    table = ProductTable.from_values(rows)
+
+    assert table._columns["Группа"].labels == ("Кухня",)
+    assert table[0]["Группа"] is sys.intern("Кухня")
+    assert table.nbytes < 20_000
+
+
+def test_rows_compare_by_position():
+    table = ProductTable.from_values(VALUES)
+
+    assert table[0] == table[0] and table[0] != table[2]
+    assert table[0] in [table[2], table[0]]
+    assert table[0] == {"Название": "Чайник Bosch", "Цена за шт в рублях": 2500, "Группа": "Кухня"}
+
+
+def test_local_source_reads_csv_and_xlsx(tmp_path: Path):
+    (tmp_path / "Товары.csv").write_text(
+        "\n".join(",".join(row) for row in VALUES), encoding="utf-8"
+    )
+    _write_xlsx(tmp_path / "Общая информация о компании.xlsx", "Лист1", [["Адрес", "Москва"]])
+
+    source = LocalFileSource(str(tmp_path))
+    assert source.fetch("", "Товары") == VALUES
+    assert source.fetch("", "Общая информация о компании") == [["Адрес", "Москва"]]
+    with pytest.raises(FileNotFoundError):
+        source.fetch("", "Нет такого")
+
+
+def test_read_xlsx_pads_gaps(tmp_path: Path):
+    path = tmp_path / "book.xlsx"
+    _write_xlsx(path, "Товары", [VALUES[0], ["Утюг", "", "Дом"], [], ["Фен", "10", ""]])
+
+    assert read_xlsx(path, "Товары") == [
+        VALUES[0],
+        ["Утюг", "", "Дом"],
+        ["", "", ""],
+        ["Фен", "10", ""],
+    ]
+    with pytest.raises(KeyError):
+        read_xlsx(path, "Другой")
@@ -0,0 +1,59 @@
+from app.utils.ai.chunks import ChunkIndex, estimate_tokens, split_rows
+
+SHEET = [
+    ["Контакты", ""],
+    ["Адрес", "г. Москва, ул. Ленина, 1"],
+    ["Телефон", "+7 495 000-00-00"],
+    ["Доставка", ""],
+    ["Стоимость доставки", "500 руб. по городу"],
+    ["Срок доставки", "1-2 дня"],
+    ["Оплата", ""],
+    ["Способы оплаты", "наличные, карта"],
+]
+
+
+def test_split_rows_keeps_section_heading():
+    chunks = split_rows(SHEET)
+
+    assert [c.text.split("\n")[0] for c in chunks] == ["Контакты", "Доставка", "Оплата"]
+    assert "Адрес: г. Москва, ул. Ленина, 1" in chunks[0].text
+
+
+def test_split_rows_keeps_consecutive_single_cell_lines():
+    rows = [
+        ["Мы работаем с 2009 года", ""],
+        ["Доставляем по всей России", ""],
+        ["Принимаем карты и наличные", ""],
+        ["Адрес", "Москва"],
+    ]
+    chunks = split_rows(rows)
+
+    assert [c.text for c in chunks] == [
+        "Мы работаем с 2009 года\nДоставляем по всей России",
+        "Принимаем карты и наличные\nАдрес: Москва",
+    ]
+
+
+def test_split_rows_respects_chunk_size():
+    rows = [["Пункт", "x" * 60] for _ in range(10)]
+    chunks = split_rows(rows, max_tokens=50)
+
+    assert len(chunks) > 1
+    assert all(c.tokens <= 50 for c in chunks)
+
+
+def test_select_returns_relevant_chunk_only():
+    index = ChunkIndex.from_values(SHEET)
+    context = index.select("сколько стоит доставку заказать", token_budget=400)
+
+    assert "Срок доставки" in context
+    assert "Телефон" not in context
+
+
+def test_select_respects_budget_and_falls_back_to_sheet_start():
+    index = ChunkIndex.from_values(SHEET)
+    budget = index.chunks[0].tokens
+    context = index.select("расскажите что-нибудь", token_budget=budget)
+
+    assert context == index.chunks[0].text
+    assert estimate_tokens(context) <= budget
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+
+from app.utils.ai import classifier
+from app.utils.ai.classifier import LexiconClassifier, classify_question, normalize_category
+
+PRODUCTS = [
+    {"Название": "Чайник электрический", "Группа": "Кухня"},
+    {"Название": "Утюг паровой", "Группа": "Дом"},
+    {"Название": "Часы настенные", "Группа": "Дом"},
+    {"Название": "Тележка магазинная", "Группа": "Склад"},
+]
+
+
+@pytest.fixture()
+def local() -> LexiconClassifier:
+    return LexiconClassifier.from_products(PRODUCTS)
+
+
+def test_predicts_confident_categories(local: LexiconClassifier):
+    assert local.predict("Сколько стоит чайник?")[0] == "product"
+    assert local.predict("утюг паровой")[0] == "product"
+    assert local.predict("Где вы находитесь?")[0] == "general"
+    assert local.predict("какой у вас режим работы")[0] == "general"
+
+
+@pytest.mark.parametrize("question", [
+    "сколько стоят часы",
+    "сколько стоят часы настенные",
+    "есть ли часы",
+    "цена тележка магазинная",
+])
+def test_product_words_resembling_general_stems_stay_product(local: LexiconClassifier, question: str):
+    assert local.predict(question)[0] == "product"
+
+
+@pytest.mark.parametrize("question", [
+    "во сколько работает магазин",
+    "где вы",
+    "часы работы в выходные",
+])
+def test_general_whole_words_still_count(local: LexiconClassifier, question: str):
+    assert local.predict(question)[0] != "product"
+
+
+def test_unknown_question_is_not_confident(local: LexiconClassifier):
+    assert local.predict("привет") == (None, 0.0)
+
+
+@pytest.mark.parametrize("answer", ["general", "General.", " general\n"])
+def test_normalize_category(answer: str):
+    assert normalize_category(answer) == "general"
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_llm_when_not_confident(local: LexiconClassifier):
+    llm = mock.AsyncMock(return_value="Product.")
+    with mock.patch.object(classifier, "classify_question_ollama", llm):
+        before = classifier.CLASSIFICATIONS.total(source="llm")
+
+        assert await classify_question("сколько стоит чайник", local) == "product"
+        llm.assert_not_awaited()
+
+        assert await classify_question("привет", local) == "product"
+        llm.assert_awaited_once()
+        assert classifier.CLASSIFICATIONS.total(source="llm") == before + 1
+        assert 0 < classifier.fallback_rate() <= 1
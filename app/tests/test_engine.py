@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.utils.ai import engine
+
+
+@pytest.fixture()
+def pipeline(monkeypatch: pytest.MonkeyPatch) -> dict:
+    # events — порядок начала и конца шагов: по нему видно, что шло параллельно
+    state = {"cancelled": [], "events": []}
+
+    async def classify(msg: str) -> str:
+        state["events"].append("classify start")
+        await asyncio.sleep(0.03)
+        state["events"].append("classify end")
+        return "product"
+
+    def branch(name: str):
+        async def build(msg: str):
+            state["events"].append(f"{name} start")
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                state["cancelled"].append(name)
+                raise
+            state["events"].append(f"{name} end")
+            return f"{name} context", None
+        return build
+
+    monkeypatch.setattr(engine, "_classify", classify)
+    monkeypatch.setattr(engine, "_CONTEXT_BUILDERS", {"general": branch("general"), "product": branch("product")})
+    return state
+
+
+@pytest.mark.asyncio
+async def test_speculative_runs_branches_concurrently(pipeline: dict, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(engine.settings, "AI_SPECULATIVE_RETRIEVAL", True)
+
+    data, answer = await engine._build_context("сколько стоит чайник")
+
+    assert (data, answer) == ("product context", None)
+    events = pipeline["events"]
+    # Обе ветки стартуют, не дожидаясь классификации
+    assert events.index("product start") < events.index("classify end")
+    assert events.index("general start") < events.index("classify end")
+    await asyncio.sleep(0)
+    assert pipeline["cancelled"] == ["general"]
+    assert "general end" not in events
+
+
+@pytest.mark.asyncio
+async def test_sequential_mode(pipeline: dict, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(engine.settings, "AI_SPECULATIVE_RETRIEVAL", False)
+
+    data, _ = await engine._build_context("сколько стоит чайник")
+
+    assert data == "product context"
+    assert pipeline["events"] == ["classify start", "classify end", "product start", "product end"]
+    assert pipeline["cancelled"] == []
+
+
+@pytest.mark.asyncio
+async def test_batch_answers_stream_as_ready(monkeypatch: pytest.MonkeyPatch):
+    from app.utils.ai.answer_cache import AnswerCache
+    from app.utils.ai.sheets import SheetSnapshot
+
+    snapshots = {
+        engine.PRODUCTS_SHEET: SheetSnapshot([
+            ["Название", "Цена за шт в рублях", "Группа"],
+            ["Чайник Bosch", "2500", "Кухня"],
+            ["Утюг Philips", "3100", "Дом"],
+        ]),
+        engine.GENERAL_SHEET: SheetSnapshot([["Адрес", "Москва"], ["Телефон", "123"]]),
+    }
+    cache = AnswerCache()
+    active = peak = 0
+
+    async def snapshot(url: str, sheet: str):
+        return snapshots[sheet]
+
+    async def classify(msg: str, local=None) -> str:
+        return "general" if "адрес" in msg else "product"
+
+    async def generate(context: str, msg: str) -> str:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.05)
+        active -= 1
+        return f"ответ: {context.splitlines()[0]}"
+
+    monkeypatch.setattr(engine, "get_sheet_snapshot", snapshot)
+    monkeypatch.setattr(engine, "classify_question", classify)
+    monkeypatch.setattr(engine, "generate_answer_ollama", generate)
+    monkeypatch.setattr(engine, "answer_cache", cache)
+
+    questions = ["чайник bosch", "утюг philips", "какой адрес", "вертолет", "чайник", "утюг"]
+    await cache.set("утюг", await engine.catalog_version(), "из кэша")
+
+    results = [r async for r in engine.ask_questions_batch(questions, concurrency=2)]
+
+    answers = dict(results)
+    assert sorted(answers) == list(range(len(questions)))
+    assert results[0] == (5, "из кэша")
+    assert answers[3] == engine.NOT_FOUND_ANSWER
+    assert answers[2] == "ответ: Адрес: Москва"
+    assert answers[0].startswith("ответ: Чайник Bosch")
+    # 4 генерации идут по две одновременно, но не больше concurrency
+    assert peak == 2
+    assert await cache.get("какой адрес", await engine.catalog_version()) == answers[2]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_merges_fuzzy_and_semantic_by_score(monkeypatch: pytest.MonkeyPatch):
+    products = [{"Название": name} for name in ["Чайник", "Чайник белый", "Чайник черный", "Термопот"]]
+
+    def fuzzy(products: list[dict], msgs: list[str], limit: int = 3) -> list[list[tuple[int, float]]]:
+        return [[(0, 90.0), (1, 80.0), (2, 70.0)]]
+
+    async def semantic(products: list[dict], msgs: list[str], limit: int) -> list[list[tuple[int, float]]]:
+        return [[(3, 0.85), (2, 0.75)]]
+
+    monkeypatch.setattr(engine, "score_products_many", fuzzy)
+    monkeypatch.setattr(engine, "_semantic_products_many", semantic)
+
+    found = await engine._retrieve_products_many(products, ["чайник"], limit=3)
+
+    # Семантическое совпадение с оценкой выше нечетких не вытесняется ими
+    assert [p["Название"] for p in found[0]] == ["Чайник", "Термопот", "Чайник белый"]
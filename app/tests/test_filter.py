@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from app.utils.ai.filter import ProductMatcher, filter_products, get_matcher, product_score
+
+PRODUCTS = [
+    {"Название": "Чайник электрический", "Группа": "Кухня"},
+    {"Название": "Утюг", "Группа": "Дом"},
+    {"Название": "Чайник заварочный", "Группа": "Кухня"},
+    {"Название": "Чайник", "Группа": "Посуда"},
+]
+
+
+def _full_scan(products: list[dict], question: str, limit: int = 3, threshold: int = 50) -> list[dict]:
+    scored = [(product_score(p, question), p) for p in products]
+    scored = [x for x in scored if x[0] >= threshold]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [p for _, p in scored[:limit]]
+
+
+def test_search_matches_full_scan_including_ties():
+    for question in ["сколько стоит чайник?", "утюг", "кухня", "пылесос"]:
+        for limit in (1, 2, 3):
+            assert filter_products(PRODUCTS, question, limit=limit) == _full_scan(PRODUCTS, question, limit=limit)
+
+
+def test_matcher_is_reused_per_catalog():
+    matcher = get_matcher(PRODUCTS)
+    assert get_matcher(PRODUCTS) is matcher
+
+    changed = PRODUCTS[:3] + [{"Название": "Пылесос", "Группа": "Дом"}]
+    assert get_matcher(changed) is matcher
+    assert matcher.search("пылесос", limit=1) == [changed[3]]
+
+
+def test_trigram_candidates_rerank_like_full_scan():
+    matcher = ProductMatcher(PRODUCTS, index_min_rows=0)
+    assert matcher.index is not None
+
+    for question in ["сколько стоит чайник?", "утюг"]:
+        assert matcher.search(question) == _full_scan(PRODUCTS, question)
+
+
+def test_incremental_update_reindexes_changed_rows():
+    matcher = ProductMatcher(PRODUCTS, index_min_rows=0)
+    changed = [PRODUCTS[0], {"Название": "Пылесос", "Группа": "Дом"}]
+
+    matcher.update(changed)
+
+    assert matcher.search("утюг") == []
+    assert matcher.search("пылесос") == [changed[1]]
+    assert len(matcher.index) == 2
+
+
+def test_empty_catalog():
+    assert ProductMatcher([]).search("чайник") == []
+
+
+def test_snapshot_diff_update_matches_fresh_build():
+    from app.utils.ai.sheets import SheetSnapshot
+
+    header = [["Название", "Группа"]]
+    rows = [[p["Название"], p["Группа"]] for p in PRODUCTS]
+    old = SheetSnapshot(header + rows)
+    # Вставка в середину сдвигает строки: они переезжают без переиндексации
+    new = SheetSnapshot(header + rows[:1] + [["Пылесос", "Дом"]] + rows[1:2] + [["Чайник", "Склад"]])
+    new.changes = new.diff(old)
+
+    matcher = ProductMatcher(old.table, index_min_rows=0)
+    indexed = len(matcher.index._alive)
+    matcher.update(new.table)
+
+    fresh = ProductMatcher(new.table, index_min_rows=0)
+    assert matcher.choices == fresh.choices
+    assert len(matcher.index._alive) - indexed == 2
+    for question in ["пылесос", "утюг", "чайник заварочный", "чайник"]:
+        assert matcher.search(question) == fresh.search(question)
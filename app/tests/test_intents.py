@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+
+from app.utils.ai.intents import AVAILABILITY, FAST_PATH, PRICE, fast_answer, parse_question
+
+KETTLE = {"Название": "Чайник Bosch TWK", "Цена за шт в рублях": 2500, "Группа": "Кухня"}
+IRON = {"Название": "Утюг Philips", "Цена за шт в рублях": 3100, "Группа": "Дом"}
+KETTLE_2 = {"Название": "Чайник Bosch TWK 2", "Цена за шт в рублях": 2700, "Группа": "Кухня"}
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("Сколько стоит чайник Bosch?", (PRICE, "чайник bosch")),
+        ("сколько весит чайник", (None, "весит чайник")),
+        ("сколько рублей утюг", (PRICE, "утюг")),
+        ("подскажите, пожалуйста, цену на утюг", (PRICE, "утюг")),
+        ("есть ли у вас утюг philips", (AVAILABILITY, "утюг philips")),
+        ("есть ли утюг и сколько стоит", (PRICE, "утюг")),
+        ("чем отличается чайник от термопота", (None, "")),
+        ("какой чайник лучше", (None, "")),
+        ("сколько стоит чемодан", (PRICE, "чемодан")),
+        ("есть ли кастрюля", (AVAILABILITY, "кастрюля")),
+    ],
+)
+def test_parse_question(question: str, expected: tuple):
+    assert parse_question(question) == expected
+
+
+def test_price_answer_from_row():
+    assert fast_answer("сколько стоит чайник bosch twk", [KETTLE, IRON]) == "чайник bosch twk — 2500 руб."
+    assert fast_answer("есть ли утюг philips?", [{**IRON, "Наличие": "да"}, KETTLE]) == "да, утюг philips есть, 3100 руб."
+
+
+def test_availability_without_stock_column_does_not_claim_stock():
+    # Колонки наличия нет: отвечаем ценой, а не "да, есть"
+    assert fast_answer("есть ли утюг philips?", [IRON, KETTLE]) == "утюг philips — 3100 руб."
+    # Ни наличия, ни цены — шаблону нечего сказать, отвечает LLM
+    assert fast_answer("есть ли фен", [{"Название": "Фен", "Цена за шт в рублях": ""}]) is None
+
+
+def test_out_of_stock_and_missing_price():
+    row = {"Название": "Фен", "Цена за шт в рублях": "", "Наличие": "нет"}
+    assert fast_answer("есть ли фен", [row]) == "фен сейчас нет в наличии"
+    row["Наличие"] = "да"
+    assert fast_answer("почем фен", [row]) == "цена на фен не указана"
+
+
+def test_falls_back_to_llm_when_unsure():
+    before = FAST_PATH.value(result="ambiguous")
+
+    # Два почти одинаковых товара — выбирать между ними должна LLM
+    assert fast_answer("сколько стоит чайник bosch", [KETTLE, KETTLE_2]) is None
+    assert fast_answer("сколько стоит чайник xiaomi", [KETTLE]) is None
+    assert fast_answer("какой чайник посоветуете", [KETTLE]) is None
+    assert FAST_PATH.value(result="ambiguous") == before + 2
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "сколько весит чайник bosch twk",
+        "есть ли гарантия на чайник bosch twk",
+        "есть ли чехол для утюг philips",
+        "сколько стоит чайник",
+    ],
+)
+def test_no_template_answer_for_other_questions_about_product(question: str):
+    assert fast_answer(question, [KETTLE, IRON]) is None
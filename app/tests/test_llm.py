@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils.ai import llm
+from app.utils.ai.llm import OllamaClient
+
+
+def _ndjson(*chunks: dict) -> bytes:
+    return "\n".join(json.dumps(c, ensure_ascii=False) for c in chunks).encode()
+
+
+@pytest.fixture()
+def requests_log() -> list[dict]:
+    return []
+
+
+@pytest_asyncio.fixture()
+async def ollama(requests_log: list[dict]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests_log.append(body)
+        return httpx.Response(
+            200,
+            content=_ndjson(
+                {"message": {"role": "assistant", "content": " Product"}, "done": False},
+                {"message": {"role": "assistant", "content": ""}, "done": True},
+            ),
+        )
+
+    client = OllamaClient("http://ollama:11434", "test-model", transport=httpx.MockTransport(handler))
+    llm._client = client
+    yield client
+    llm._client = None
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_classify_uses_shared_client(ollama: OllamaClient, requests_log: list[dict]):
+    category = await llm.classify_question_ollama("сколько стоит чайник")
+
+    assert category == "product"
+    assert requests_log[0]["model"] == "test-model"
+
+
+@pytest.mark.asyncio
+async def test_http_error_returns_fallback():
+    transport = httpx.MockTransport(lambda request: httpx.Response(500, text="boom"))
+    llm._client = OllamaClient("http://ollama:11434", "test-model", transport=transport)
+    try:
+        assert await llm.classify_question_ollama("вопрос") == "Не удалось классифицировать"
+    finally:
+        await llm._client.close()
+        llm._client = None
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_yields_tokens(ollama: OllamaClient, requests_log: list[dict]):
+    tokens = [t async for t in llm.stream_answer_ollama("контекст", "вопрос")]
+
+    assert tokens == ["product"]
+    assert requests_log[0]["stream"] is True
+
+
+@pytest.mark.asyncio
+async def test_system_prompt_is_fixed_prefix(ollama: OllamaClient, requests_log: list[dict]):
+    await llm.generate_answer_ollama("контекст 1", "вопрос 1")
+    await llm.generate_answer_ollama("контекст 2", "вопрос 2")
+
+    first, second = (r["messages"] for r in requests_log)
+    assert first[0] == second[0] == {"role": "system", "content": llm.ANSWER_SYSTEM_PROMPT}
+    assert "вопрос 1" in first[1]["content"] and "контекст 1" in first[1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_and_warm_up(requests_log: list[dict]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_log.append(json.loads(request.content))
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": ""}, "done": True})
+
+    client = OllamaClient("http://ollama:11434", "m", transport=httpx.MockTransport(handler), keep_alive="30m")
+    try:
+        await client.warm_up(llm.SYSTEM_PROMPTS)
+    finally:
+        await client.close()
+
+    assert all(r["keep_alive"] == "30m" for r in requests_log)
+    assert requests_log[0]["messages"] == []
+    assert [r["messages"][0]["content"] for r in requests_log[1:]] == list(llm.SYSTEM_PROMPTS)
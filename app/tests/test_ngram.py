@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from app.utils.ai.ngram import TrigramIndex
+
+TEXTS = ["чайник электрический кухня", "утюг дом", "чайник заварочный кухня", "пылесос дом"]
+
+
+def test_candidates_rank_by_shared_trigrams():
+    index = TrigramIndex.build(TEXTS, max_df=1.0)
+
+    assert set(index.candidates("чайник", limit=2)) == {0, 2}
+    assert list(index.candidates("утюг", limit=1)) == [1]
+
+
+def test_add_remove_and_compact_keep_results():
+    index = TrigramIndex.build(TEXTS, max_df=1.0)
+
+    index.update(1, "миксер кухня")
+    index.remove(3)
+    assert list(index.candidates("утюг", limit=5)) == []
+    assert list(index.candidates("миксер", limit=1)) == [1]
+
+    index.compact()
+    assert list(index.candidates("миксер", limit=1)) == [1]
+    assert list(index.candidates("пылесос", limit=5)) == []
+    assert len(index) == 3
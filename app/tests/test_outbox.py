@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config.settings import settings
+from app.model.models import Base, BitrixLead, BitrixOutbox, FormHistory
+from app.repo.uow import create_uow
+from app.schema import BitrixOutboxCreate, UserCreate
+from app.schema.form import FormUpdate
+from app.service.outbox import CREATE, SYNC, OutboxWorker
+from app.service.service import Service
+from app.utils.bitrix import BitrixClientError
+
+
+@pytest_asyncio.fixture()
+async def sessions(tmp_path) -> async_sessionmaker[AsyncSession]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture()
+def client() -> mock.MagicMock:
+    bitrix = mock.MagicMock()
+    bitrix.create_lead = mock.AsyncMock(return_value=700)
+    bitrix.update_lead = mock.AsyncMock(return_value=None)
+    return bitrix
+
+
+async def _enqueue(sessions, telegram_id: int, *actions: str) -> int:
+    async with create_uow(sessions) as uow:
+        user = await uow.users.get_by_telegram_id(telegram_id)
+        if user is None:
+            user = await uow.users.create(UserCreate(telegram_id=telegram_id, username=str(telegram_id)))
+        for i, action in enumerate(actions):
+            await uow.outbox.add(BitrixOutboxCreate(user_id=user.id, action=action, payload={"TITLE": f"{action}{i}"}))
+    return user.id
+
+
+async def _rows(sessions, model):
+    async with sessions() as session:
+        return list((await session.execute(select(model).order_by(model.id))).scalars())
+
+
+@pytest.mark.asyncio
+async def test_drain_creates_then_updates_lead_in_order(sessions, client):
+    user_id = await _enqueue(sessions, 1, CREATE, SYNC)
+    worker = OutboxWorker(client, sessions)
+
+    assert await worker.drain_once() == 1  # по одной записи пользователя за проход
+    assert await worker.drain_once() == 1
+    assert await worker.drain_once() == 0
+
+    client.create_lead.assert_awaited_once_with({"TITLE": "create0"})
+    client.update_lead.assert_awaited_once_with(700, {"TITLE": "sync1"})
+    [lead] = await _rows(sessions, BitrixLead)
+    assert (lead.user_id, lead.lead_id) == (user_id, 700)
+    assert await _rows(sessions, BitrixOutbox) == []
+
+
+@pytest.mark.asyncio
+async def test_failed_send_is_retried_with_backoff_then_marked_failed(sessions, client):
+    await _enqueue(sessions, 2, SYNC)
+    client.create_lead.side_effect = BitrixClientError("down")
+    worker = OutboxWorker(client, sessions, backoff=10, max_attempts=2)
+
+    before = datetime.utcnow()
+    assert await worker.drain_once() == 1
+    [item] = await _rows(sessions, BitrixOutbox)
+    assert (item.status, item.attempts, item.last_error) == ("pending", 1, "down")
+    assert item.next_attempt_at >= before + timedelta(seconds=10)
+    # Пауза еще не прошла
+    assert await worker.drain_once() == 0
+
+    async with sessions() as session:
+        (await session.get(BitrixOutbox, item.id)).next_attempt_at = before
+        await session.commit()
+    assert await worker.drain_once() == 1
+    [item] = await _rows(sessions, BitrixOutbox)
+    assert (item.status, item.attempts) == ("failed", 2)
+    assert await worker.drain_once() == 0
+
+
+async def _submit(sessions, client, telegram_id: int, name: str) -> None:
+    async with create_uow(sessions) as uow:
+        await Service(uow, client).change_user_form(telegram_id, FormUpdate(name=name, phone="+7", via_bot=True))
+
+
+async def _make_due(sessions) -> None:
+    async with sessions() as session:
+        for item in (await session.execute(select(BitrixOutbox))).scalars():
+            item.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_rapid_resubmits_send_only_latest_form(sessions, client, monkeypatch):
+    monkeypatch.setattr(settings, "BITRIX24_DEBOUNCE_SECONDS", 30)
+    user_id = await _enqueue(sessions, 3, CREATE)
+    worker = OutboxWorker(client, sessions)
+    assert await worker.drain_once() == 1  # лид создан при старте
+
+    before = datetime.utcnow()
+    for name in ("Ивн", "Иван", "Иван Петров"):
+        await _submit(sessions, client, 3, name)
+
+    [item] = await _rows(sessions, BitrixOutbox)
+    assert item.payload["NAME"] == "Иван Петров"
+    assert item.next_attempt_at >= before + timedelta(seconds=30)
+    assert await worker.drain_once() == 0  # окно еще не закрылось
+
+    await _make_due(sessions)
+    assert await worker.drain_once() == 1
+    client.update_lead.assert_awaited_once()
+    assert client.update_lead.await_args.args[1]["NAME"] == "Иван Петров"
+    # История форм — все три правки
+    assert [f.name for f in await _rows(sessions, FormHistory)] == ["Ивн", "Иван", "Иван Петров"]
+    assert [(lead.user_id, lead.lead_id) for lead in await _rows(sessions, BitrixLead)] == [(user_id, 700)]
+
+
+@pytest.mark.asyncio
+async def test_resubmits_do_not_wait_longer_than_max_wait(sessions, client, monkeypatch):
+    monkeypatch.setattr(settings, "BITRIX24_DEBOUNCE_SECONDS", 30)
+    monkeypatch.setattr(settings, "BITRIX24_DEBOUNCE_MAX_WAIT", 60)
+    await _enqueue(sessions, 4)
+    await _submit(sessions, client, 4, "a")
+    async with sessions() as session:
+        [item] = (await session.execute(select(BitrixOutbox))).scalars()
+        first_queued = datetime.utcnow() - timedelta(seconds=50)
+        item.created_at = first_queued
+        await session.commit()
+
+    # Каждая правка заменяет запись, но предел считается от самой первой
+    for name in ("b", "c", "d"):
+        await _submit(sessions, client, 4, name)
+
+    [item] = await _rows(sessions, BitrixOutbox)
+    assert item.payload["NAME"] == "d"
+    assert item.created_at == first_queued
+    assert item.next_attempt_at <= datetime.utcnow() + timedelta(seconds=11)
+
+
+@pytest.mark.asyncio
+async def test_resubmit_during_send_is_queued_after_it(sessions, client, monkeypatch):
+    monkeypatch.setattr(settings, "BITRIX24_DEBOUNCE_SECONDS", 0)
+    await _enqueue(sessions, 5)
+    await _submit(sessions, client, 5, "first")
+    sent = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_create(payload: dict) -> int:
+        sent.set()
+        await release.wait()
+        return 800
+
+    client.create_lead.side_effect = slow_create
+    worker = OutboxWorker(client, sessions)
+    drain = asyncio.create_task(worker.drain_once())
+    await sent.wait()
+
+    # Отправляемая запись не заменяется, новая встает за ней
+    await _submit(sessions, client, 5, "second")
+    assert await worker.drain_once() == 0
+    release.set()
+    await drain
+
+    await _make_due(sessions)
+    assert await worker.drain_once() == 1
+    client.create_lead.assert_awaited_once()
+    client.update_lead.assert_awaited_once()
+    lead_id, payload = client.update_lead.await_args.args
+    assert (lead_id, payload["NAME"]) == (800, "second")
+
+
+@pytest.mark.asyncio
+async def test_slow_send_keeps_its_lease(sessions, client):
+    await _enqueue(sessions, 6, CREATE)
+    sent = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_create(payload: dict) -> int:
+        # Повторная отправка (дубль лида) не ждет: тест упадет на проверке, а не зависнет
+        if sent.is_set():
+            return 901
+        sent.set()
+        await release.wait()
+        return 900
+
+    client.create_lead.side_effect = slow_create
+    worker = OutboxWorker(client, sessions, lease=0.1)
+    drain = asyncio.create_task(worker.drain_once())
+    await sent.wait()
+
+    # Отправка идет в несколько раз дольше аренды — второй воркер запись не забирает
+    other = OutboxWorker(client, sessions, lease=0.1)
+    for _ in range(4):
+        await asyncio.sleep(0.1)
+        assert await other.drain_once() == 0
+    release.set()
+    await drain
+
+    client.create_lead.assert_awaited_once()
+    assert [lead.lead_id for lead in await _rows(sessions, BitrixLead)] == [900]
+    assert await _rows(sessions, BitrixOutbox) == []
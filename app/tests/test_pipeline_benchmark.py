@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from app.benchmarks.fakes import FakeCatalogSource, FakeOllama
+from app.benchmarks.pipeline import compare, drive, fake_pipeline, make_workload
+from app.utils.ai import engine, llm, sheets
+from app.utils.ai.llm import OllamaClient, _answer_messages, _classify_messages
+
+
+@pytest.mark.asyncio
+async def test_fake_ollama_streams_ndjson_like_ollama():
+    async with FakeOllama(latency=0, token_rate=1000, answer_tokens=3) as ollama:
+        client = OllamaClient(ollama.url, "fake")
+        try:
+            chunks = [c async for c in client.stream_chat(_answer_messages("чайник бош 2500", "сколько стоит"))]
+            category = await client.chat(_classify_messages("какой график работы"))
+            embeddings = await client.embed(["a", "b", "a"], "fake")
+        finally:
+            await client.close()
+
+    assert [c["message"]["content"] for c in chunks[:-1]] == ["чайник", " бош", " 2500"]
+    assert chunks[-1]["done"] is True and chunks[-1]["eval_count"] == 3
+    assert category == "general"
+    assert embeddings[0] == embeddings[2] != embeddings[1]
+
+
+@pytest.mark.asyncio
+async def test_drive_runs_pipeline_against_fakes():
+    source = FakeCatalogSource(200)
+    questions = make_workload(source.catalog, 20, random.Random(1), general=0.25, compare=0.25)
+    saved = (sheets.sheet_cache, llm._client, engine.answer_cache)
+
+    async with FakeOllama(latency=0, token_rate=1000) as ollama:
+        async with fake_pipeline(ollama, source, llm_slots=2, max_queue=100):
+            report = await drive(questions, concurrency=4)
+
+    assert report["completed"] == 20 and report["errors"] == report["rejected"] == 0
+    assert 0 < report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"]
+    assert ollama.requests["chat"] >= 5
+    assert (sheets.sheet_cache, llm._client, engine.answer_cache) == saved
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"p95_ms": 100.0, "throughput_rps": 10.0}
+
+    assert compare({"p95_ms": 115.0, "throughput_rps": 9.0}, baseline, 0.2) == []
+    problems = compare({"p95_ms": 130.0, "throughput_rps": 7.0}, baseline, 0.2)
+    assert [p.split(":")[0] for p in problems] == ["p95_ms", "throughput_rps"]
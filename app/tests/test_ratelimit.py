@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.utils.ratelimit import AdaptiveRateLimiter
+
+
+@pytest.mark.asyncio
+async def test_acquire_paces_calls_after_burst():
+    limiter = AdaptiveRateLimiter(rate=50, burst=2)
+
+    started = time.perf_counter()
+    waits = [await limiter.acquire() for _ in range(5)]
+    elapsed = time.perf_counter() - started
+
+    assert waits[0] < 0.005 and waits[1] < 0.005  # запас burst
+    assert elapsed >= 3 / 50 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_concurrent_waiters_share_one_bucket():
+    limiter = AdaptiveRateLimiter(rate=100, burst=1)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+
+    assert time.perf_counter() - started >= 5 / 100 * 0.9
+
+
+def test_throttle_cuts_rate_once_per_cooldown_and_success_recovers():
+    now = [0.0]
+    limiter = AdaptiveRateLimiter(rate=2, min_rate=0.4, increase=0.5, cooldown=1.0, clock=lambda: now[0])
+
+    limiter.on_throttle()
+    limiter.on_throttle()  # тот же всплеск
+    assert limiter.rate == 1.0
+
+    now[0] = 1.5
+    limiter.on_throttle()
+    now[0] = 3.0
+    limiter.on_throttle()
+    now[0] = 4.5
+    limiter.on_throttle()
+    assert limiter.rate == 0.4
+
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 2
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.ai.scheduler import (
+    DeadlineExpired,
+    LLMScheduler,
+    QueueFull,
+    UserQueueFull,
+    bind_request,
+)
+
+
+async def _job(scheduler: LLMScheduler, user, order: list, hold: float = 0.01, timeout=None):
+    bind_request(user, timeout)
+    async with scheduler.slot():
+        order.append(user)
+        await asyncio.sleep(hold)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    scheduler = LLMScheduler(max_concurrency=2, max_queue=10, max_queue_per_user=10)
+    peak = 0
+
+    async def job(user):
+        nonlocal peak
+        bind_request(user, None)
+        async with scheduler.slot():
+            peak = max(peak, scheduler.active)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(job(i) for i in range(6)))
+    assert peak == 2
+    assert scheduler.active == 0 and scheduler.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_users():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10, max_queue_per_user=5)
+    order: list = []
+    blocker = asyncio.create_task(_job(scheduler, "x", order, hold=0.02))
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(_job(scheduler, "a", order)) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(_job(scheduler, "b", order)))
+    await asyncio.gather(blocker, *tasks)
+    # Запрос "b" не ждет, пока выполнятся все три запроса "a"
+    assert order == ["x", "a", "b", "a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queues_are_full():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=2, max_queue_per_user=1)
+    order: list = []
+    running = asyncio.create_task(_job(scheduler, "x", order, hold=0.05))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(_job(scheduler, "a", order))
+    await asyncio.sleep(0)
+
+    with pytest.raises(UserQueueFull):
+        scheduler.check_admission("a")
+    queued_b = asyncio.create_task(_job(scheduler, "b", order))
+    await asyncio.sleep(0)
+    with pytest.raises(QueueFull) as exc:
+        scheduler.check_admission("c")
+    assert exc.value.retry_after >= 1
+
+    await asyncio.gather(running, queued, queued_b)
+    assert order == ["x", "a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_expired_waiter_is_dropped():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+    order: list = []
+    running = asyncio.create_task(_job(scheduler, "x", order, hold=0.05))
+    await asyncio.sleep(0)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExpired):
+        await _job(scheduler, "a", order, timeout=0.01)
+    assert time.monotonic() - started < 0.05
+    assert scheduler.queue_depth == 0
+    await running
+    assert order == ["x"]
+    assert scheduler.active == 0
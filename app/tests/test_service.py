@@ -6,7 +6,7 @@ from unittest import mock
 
 import pytest
 
-from app.schema import BitrixLeadDTO, FormDTO, UserCreate, UserDTO
+from app.schema import BitrixLeadCreate, BitrixLeadDTO, BitrixOutboxCreate, FormDTO, UserCreate, UserDTO
 from app.schema.form import FormUpdate
 from app.service.errors import UserAlreadyExists
 from app.service.service import Service
@@ -39,11 +39,13 @@ def uow() -> mock.MagicMock:
     users_store: dict[int, UserDTO] = {}
     bitrix_store: dict[int, BitrixLeadDTO] = {}
     forms_store: list[FormDTO] = []
+    outbox_store: list[BitrixOutboxCreate] = []
 
     users_repo = mock.MagicMock()
     bitrix_repo = mock.MagicMock()
     forms_repo = mock.MagicMock()
     admins_repo = mock.MagicMock()
+    outbox_repo = mock.MagicMock()
 
     async def users_create(user: UserCreate) -> UserDTO:
         if user.telegram_id in users_store:
@@ -112,11 +114,32 @@ def uow() -> mock.MagicMock:
 
     admins_repo.get_by_user_id = mock.AsyncMock(return_value=None)
 
+    async def outbox_add(
+        data: BitrixOutboxCreate,
+        next_attempt_at: Optional[datetime] = None,
+        created_at: Optional[datetime] = None,
+    ) -> None:
+        outbox_store.append(data)
+
+    async def outbox_supersede(user_id: int, action: str) -> Optional[datetime]:
+        dropped = [i for i in outbox_store if i.user_id == user_id and i.action == action]
+        for item in dropped:
+            outbox_store.remove(item)
+        return datetime.utcnow() if dropped else None
+
+    async def outbox_has_pending(user_id: int, action: str) -> bool:
+        return any(i.user_id == user_id and i.action == action for i in outbox_store)
+
+    outbox_repo.add = mock.AsyncMock(side_effect=outbox_add)
+    outbox_repo.has_pending = mock.AsyncMock(side_effect=outbox_has_pending)
+    outbox_repo.supersede = mock.AsyncMock(side_effect=outbox_supersede)
+
     uow_mock = mock.MagicMock()
     uow_mock.users = users_repo
     uow_mock.bitrix = bitrix_repo
     uow_mock.forms = forms_repo
     uow_mock.admins = admins_repo
+    uow_mock.outbox = outbox_repo
     uow_mock.commit = mock.AsyncMock()
     uow_mock.rollback = mock.AsyncMock()
 
@@ -124,6 +147,7 @@ def uow() -> mock.MagicMock:
         "users": users_store,
         "bitrix": bitrix_store,
         "forms": forms_store,
+        "outbox": outbox_store,
     }
     return uow_mock
 
@@ -175,7 +199,7 @@ async def test_get_or_create_creates_new_user(service: Service):
 
 
 @pytest.mark.asyncio
-async def test_change_user_form_creates_form_and_syncs_bitrix(service: Service, uow: mock.MagicMock):
+async def test_change_user_form_creates_form_and_queues_bitrix_sync(service: Service, uow: mock.MagicMock):
     user = await service.create_user(UserCreate(telegram_id=10, username="user10"))
 
     update = FormUpdate(name="Name", phone="+123", via_bot=True)
@@ -183,8 +207,10 @@ async def test_change_user_form_creates_form_and_syncs_bitrix(service: Service,
 
     assert created_form is not None
     assert created_form.user_id == user.id
-    assert len(uow._stores["bitrix"]) == 1
-    service.bitrix_client.create_lead.assert_awaited()
+    # Запрос в Bitrix не ходит: лид синхронизирует воркер outbox
+    [item] = uow._stores["outbox"]
+    assert (item.user_id, item.action, item.payload["NAME"]) == (user.id, "sync", "Name")
+    service.bitrix_client.create_lead.assert_not_awaited()
 
 
 @pytest.mark.asyncio
@@ -195,23 +221,33 @@ async def test_create_lead_on_start_skips_when_no_user(service: Service):
 
 
 @pytest.mark.asyncio
-async def test_create_lead_on_start_creates_bitrix_lead(service: Service, uow: mock.MagicMock):
+async def test_create_lead_on_start_queues_lead_once(service: Service, uow: mock.MagicMock):
     user = await service.create_user(UserCreate(telegram_id=42, username="tg42"))
 
-    lead_id = await service.create_lead_on_start(telegram_id=user.telegram_id)
+    assert await service.create_lead_on_start(telegram_id=user.telegram_id) is None
+    await service.create_lead_on_start(telegram_id=user.telegram_id)
+
+    [item] = uow._stores["outbox"]
+    assert (item.user_id, item.action) == (user.id, "create")
+    service.bitrix_client.create_lead.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_lead_on_start_returns_existing_lead(service: Service, uow: mock.MagicMock):
+    user = await service.create_user(UserCreate(telegram_id=43, username="tg43"))
+    await uow.bitrix.create(BitrixLeadCreate(user_id=user.id, lead_id=500))
 
-    assert lead_id is not None
-    assert uow._stores["bitrix"].get(user.id) is not None
+    assert await service.create_lead_on_start(telegram_id=user.telegram_id) == 500
+    assert uow._stores["outbox"] == []
 
 
 @pytest.mark.asyncio
 async def test_statistics(service: Service):
     await service.create_user(UserCreate(telegram_id=201, username="u1"))
     await service.create_user(UserCreate(telegram_id=202, username="u2"))
-    await service.create_lead_on_start(telegram_id=201)
 
     stats = await service.get_users_statistics()
 
     assert stats["total"] == 2
     assert stats["active"] == 2
-    assert stats["bitrix_leads"] == 1
+    assert stats["bitrix_leads"] == 0
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from app.utils.ai.sheets import SheetSnapshot, SheetSnapshotCache
+
+VALUES = [
+    ["Название", "Цена за шт в рублях", "Группа"],
+    ["Чайник", "1500", "Кухня"],
+]
+
+
+class FakeFetcher:
+    def __init__(self, values=VALUES, delay: float = 0.0):
+        self.values = values
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def __call__(self, doc: str, worksheet: str) -> list[list[str]]:
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            threading.Event().wait(self.delay)
+        if self.fail:
+            raise RuntimeError("sheets down")
+        return self.values
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    fetcher = FakeFetcher(delay=0.05)
+    cache = SheetSnapshotCache(fetcher, ttl=60)
+
+    snapshots = await asyncio.gather(*(cache.get("doc", "Товары") for _ in range(10)))
+
+    assert fetcher.calls == 1
+    assert all(s is snapshots[0] for s in snapshots)
+    assert [dict(row) for row in snapshots[0].table] == [{"Название": "Чайник", "Цена за шт в рублях": 1500, "Группа": "Кухня"}]
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_served_while_refreshing():
+    fetcher = FakeFetcher()
+    cache = SheetSnapshotCache(fetcher, ttl=0)
+    first = await cache.get("doc", "Товары")
+
+    fetcher.values = VALUES + [["Утюг", "2500", "Дом"]]
+    stale = await cache.get("doc", "Товары")
+    assert stale is first
+
+    await asyncio.sleep(0.05)
+    fresh = await cache.get("doc", "Товары")
+    assert fresh is not first
+    assert len(fresh.table) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_stale_snapshot():
+    fetcher = FakeFetcher()
+    cache = SheetSnapshotCache(fetcher, ttl=0)
+    first = await cache.get("doc", "Товары")
+
+    fetcher.fail = True
+    assert await cache.get("doc", "Товары") is first
+    await asyncio.sleep(0.05)
+
+    assert await cache.get("doc", "Товары") is first
+
+
+@pytest.mark.asyncio
+async def test_unchanged_refresh_keeps_snapshot_and_derived_data():
+    fetcher = FakeFetcher()
+    cache = SheetSnapshotCache(fetcher, ttl=0)
+    first = await cache.get("doc", "Товары")
+    table = first.table
+
+    fetcher.values = [list(row) for row in VALUES]
+    await cache.get("doc", "Товары")
+    await asyncio.sleep(0.05)
+
+    assert fetcher.calls == 2
+    assert await cache.get("doc", "Товары") is first
+    assert first.table is table
+
+
+def test_diff_classifies_rows():
+    old = SheetSnapshot(VALUES + [["Утюг", "2500", "Дом"], ["Фен", "900", "Дом"]])
+    new = SheetSnapshot([
+        VALUES[0],
+        ["Пылесос", "7000", "Дом"],
+        ["Чайник", "1500", "Кухня"],
+        ["Утюг", "2700", "Дом"],
+    ])
+
+    changes = new.diff(old)
+
+    assert changes.base_version == old.version
+    assert changes.source.tolist() == [-1, 0, -1]
+    assert changes.added.tolist() == [0]
+    assert changes.changed.tolist() == [2]
+    assert changes.removed.tolist() == [1, 2]
+    assert changes.old_to_new(3).tolist() == [1, -1, -1]
+    assert new.diff(SheetSnapshot([["Другой заголовок"]] + VALUES[1:])) is None
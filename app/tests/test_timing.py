@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.utils.ai.llm import LLM_TOKENS, OllamaClient
+from app.utils.timing import STAGE_SECONDS, record, server_timing, stage, start_timing
+
+
+@pytest.mark.asyncio
+async def test_stages_reach_request_timings_from_tasks_and_threads():
+    timings = start_timing()
+    before = STAGE_SECONDS.count(stage="t_sleep")
+
+    async def child():
+        with stage("t_sleep"):
+            await asyncio.sleep(0.01)
+
+    await asyncio.create_task(child())
+    await asyncio.to_thread(record, "t_thread", 0.5)
+    with stage("t_sleep"):
+        pass
+
+    assert timings["t_sleep"] >= 0.01
+    assert timings["t_thread"] == 0.5
+    assert STAGE_SECONDS.count(stage="t_sleep") == before + 2
+
+
+def test_failed_stage_is_not_recorded():
+    timings = start_timing()
+    with pytest.raises(RuntimeError):
+        with stage("t_fail"):
+            raise RuntimeError
+
+    assert "t_fail" not in timings
+
+
+def test_server_timing_header():
+    assert server_timing({"classify": 0.0123, "generate": 1.5}) == "classify;dur=12.3, generate;dur=1500.0"
+
+
+@pytest.mark.asyncio
+async def test_ollama_final_chunk_stats_are_recorded():
+    final = {
+        "message": {"role": "assistant", "content": ""},
+        "done": True,
+        "prompt_eval_count": 120,
+        "eval_count": 7,
+        "prompt_eval_duration": 300_000_000,
+        "eval_duration": 700_000_000,
+    }
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=json.dumps(final).encode()))
+    client = OllamaClient("http://ollama:11434", "m", transport=transport)
+    timings = start_timing()
+    prompts = LLM_TOKENS.count(kind="prompt")
+    try:
+        await client.chat([])
+    finally:
+        await client.close()
+
+    assert timings == {"llm_prompt_eval": 0.3, "llm_eval": 0.7}
+    assert LLM_TOKENS.count(kind="prompt") == prompts + 1
@@ -59,8 +59,10 @@ def test_repositories_are_singletons_per_uow(session: mock.MagicMock):
     assert uow.forms is uow.forms
     assert uow.bitrix is uow.bitrix
     assert uow.admins is uow.admins
+    assert uow.outbox is uow.outbox
 
     assert uow.users.db is session
     assert uow.forms.db is session
     assert uow.bitrix.db is session
     assert uow.admins.db is session
+    assert uow.outbox.db is session
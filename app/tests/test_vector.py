@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.utils.ai.vector import EmbeddingIndex
+
+PRODUCTS = [
+    {"Название": "Чайник", "Группа": "Кухня"},
+    {"Название": "Утюг", "Группа": "Дом"},
+    {"Название": "Сковорода", "Группа": "Кухня"},
+]
+VOCAB = ["чайник", "утюг", "сковорода", "кухня", "дом"]
+
+
+class FakeEmbedder:
+    """Мешок слов по маленькому словарю вместо настоящей модели."""
+
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    async def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [[float(word in text.lower()) for word in VOCAB] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_query_returns_closest_rows(tmp_path):
+    embed = FakeEmbedder()
+    index = EmbeddingIndex(str(tmp_path), "fake", batch_size=2)
+    await index.sync(PRODUCTS, embed)
+
+    hits = await index.query("утюг", embed, k=2)
+
+    assert hits[0][0] == 1
+    assert hits[0][1] == pytest.approx(1 / 2 ** 0.5)
+    assert len(hits) == 2
+
+
+@pytest.mark.asyncio
+async def test_restart_reuses_persisted_vectors(tmp_path):
+    await EmbeddingIndex(str(tmp_path), "fake").sync(PRODUCTS, FakeEmbedder())
+
+    embed = FakeEmbedder()
+    index = EmbeddingIndex(str(tmp_path), "fake")
+    changed = PRODUCTS[:2] + [{"Название": "Сковорода гриль", "Группа": "Кухня"}]
+    await index.sync(changed, embed)
+
+    assert embed.embedded == ["Сковорода гриль Кухня"]
+    assert len(index) == 3
+    assert index.search([1, 0, 0, 0, 0], k=1)[0][0] == 0
+
+
+@pytest.mark.asyncio
+async def test_sync_with_snapshot_diff_embeds_only_changed_rows(tmp_path):
+    from app.utils.ai.sheets import SheetSnapshot
+
+    header = [["Название", "Цена за шт в рублях", "Группа"]]
+    old = SheetSnapshot(header + [["Чайник", "100", "Кухня"], ["Утюг", "200", "Дом"]])
+    new = SheetSnapshot(header + [["Чайник", "150", "Кухня"], ["Утюг", "200", "Дом"], ["Сковорода", "300", "Кухня"]])
+    new.changes = new.diff(old)
+    embed = FakeEmbedder()
+    index = EmbeddingIndex(str(tmp_path), "fake")
+
+    await index.sync(old.table, embed)
+    embed.embedded.clear()
+    await index.sync(new.table, embed)
+
+    # Правка цены текст для эмбеддинга не меняет
+    assert embed.embedded == ["Сковорода Кухня"]
+    assert (await index.query("сковорода", embed, k=1))[0][0] == 2
+
+
+@pytest.mark.asyncio
+async def test_sync_in_background_does_not_block_caller(tmp_path):
+    gate = asyncio.Event()
+    embed = FakeEmbedder()
+
+    async def slow_embed(texts: list[str]) -> list[list[float]]:
+        await gate.wait()
+        return await embed(texts)
+
+    index = EmbeddingIndex(str(tmp_path), "fake")
+    index.sync_in_background(PRODUCTS, slow_embed)
+    index.sync_in_background(PRODUCTS, slow_embed)
+
+    assert not index.ready(PRODUCTS)
+    gate.set()
+    await index._sync_task
+    assert index.ready(PRODUCTS)
+    # Повторный вызов для тех же строк не запускает вторую синхронизацию
+    assert len(embed.embedded) == len(PRODUCTS)
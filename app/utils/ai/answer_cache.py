@@ -0,0 +1,147 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import aiosqlite
+from rapidfuzz import fuzz, process
+
+from app.config.settings import settings
+from app.utils.ai.filter import normalize
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+def question_key(question: str) -> str:
+    """Нормализованный текст вопроса: регистр, пунктуация и лишние пробелы не важны."""
+    return " ".join(normalize(question).split())
+
+
+def _digits(text: str) -> list[str]:
+    return re.findall(r"\d+", text)
+
+
+class AnswerCache:
+    """
+    Кэш готовых ответов по (версия каталога, нормализованный вопрос).
+    LRU + TTL; если точного совпадения нет, ищется почти такой же вопрос
+    (rapidfuzz не ниже similarity) в той же версии каталога.
+    Смена версии каталога автоматически делает старые записи недостижимыми.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 3600,
+        similarity: int = 92,
+        db_path: Optional[str] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.db_path = db_path
+        self._entries: OrderedDict[tuple[str, str], tuple[str, float]] = OrderedDict()
+        # Вопросы по версиям каталога — для поиска почти-дубликатов
+        self._questions: dict[str, dict[str, None]] = {}
+        self._db: Optional[aiosqlite.Connection] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def open(self) -> None:
+        """Подключает SQLite (если задан путь) и поднимает из нее живые записи."""
+        if not self.db_path or self._db is not None:
+            return
+        self._db = await aiosqlite.connect(self.db_path)
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache ("
+            "version TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (version, question))"
+        )
+        await self._db.execute("DELETE FROM answer_cache WHERE expires_at <= ?", (time.time(),))
+        await self._db.commit()
+        async with self._db.execute(
+            "SELECT version, question, answer, expires_at FROM answer_cache "
+            "ORDER BY expires_at DESC LIMIT ?",
+            (self.max_size,),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for version, question, answer, expires_at in reversed(rows):
+            self._put((version, question), answer, expires_at)
+        logger.debug("Answer cache loaded %s entries", len(rows))
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def get(self, question: str, catalog_version: str) -> Optional[str]:
+        key = (catalog_version, question_key(question))
+        entry = self._lookup(key) or self._lookup_similar(key)
+        return entry[0] if entry else None
+
+    async def set(self, question: str, catalog_version: str, answer: str) -> None:
+        key = (catalog_version, question_key(question))
+        expires_at = time.time() + self.ttl
+        evicted = self._put(key, answer, expires_at)
+        if self._db is not None:
+            await self._db.execute(
+                "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?)",
+                (*key, answer, expires_at),
+            )
+            # Вытесненное из памяти удаляется и из базы, иначе таблица растет без предела
+            if evicted:
+                await self._db.executemany(
+                    "DELETE FROM answer_cache WHERE version = ? AND question = ?", evicted
+                )
+            await self._db.commit()
+
+    def _lookup(self, key: tuple[str, str]) -> Optional[tuple[str, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _lookup_similar(self, key: tuple[str, str]) -> Optional[tuple[str, float]]:
+        version, question = key
+        questions = self._questions.get(version)
+        if not questions:
+            return None
+        match = process.extractOne(question, questions.keys(), scorer=fuzz.ratio, score_cutoff=self.similarity)
+        # Числа (артикулы, количества) должны совпадать точно
+        if match is None or _digits(match[0]) != _digits(question):
+            return None
+        return self._lookup((version, match[0]))
+
+    def _put(self, key: tuple[str, str], answer: str, expires_at: float) -> list[tuple[str, str]]:
+        """Кладет запись; возвращает ключи, вытесненные по LRU."""
+        self._entries[key] = (answer, expires_at)
+        self._entries.move_to_end(key)
+        self._questions.setdefault(key[0], {})[key[1]] = None
+        evicted = []
+        while len(self._entries) > self.max_size:
+            evicted.append(next(iter(self._entries)))
+            self._drop(evicted[-1])
+        return evicted
+
+    def _drop(self, key: tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        questions = self._questions.get(key[0])
+        if questions is not None:
+            questions.pop(key[1], None)
+            if not questions:
+                del self._questions[key[0]]
+
+
+answer_cache = AnswerCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+    db_path=settings.ANSWER_CACHE_DB,
+)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+BACKEND_UP = metrics.gauge("ai_llm_backend_up", "Бэкенд LLM в ротации (1) или выведен (0)", labels=("host",))
+BACKEND_OUTSTANDING = metrics.gauge(
+    "ai_llm_backend_outstanding", "Незавершенные запросы к бэкенду LLM", labels=("host",)
+)
+BACKEND_FAILURES = metrics.counter("ai_llm_backend_failures_total", "Ошибки запросов к бэкенду LLM", labels=("host",))
+
+
+class NoBackendAvailable(httpx.TransportError):
+    """Все бэкенды LLM выведены из ротации."""
+
+
+class Backend:
+    """Один сервер Ollama: свой пул соединений и счетчики состояния."""
+
+    def __init__(self, host: str, client: httpx.AsyncClient):
+        self.host = host
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        # Выведенный бэкенд получает пробный запрос не раньше этого момента
+        self.retry_at = 0.0
+
+    def __repr__(self) -> str:
+        return f"Backend({self.host!r}, healthy={self.healthy}, outstanding={self.outstanding})"
+
+
+class BackendPool:
+    """
+    Пул серверов Ollama с маршрутизацией на наименее загруженный.
+    Бэкенд выводится из ротации после eject_after ошибок подряд и возвращается
+    после успешной проверки здоровья (фоновой или пробного запроса через eject_seconds).
+    """
+
+    def __init__(
+        self,
+        hosts: list[str],
+        timeout: float = 120.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        probe_interval: float = 10.0,
+        eject_after: int = 2,
+        eject_seconds: float = 30.0,
+    ):
+        if not hosts:
+            raise ValueError("Нужен хотя бы один хост LLM")
+        self.probe_interval = probe_interval
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self.backends = [
+            Backend(
+                host.rstrip("/"),
+                httpx.AsyncClient(
+                    base_url=host.rstrip("/"),
+                    timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                    ),
+                    transport=transport,
+                ),
+            )
+            for host in hosts
+        ]
+        self._probe_task: Optional[asyncio.Task] = None
+        for backend in self.backends:
+            BACKEND_UP.set(1, host=backend.host)
+            BACKEND_OUTSTANDING.set(0, host=backend.host)
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def start(self) -> None:
+        """Запускает периодические проверки здоровья."""
+        if self._probe_task is None and self.probe_interval > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def close(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        await asyncio.gather(*(b.client.aclose() for b in self.backends))
+
+    def pick(self, exclude: tuple[Backend, ...] = ()) -> Backend:
+        """Здоровый бэкенд с наименьшим числом незавершенных запросов."""
+        candidates = [b for b in self.backends if b not in exclude]
+        now = time.monotonic()
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy:
+            # Выведенные бэкенды, у которых подошло время пробного запроса
+            healthy = [b for b in candidates if b.retry_at <= now]
+        if not healthy:
+            raise NoBackendAvailable("Нет доступных бэкендов LLM")
+        # При равной загрузке — тот, что раньше в списке: порядок хостов задает приоритет
+        return min(healthy, key=lambda b: b.outstanding)
+
+    @asynccontextmanager
+    async def lease(self, exclude: tuple[Backend, ...] = ()) -> AsyncIterator[Backend]:
+        """
+        Бэкенд на время запроса. Ему засчитываются только отказ в соединении и 5xx:
+        таймаут чтения — долгая генерация под нагрузкой, а не мертвый сервер.
+        """
+        backend = self.pick(exclude)
+        backend.outstanding += 1
+        BACKEND_OUTSTANDING.set(backend.outstanding, host=backend.host)
+        try:
+            yield backend
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            self.mark_failure(backend)
+            raise
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code >= 500:
+                self.mark_failure(backend)
+            raise
+        else:
+            self.mark_success(backend)
+        finally:
+            backend.outstanding -= 1
+            BACKEND_OUTSTANDING.set(backend.outstanding, host=backend.host)
+
+    def mark_failure(self, backend: Backend) -> None:
+        backend.failures += 1
+        BACKEND_FAILURES.inc(host=backend.host)
+        if backend.failures >= self.eject_after:
+            if backend.healthy:
+                logger.warning("Бэкенд LLM %s выведен из ротации", backend.host)
+            backend.healthy = False
+            backend.retry_at = time.monotonic() + self.eject_seconds
+            BACKEND_UP.set(0, host=backend.host)
+
+    def mark_success(self, backend: Backend) -> None:
+        backend.failures = 0
+        if not backend.healthy:
+            logger.info("Бэкенд LLM %s возвращен в ротацию", backend.host)
+        backend.healthy = True
+        BACKEND_UP.set(1, host=backend.host)
+
+    async def probe(self, backend: Backend) -> bool:
+        """Проверка здоровья: сервер отвечает на /api/version."""
+        try:
+            resp = await backend.client.get("/api/version", timeout=5.0)
+            resp.raise_for_status()
+        except httpx.HTTPError:
+            self.mark_failure(backend)
+            return False
+        self.mark_success(backend)
+        return True
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self.probe(b) for b in self.backends))
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe_all()
+            except Exception:
+                logger.exception("Ошибка проверки бэкендов LLM")
@@ -0,0 +1,175 @@
+import csv
+import logging
+import re
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional
+from xml.etree import ElementTree
+
+import gspread
+from google.oauth2.service_account import Credentials
+
+from app.utils.timing import stage
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class CatalogSource(ABC):
+    """
+    Источник листов каталога. fetch блокирующий и возвращает сетку строк,
+    как Worksheet.get_all_values(): первая строка — заголовки.
+    """
+
+    @abstractmethod
+    def fetch(self, doc: str, worksheet: str) -> list[list[str]]:
+        ...
+
+
+class GoogleSheetsSource(CatalogSource):
+    """Google Sheets через gspread; авторизация и таблицы переиспользуются."""
+
+    def __init__(self, service_account_file: str):
+        self.service_account_file = service_account_file
+        self._client: Optional[gspread.Client] = None
+        self._spreadsheets: dict[str, gspread.Spreadsheet] = {}
+
+    def fetch(self, doc: str, worksheet: str) -> list[list[str]]:
+        if self._client is None:
+            with stage("sheets_auth"):
+                creds = Credentials.from_service_account_file(self.service_account_file, scopes=SCOPES)
+                self._client = gspread.authorize(creds)
+        if doc not in self._spreadsheets:
+            with stage("sheets_open"):
+                self._spreadsheets[doc] = self._client.open_by_url(doc)
+        logger.debug(worksheet)
+        with stage("sheets_download"):
+            data = self._spreadsheets[doc].worksheet(worksheet).get_all_values()
+        logger.debug("DATA FROM SHEET")
+        logger.debug(data)
+        return data
+
+
+def _pad(rows: list[list[str]]) -> list[list[str]]:
+    """Выравнивает строки по ширине и убирает пустой хвост, как get_all_values."""
+    while rows and not any(rows[-1]):
+        rows.pop()
+    width = max((len(row) for row in rows), default=0)
+    return [row + [""] * (width - len(row)) for row in rows]
+
+
+def read_csv(path: Path) -> list[list[str]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return _pad([list(row) for row in csv.reader(f)])
+
+
+_NS = {
+    "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+
+def _column_index(ref: str) -> int:
+    letters = re.match(r"[A-Z]+", ref).group()
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index - 1
+
+
+def _cell_text(cell: ElementTree.Element, shared: list[str]) -> str:
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in cell.iterfind(".//m:t", _NS))
+    value = cell.findtext("m:v", default="", namespaces=_NS)
+    if kind == "s":
+        return shared[int(value)]
+    if kind == "b":
+        return "TRUE" if value == "1" else "FALSE"
+    if kind in (None, "n") and value:
+        number = float(value)
+        return str(int(number)) if number.is_integer() else repr(number)
+    return value
+
+
+def read_xlsx(path: Path, worksheet: Optional[str] = None) -> list[list[str]]:
+    """
+    Лист XLSX средствами стандартной библиотеки (значения, без формул и форматов).
+    Без имени листа читается первый.
+    """
+    with zipfile.ZipFile(path) as z:
+        workbook = ElementTree.fromstring(z.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iterfind("rel:Relationship", _NS)}
+        sheet_id = None
+        for sheet in workbook.iterfind("m:sheets/m:sheet", _NS):
+            if worksheet is None or sheet.get("name") == worksheet:
+                sheet_id = sheet.get(f"{{{_NS['r']}}}id")
+                break
+        if sheet_id is None:
+            raise KeyError(f"Лист {worksheet!r} не найден в {path}")
+        target = targets[sheet_id].lstrip("/")
+        target = target if target.startswith("xl/") else f"xl/{target}"
+
+        shared: list[str] = []
+        if "xl/sharedStrings.xml" in z.namelist():
+            root = ElementTree.fromstring(z.read("xl/sharedStrings.xml"))
+            shared = ["".join(t.text or "" for t in si.iterfind(".//m:t", _NS)) for si in root.iterfind("m:si", _NS)]
+
+        rows: list[list[str]] = []
+        for row in ElementTree.fromstring(z.read(target)).iterfind("m:sheetData/m:row", _NS):
+            index = int(row.get("r", len(rows) + 1)) - 1
+            rows.extend([] for _ in range(index - len(rows) + 1))
+            cells = rows[index]
+            for position, cell in enumerate(row.iterfind("m:c", _NS)):
+                j = _column_index(cell.get("r")) if cell.get("r") else position
+                cells.extend("" for _ in range(j - len(cells) + 1))
+                cells[j] = _cell_text(cell, shared)
+    return _pad(rows)
+
+
+def read_parquet(path: Path) -> list[list[str]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Для чтения Parquet установите pyarrow") from exc
+    table = pq.read_table(path)
+    columns = [[("" if v is None else str(v)) for v in col.to_pylist()] for col in table.columns]
+    return [list(table.column_names)] + [list(row) for row in zip(*columns)]
+
+
+class LocalFileSource(CatalogSource):
+    """
+    Листы из локальных файлов, без сети.
+    path — книга .xlsx (листы по именам) или каталог с файлами
+    "<лист>.csv" / "<лист>.xlsx" / "<лист>.parquet". Параметр doc игнорируется.
+    """
+
+    READERS = {".csv": read_csv, ".parquet": read_parquet}
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def fetch(self, doc: str, worksheet: str) -> list[list[str]]:
+        if self.path.is_file():
+            if self.path.suffix.lower() != ".xlsx":
+                raise ValueError(f"Один файл может быть только книгой .xlsx: {self.path}")
+            return read_xlsx(self.path, worksheet)
+        for suffix, reader in self.READERS.items():
+            file = self.path / f"{worksheet}{suffix}"
+            if file.exists():
+                return reader(file)
+        file = self.path / f"{worksheet}.xlsx"
+        if file.exists():
+            return read_xlsx(file)
+        raise FileNotFoundError(f"Нет файла для листа {worksheet!r} в {self.path}")
+
+
+def catalog_source(settings: Any) -> CatalogSource:
+    """Локальные файлы, если задан CATALOG_PATH, иначе Google Sheets."""
+    if settings.CATALOG_PATH:
+        return LocalFileSource(settings.CATALOG_PATH)
+    return GoogleSheetsSource(settings.GOOGLE_SERVICE_ACCOUNT)
@@ -0,0 +1,129 @@
+import math
+from collections import Counter
+from dataclasses import dataclass
+
+from app.utils.ai.filter import normalize
+
+# Длина основы слова: грубый стемминг, чтобы "доставка" и "доставку" совпадали
+STEM_LENGTH = 5
+# Параметры BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов без токенизатора модели (для кириллицы ~3 символа на токен)."""
+    return len(text) // 3 + 1
+
+
+def _stems(text: str) -> list[str]:
+    return [token[:STEM_LENGTH] for token in normalize(text).split() if len(token) > 1]
+
+
+@dataclass(frozen=True)
+class Chunk:
+    text: str
+    tokens: int
+
+
+def split_rows(values: list[list[str]], max_tokens: int = 120) -> list[Chunk]:
+    """
+    Режет лист на куски по строкам.
+    Строка с единственной заполненной первой ячейкой считается заголовком раздела:
+    он добавляется к строкам раздела, а короткие строки раздела склеиваются в один кусок.
+    Такие строки подряд — обычный текст (описание в колонке A): все, кроме последней,
+    идут отдельными кусками, а не затирают друг друга.
+    """
+    chunks: list[Chunk] = []
+    heading = ""
+    # Был ли под текущим заголовком хоть один ряд данных
+    heading_used = False
+    lines: list[str] = []
+    # Одиночные строки без данных под ними
+    loose: list[str] = []
+
+    def flush(title: str, body: list[str]) -> None:
+        if body:
+            text = "\n".join([title, *body] if title else body)
+            chunks.append(Chunk(text, estimate_tokens(text)))
+            body.clear()
+
+    def add(title: str, body: list[str], line: str) -> None:
+        if body and estimate_tokens("\n".join([title, *body, line])) > max_tokens:
+            flush(title, body)
+        body.append(line)
+
+    for row in values:
+        cells = [cell.strip() for cell in row if cell and cell.strip()]
+        if not cells:
+            continue
+        if len(cells) == 1 and row[0].strip() and len(row) > 1 and not any(c.strip() for c in row[1:]):
+            flush(heading, lines)
+            if heading and not heading_used:
+                add("", loose, heading)
+            heading, heading_used = cells[0], False
+            continue
+        flush("", loose)
+        heading_used = True
+        add(heading, lines, ": ".join(cells) if len(cells) == 2 else " ".join(cells))
+    flush(heading, lines)
+
+    if heading and not heading_used:
+        add("", loose, heading)
+    flush("", loose)
+    return chunks
+
+
+class ChunkIndex:
+    """BM25 по кускам листа; строится один раз на снимок."""
+
+    def __init__(self, chunks: list[Chunk]):
+        self.chunks = chunks
+        self._terms = [Counter(_stems(chunk.text)) for chunk in chunks]
+        lengths = [sum(terms.values()) for terms in self._terms]
+        self._lengths = lengths
+        self._avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        df = Counter(term for terms in self._terms for term in terms)
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    @classmethod
+    def from_values(cls, values: list[list[str]], max_chunk_tokens: int = 120) -> "ChunkIndex":
+        return cls(split_rows(values, max_chunk_tokens))
+
+    def scores(self, question: str) -> list[float]:
+        query = set(_stems(question))
+        result = []
+        for terms, length in zip(self._terms, self._lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self._avg_length or 1))
+            for term in query:
+                tf = terms.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+    def select(self, question: str, token_budget: int) -> str:
+        """
+        Лучшие по BM25 куски в пределах бюджета токенов, в порядке листа.
+        Если совпадений нет, берется начало листа — там обычно общая информация.
+        """
+        scores = self.scores(question)
+        matched = any(scores)
+        ranked = sorted(range(len(self.chunks)), key=lambda i: (-scores[i], i))
+
+        picked: list[int] = []
+        used = 0
+        for i in ranked:
+            if matched and scores[i] == 0 and picked:
+                break
+            cost = self.chunks[i].tokens
+            if used + cost > token_budget:
+                if picked:
+                    continue
+                # Даже один кусок не влез — отдаем его обрезанным
+                return self.chunks[i].text[: token_budget * 3]
+            picked.append(i)
+            used += cost
+        return "\n\n".join(self.chunks[i].text for i in sorted(picked))
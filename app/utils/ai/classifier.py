@@ -0,0 +1,118 @@
+import logging
+from typing import Optional
+
+from app.utils.ai.filter import normalize
+from app.utils.ai.llm import classify_question_ollama
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+GENERAL = "general"
+PRODUCT = "product"
+
+# Основы слов: токен вопроса совпадает, если начинается с основы
+GENERAL_STEMS = (
+    "адрес", "наход", "располож", "телефон", "контакт", "почт", "email", "сайт",
+    "режим", "график", "выходн", "открыт", "закрыт",
+    "достав", "оплат", "самовывоз", "гарант", "возврат", "обмен",
+    "компан", "фирм", "офис", "склад", "филиал", "реквизит", "инн",
+    "скидк", "акци", "вакан",
+)
+# Короткие основы, которые как префикс цепляют товары ("часы", "магазинная тележка"),
+# совпадают только целым словом
+GENERAL_WORDS = frozenset({
+    "где", "час", "часа", "часов",
+    "работа", "работы", "работает", "работаете", "работаем",
+    "магазин", "магазина", "магазине", "магазины", "магазинов",
+})
+PRODUCT_STEMS = (
+    "цен", "стои", "стоим", "стоя", "почем", "прайс", "руб", "купит", "куплю", "заказ",
+    "налич", "есть", "товар", "модел", "артикул", "размер", "цвет", "характерист",
+)
+
+CLASSIFICATIONS = metrics.counter(
+    "ai_classifier_total",
+    "Классификации вопросов по источнику решения (local — без LLM, llm — фолбэк)",
+    labels=("source", "category"),
+)
+FALLBACK_RATIO = metrics.gauge(
+    "ai_classifier_fallback_ratio",
+    "Доля вопросов, для которых классификация ушла в LLM",
+)
+
+
+def _tokens(text: str) -> list[str]:
+    return normalize(text).split()
+
+
+def _hits(tokens: list[str], stems: tuple[str, ...], words: frozenset[str] = frozenset()) -> int:
+    return sum(1 for t in tokens if t.startswith(stems) or t in words)
+
+
+class LexiconClassifier:
+    """
+    Классификатор general/product по словарю без обращения к LLM.
+    Product-сигнал: ценовые/товарные слова и слова из названий и групп каталога.
+    Если перевес одной стороны недостаточен, predict возвращает None.
+    """
+
+    def __init__(self, vocabulary: set[str], min_confidence: float = 0.6):
+        self.vocabulary = vocabulary
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def from_products(cls, products: list[dict], **kwargs) -> "LexiconClassifier":
+        vocabulary = set()
+        for p in products:
+            for field in ("Название", "Группа"):
+                vocabulary.update(t for t in _tokens(str(p.get(field, ""))) if len(t) >= 3)
+        return cls(vocabulary, **kwargs)
+
+    def predict(self, question: str) -> tuple[Optional[str], float]:
+        """(категория или None, уверенность 0..1)."""
+        tokens = _tokens(question)
+        general = _hits(tokens, GENERAL_STEMS, GENERAL_WORDS)
+        product = _hits(tokens, PRODUCT_STEMS) + 1.5 * sum(1 for t in tokens if t in self.vocabulary)
+        total = general + product
+        if not total:
+            return None, 0.0
+        confidence = abs(product - general) / total
+        if confidence < self.min_confidence:
+            return None, confidence
+        return (PRODUCT if product > general else GENERAL), confidence
+
+
+def normalize_category(answer: str) -> str:
+    """Приводит ответ LLM ('General.', ' product' и т.п.) к general/product."""
+    word = normalize(answer).strip()
+    for category in (GENERAL, PRODUCT):
+        if word.startswith(category):
+            return category
+    return answer
+
+
+async def classify_question(question: str, local: Optional[LexiconClassifier] = None) -> str:
+    """
+    Тот же контракт, что у classify_question_ollama, но сначала пробует
+    локальный классификатор и ходит в LLM, только если он не уверен.
+    """
+    if local is not None:
+        category, confidence = local.predict(question)
+        if category is not None:
+            logger.debug("Local classifier: %s (%.2f)", category, confidence)
+            CLASSIFICATIONS.inc(source="local", category=category)
+            FALLBACK_RATIO.set(fallback_rate())
+            return category
+
+    category = normalize_category(await classify_question_ollama(question))
+    CLASSIFICATIONS.inc(source="llm", category=category if category in (GENERAL, PRODUCT) else "unknown")
+    FALLBACK_RATIO.set(fallback_rate())
+    return category
+
+
+def fallback_rate() -> float:
+    """Доля вопросов, ушедших в LLM-классификацию."""
+    llm = CLASSIFICATIONS.total(source="llm")
+    total = llm + CLASSIFICATIONS.total(source="local")
+    return llm / total if total else 0.0
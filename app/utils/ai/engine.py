@@ -1,37 +1,352 @@
+import asyncio
+import hashlib
 import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
 
-from app.utils.ai.filter import filter_products, build_products_context
-from app.utils.ai.llm import classify_question_ollama, generate_answer_ollama
+from app.utils.ai.chunks import ChunkIndex
+from app.utils.ai.filter import build_products_context, score_products_many
+from app.utils.ai.intents import fast_answer
+from app.utils.ai.classifier import GENERAL, PRODUCT, LexiconClassifier, classify_question
+from app.utils.ai.llm import (
+    generate_answer_ollama,
+    get_ollama_client,
+    stream_answer_ollama,
+)
 from app.config.settings import settings
-from app.utils.ai.sheets import  get_sheet_all_values, get_sheet_all_data
+from app.utils.ai.answer_cache import answer_cache
+from app.utils.ai.scheduler import SchedulerRejected
+from app.utils.ai.sheets import SheetSnapshot, get_sheet_snapshot
+from app.utils.ai.vector import EmbeddingIndex
+from app.utils.timing import record, stage
 
 sheet_url = settings.SHEET_DOC_ID
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-async def ask_questioin(msg: str) -> str:
+GENERAL_SHEET = 'Общая информация о компании'
+PRODUCTS_SHEET = 'Товары'
 
-    category = classify_question_ollama(msg)
-    if category == 'general' or category == 'general.':
-        data = get_sheet_all_values(sheet_url, 'Общая информация о компании')
-        logger.debug(data)
-    elif category == 'product' or category == 'product.':
-        data = get_sheet_all_data(sheet_url, 'Товары')
-        # Попытка уменьшить контекст для иишки
-        # Модель слишком маленкая для обработки полного списка товаров
-        filtered = filter_products(data, msg)
+NOT_FOUND_ANSWER = "Я не нашёл такой товар в каталоге."
+UNKNOWN_CATEGORY_ANSWER = "Не удалось определить категорию"
+# Ответы-ошибки не кэшируем: следующая попытка может пройти успешно
+UNCACHEABLE_ANSWERS = {UNKNOWN_CATEGORY_ANSWER, "Не удалось классифицировать", ""}
 
-        if not filtered:
-            return "Я не нашёл такой товар в каталоге."
+_product_index: Optional[EmbeddingIndex] = None
 
-        data = build_products_context(filtered)
 
-    else:
-        return "Не удалось определить категорию"
+def _get_product_index() -> Optional[EmbeddingIndex]:
+    """Векторный индекс товаров, если задана модель эмбеддингов."""
+    global _product_index
+    if _product_index is None and settings.EMBEDDING_MODEL and settings.CHROMA_PERSIST_DIR:
+        _product_index = EmbeddingIndex(
+            settings.CHROMA_PERSIST_DIR,
+            settings.EMBEDDING_MODEL,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+        )
+    return _product_index
+
+
+async def _semantic_products_many(products: list[dict], msgs: list[str], limit: int) -> list[list[tuple[int, float]]]:
+    """(номер строки, косинусная близость) по каждому вопросу; пусто, пока индекс не готов."""
+    index = _get_product_index()
+    if index is None:
+        return [[] for _ in msgs]
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        return await get_ollama_client().embed(texts, settings.EMBEDDING_MODEL)
+
+    if not index.ready(products):
+        # Индекс строится в фоне после загрузки или смены каталога; до тех пор — только нечеткий поиск
+        index.sync_in_background(products, embed)
+        return [[] for _ in msgs]
+    try:
+        hits = await index.query_many(msgs, embed, limit)
+    except Exception:
+        logger.exception("Семантический поиск недоступен, используем только нечеткий")
+        return [[] for _ in msgs]
+    if not index.ready(products):
+        # Пока шел запрос, индекс перестроили под другой снимок: номера строк уже не те
+        return [[] for _ in msgs]
+    return [
+        [(i, score) for i, score in row if score >= settings.EMBEDDING_MIN_SCORE]
+        for row in hits
+    ]
+
+
+async def _retrieve_products_many(products: list[dict], msgs: list[str], limit: int = 3) -> list[list[dict]]:
+    """
+    Нечеткие совпадения по названию и семантические, слитые по оценке; вся пачка за один проход.
+    Оценки приводятся к 0..1 (partial_ratio / 100, косинус как есть), у строки — лучшая из двух.
+    """
+    fuzzy = score_products_many(products, msgs, limit=limit)
+    semantic = await _semantic_products_many(products, msgs, limit)
+    result = []
+    for found, extra in zip(fuzzy, semantic):
+        best = {i: score / 100 for i, score in found}
+        for i, score in extra:
+            best[i] = max(best.get(i, 0.0), score)
+        # При равных оценках — порядок каталога
+        ranked = sorted(best, key=lambda i: (-best[i], i))[:limit]
+        result.append([products[i] for i in ranked])
+    return result
+
+
+async def _retrieve_products(products: list[dict], msg: str, limit: int = 3) -> list[dict]:
+    return (await _retrieve_products_many(products, [msg], limit))[0]
+
+
+def _local_classifier(snapshot: SheetSnapshot) -> LexiconClassifier:
+    return snapshot.derive("classifier", lambda s: LexiconClassifier.from_products(s.table))
+
+
+def _chunk_index(snapshot: SheetSnapshot) -> ChunkIndex:
+    return snapshot.derive(
+        "chunks", lambda s: ChunkIndex.from_values(s.values, settings.AI_CHUNK_TOKENS)
+    )
+
+
+async def _classify(msg: str) -> str:
+    """Локальный классификатор по словарю каталога, LLM — только при неуверенности."""
+    local = None
+    try:
+        local = _local_classifier(await get_sheet_snapshot(sheet_url, PRODUCTS_SHEET))
+    except Exception:
+        logger.exception("Каталог недоступен, классифицируем через LLM")
+    with stage("classify"):
+        return await classify_question(msg, local)
+
+
+async def _general_context(msg: str) -> tuple[Optional[str], Optional[str]]:
+    # В промпт идут только куски листа, релевантные вопросу, а не весь лист
+    index = _chunk_index(await get_sheet_snapshot(sheet_url, GENERAL_SHEET))
+    with stage("retrieve"):
+        return index.select(msg, settings.AI_CONTEXT_TOKEN_BUDGET), None
+
+
+def _fast_answer(msg: str, products: list[dict]) -> Optional[str]:
+    """Простые вопросы о цене и наличии — шаблоном по строке каталога, без LLM."""
+    if not settings.AI_FAST_PATH:
+        return None
+    with stage("fast_path"):
+        return fast_answer(msg, products, settings.AI_FAST_PATH_MIN_SCORE)
+
+
+async def _product_context(msg: str) -> tuple[Optional[str], Optional[str]]:
+    data = (await get_sheet_snapshot(sheet_url, PRODUCTS_SHEET)).table
+    # Попытка уменьшить контекст для иишки
+    # Модель слишком маленкая для обработки полного списка товаров
+    with stage("retrieve"):
+        filtered = await _retrieve_products(data, msg)
+
+    if not filtered:
+        return None, NOT_FOUND_ANSWER
+
+    answer = _fast_answer(msg, filtered)
+    if answer is not None:
+        return None, answer
+
+    return build_products_context(filtered), None
+
+
+_CONTEXT_BUILDERS = {
+    GENERAL: _general_context,
+    PRODUCT: _product_context,
+}
+
+
+def _consume_result(task: asyncio.Task) -> None:
+    # Результат ненужной ветки не нужен, но ошибку забираем, чтобы не шуметь в логах
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug("Спекулятивная ветка упала: %r", task.exception())
+
 
+async def _build_context_speculative(msg: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Классификация и подготовка обеих веток идут параллельно;
+    когда категория известна, ненужная ветка отменяется.
+    """
+    classify = asyncio.create_task(_classify(msg))
+    branches = {
+        category: asyncio.create_task(builder(msg))
+        for category, builder in _CONTEXT_BUILDERS.items()
+    }
+    chosen = None
+    try:
+        category = await classify
+        chosen = branches.get(category)
+    finally:
+        for task in [classify, *branches.values()]:
+            if task is not chosen:
+                task.cancel()
+                task.add_done_callback(_consume_result)
+
+    if chosen is None:
+        return None, UNKNOWN_CATEGORY_ANSWER
+    return await chosen
+
+
+async def _build_context(msg: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Подготавливает контекст для генерации.
+    Возвращает (context, None) или (None, готовый ответ), если до LLM дело не дошло.
+    """
+    if settings.AI_SPECULATIVE_RETRIEVAL:
+        data, answer = await _build_context_speculative(msg)
+    else:
+        builder = _CONTEXT_BUILDERS.get(await _classify(msg))
+        if builder is None:
+            return None, UNKNOWN_CATEGORY_ANSWER
+        data, answer = await builder(msg)
 
     logger.debug(data)
-    answer = generate_answer_ollama(data, msg)
+    return data, answer
+
+
+async def catalog_version() -> str:
+    """Общая версия данных, на которых строятся ответы (оба листа)."""
+    snapshots = await asyncio.gather(
+        get_sheet_snapshot(sheet_url, GENERAL_SHEET),
+        get_sheet_snapshot(sheet_url, PRODUCTS_SHEET),
+    )
+    return hashlib.sha1(":".join(s.version for s in snapshots).encode()).hexdigest()
+
+
+async def _cached_answer(msg: str) -> tuple[str, Optional[str]]:
+    """(версия каталога, ответ из кэша или None)."""
+    with stage("sheets"):
+        version = await catalog_version()
+    with stage("cache"):
+        return version, await answer_cache.get(msg, version)
 
+
+async def ask_questioin(msg: str) -> str:
+    version, cached = await _cached_answer(msg)
+    if cached is not None:
+        return cached
+
+    data, answer = await _build_context(msg)
+    if answer is None:
+        with stage("generate"):
+            answer = await generate_answer_ollama(data, msg)
+
+    if answer not in UNCACHEABLE_ANSWERS:
+        await answer_cache.set(msg, version, answer)
     # Возвращаем только текст ответа, без обёртки в словарь
     return answer
+
+
+async def ask_questioin_stream(msg: str) -> AsyncIterator[str]:
+    """Потоковый вариант ask_questioin: отдает ответ по токенам."""
+    version, cached = await _cached_answer(msg)
+    if cached is not None:
+        yield cached
+        return
+
+    data, answer = await _build_context(msg)
+    if answer is not None:
+        yield answer
+    else:
+        tokens = []
+        started = time.perf_counter()
+        with stage("generate"):
+            async for token in stream_answer_ollama(data, msg):
+                if not tokens:
+                    record("ttft", time.perf_counter() - started)
+                tokens.append(token)
+                yield token
+        answer = "".join(tokens).strip()
+
+    if answer not in UNCACHEABLE_ANSWERS:
+        await answer_cache.set(msg, version, answer)
+
+
+T = TypeVar("T")
+# Сколько раз пакетный вопрос ждет освобождения очереди LLM, прежде чем сдаться
+BATCH_OVERLOAD_RETRIES = 5
+
+
+async def _patiently(sem: asyncio.Semaphore, fn: Callable[[], Awaitable[T]]) -> T:
+    """Не больше N вызовов LLM от пачки разом; при перегрузке ждем, а не падаем."""
+    for attempt in range(BATCH_OVERLOAD_RETRIES + 1):
+        try:
+            async with sem:
+                return await fn()
+        except SchedulerRejected as exc:
+            if attempt == BATCH_OVERLOAD_RETRIES:
+                raise
+            await asyncio.sleep(exc.retry_after)
+
+
+async def ask_questions_batch(msgs: list[str], concurrency: int = 2) -> AsyncIterator[tuple[int, Optional[str]]]:
+    """
+    Ответы на пачку вопросов в порядке готовности: (номер вопроса, ответ).
+    Снимки листов берутся один раз, классификация и поиск товаров идут
+    по всей пачке сразу, к LLM одновременно не больше concurrency запросов.
+    Ответ None — вопрос не удалось обработать (ошибка в логе), остальные идут дальше.
+    """
+    version = await catalog_version()
+    products, general = await asyncio.gather(
+        get_sheet_snapshot(sheet_url, PRODUCTS_SHEET),
+        get_sheet_snapshot(sheet_url, GENERAL_SHEET),
+    )
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def finish(i: int, answer: str) -> tuple[int, str]:
+        if answer not in UNCACHEABLE_ANSWERS:
+            await answer_cache.set(msgs[i], version, answer)
+        return i, answer
+
+    pending = []
+    for i, msg in enumerate(msgs):
+        cached = await answer_cache.get(msg, version)
+        if cached is not None:
+            yield i, cached
+        else:
+            pending.append(i)
+
+    local = _local_classifier(products)
+    categories = await asyncio.gather(
+        *(_patiently(sem, lambda m=msgs[i]: classify_question(m, local)) for i in pending),
+        return_exceptions=True,
+    )
+    for i, category in zip(pending, categories):
+        if isinstance(category, Exception):
+            logger.error("Не удалось классифицировать вопрос пачки", exc_info=category)
+            yield i, None
+
+    contexts: dict[int, str] = {}
+    product_ids = [i for i, c in zip(pending, categories) if c == PRODUCT]
+    found = await _retrieve_products_many(products.table, [msgs[i] for i in product_ids]) if product_ids else []
+    for i, rows in zip(product_ids, found):
+        if not rows:
+            yield await finish(i, NOT_FOUND_ANSWER)
+        elif (fast := _fast_answer(msgs[i], rows)) is not None:
+            yield await finish(i, fast)
+        else:
+            contexts[i] = build_products_context(rows)
+
+    chunks = _chunk_index(general)
+    for i, category in zip(pending, categories):
+        if isinstance(category, Exception):
+            continue
+        if category == GENERAL:
+            contexts[i] = chunks.select(msgs[i], settings.AI_CONTEXT_TOKEN_BUDGET)
+        elif category != PRODUCT:
+            yield i, UNKNOWN_CATEGORY_ANSWER
+
+    async def answer(i: int) -> tuple[int, Optional[str]]:
+        try:
+            text = await _patiently(sem, lambda: generate_answer_ollama(contexts[i], msgs[i]))
+        except Exception:
+            logger.exception("Не удалось ответить на вопрос пачки")
+            return i, None
+        return await finish(i, text)
+
+    tasks = [asyncio.create_task(answer(i)) for i in contexts]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for task in tasks:
+            task.cancel()
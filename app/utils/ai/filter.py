@@ -1,6 +1,11 @@
-from rapidfuzz import fuzz
+from typing import Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process
 import re
 
+from app.utils.ai.ngram import TrigramIndex
+
 
 def normalize(text: str) -> str:
     text = text.lower()
@@ -8,12 +13,181 @@ def normalize(text: str) -> str:
     return text
 
 
-def product_score(product: dict, query: str) -> int:
-    text = normalize(
+def product_choice(product: dict) -> str:
+    """Нормализованная строка товара, по которой идет нечеткий поиск."""
+    return normalize(
         str(product.get("Название", "")) + " " +
         str(product.get("Группа", ""))
     )
-    return fuzz.partial_ratio(normalize(query), text)
+
+
+def product_score(product: dict, query: str) -> int:
+    return fuzz.partial_ratio(normalize(query), product_choice(product))
+
+
+# С какого размера каталога кандидатов отбирает триграммный индекс
+NGRAM_INDEX_MIN_ROWS = 5000
+NGRAM_MAX_CANDIDATES = 500
+
+
+def _product_fields(product: dict) -> tuple[str, str]:
+    return str(product.get("Название", "")), str(product.get("Группа", ""))
+
+
+class ProductMatcher:
+    """
+    Нечеткий поиск по каталогу.
+    Строки товаров нормализуются один раз при создании, запрос скорится
+    одним батч-вызовом rapidfuzz. На больших каталогах скорятся только
+    кандидаты из триграммного индекса.
+    """
+
+    def __init__(
+        self,
+        products: list[dict],
+        index_min_rows: int = NGRAM_INDEX_MIN_ROWS,
+        max_candidates: int = NGRAM_MAX_CANDIDATES,
+    ):
+        self.products = products
+        # Версия данных каталога, если ее проставил снимок листа
+        self.version = getattr(products, "version", None)
+        self.index_min_rows = index_min_rows
+        self.max_candidates = max_candidates
+        self._fields = [_product_fields(p) for p in products]
+        self.choices = [product_choice(p) for p in products]
+        self.index: Optional[TrigramIndex] = None
+        if len(self.choices) >= index_min_rows:
+            self.index = TrigramIndex.build(self.choices)
+
+    def update(self, products: list[dict]) -> None:
+        """Переходит на новую версию каталога, переиндексируя только измененные строки."""
+        changes = getattr(products, "changes", None)
+        if changes is not None and self.version is not None and changes.base_version == self.version:
+            self._apply(products, changes)
+        else:
+            self._update_positional(products)
+        self.version = getattr(products, "version", None)
+        if self.index is None and len(self.choices) >= self.index_min_rows:
+            self.index = TrigramIndex.build(self.choices)
+
+    def _apply(self, products: list[dict], changes) -> None:
+        """Обновление по готовому диффу снимка: нормализуются только новые и измененные строки."""
+        source = changes.source.tolist()
+        fresh = changes.fresh.tolist()
+        fields = [self._fields[j] if j >= 0 else None for j in source]
+        choices = [self.choices[j] if j >= 0 else None for j in source]
+        for i in fresh:
+            fields[i] = _product_fields(products[i])
+            choices[i] = product_choice(products[i])
+        if self.index is not None:
+            self.index.relabel(changes.old_to_new(len(self.choices)))
+            for i in fresh:
+                self.index.add(i, choices[i])
+        self._fields = fields
+        self.choices = choices
+        self.products = products
+
+    def _update_positional(self, products: list[dict]) -> None:
+        fields = [_product_fields(p) for p in products]
+        for i, row in enumerate(fields):
+            if i < len(self._fields) and self._fields[i] == row:
+                continue
+            choice = product_choice(products[i])
+            if i < len(self.choices):
+                self.choices[i] = choice
+            else:
+                self.choices.append(choice)
+            if self.index is not None:
+                self.index.update(i, choice)
+        if self.index is not None:
+            for i in range(len(fields), len(self._fields)):
+                self.index.remove(i)
+        del self.choices[len(fields):]
+        self._fields = fields
+        self.products = products
+
+    def scores(self, queries: list[str], threshold: int = 0, choices: Optional[list[str]] = None) -> np.ndarray:
+        """Матрица оценок (запросы x товары); ниже threshold — 0."""
+        return process.cdist(
+            [normalize(q) for q in queries],
+            self.choices if choices is None else choices,
+            scorer=fuzz.partial_ratio,
+            score_cutoff=threshold,
+            workers=-1,
+        )
+
+    def search(self, question: str, limit: int = 3, threshold: int = 50) -> list[dict]:
+        return self._rows(self.search_scored(question, limit, threshold))
+
+    def search_scored(self, question: str, limit: int = 3, threshold: int = 50) -> list[tuple[int, float]]:
+        """То же, что search, но (номер строки, оценка 0..100) — для слияния с другими поисками."""
+        if not self.choices or limit <= 0:
+            return []
+        if self.index is None:
+            return self.select(self.scores([question], threshold)[0], limit, threshold)
+
+        ids = self.index.candidates(normalize(question), self.max_candidates)
+        if not len(ids):
+            return []
+        scores = self.scores([question], threshold, [self.choices[i] for i in ids])[0]
+        return self.select(scores, limit, threshold, ids)
+
+    def search_many(self, questions: list[str], limit: int = 3, threshold: int = 50) -> list[list[dict]]:
+        return [self._rows(hits) for hits in self.search_many_scored(questions, limit, threshold)]
+
+    def search_many_scored(
+        self, questions: list[str], limit: int = 3, threshold: int = 50
+    ) -> list[list[tuple[int, float]]]:
+        """Поиск для пачки вопросов; без индекса — одна матрица cdist на всю пачку."""
+        if not questions:
+            return []
+        if not self.choices or limit <= 0:
+            return [[] for _ in questions]
+        if self.index is not None:
+            return [self.search_scored(q, limit, threshold) for q in questions]
+        matrix = self.scores(questions, threshold)
+        return [self.select(row, limit, threshold) for row in matrix]
+
+    def _rows(self, hits: list[tuple[int, float]]) -> list[dict]:
+        return [self.products[i] for i, _ in hits]
+
+    def select(
+        self,
+        scores: np.ndarray,
+        limit: int,
+        threshold: int,
+        ids: Optional[np.ndarray] = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Top-k (номер строки, оценка) без полной сортировки; при равенстве — порядок каталога.
+        ids — номера строк, которым соответствуют scores (по умолчанию все подряд).
+        """
+        if ids is None:
+            ids = np.arange(len(scores))
+        candidates = np.flatnonzero(scores >= threshold)
+        if len(candidates) > limit:
+            cand_scores = scores[candidates]
+            kth = np.partition(cand_scores, -limit)[-limit]
+            above = candidates[cand_scores > kth]
+            tied = candidates[cand_scores == kth]
+            ties = tied[np.argsort(ids[tied], kind="stable")][:limit - len(above)]
+            candidates = np.concatenate([above, ties])
+        order = np.lexsort((ids[candidates], -scores[candidates]))
+        candidates = candidates[order]
+        return [(int(i), float(score)) for i, score in zip(ids[candidates], scores[candidates])]
+
+
+_matcher: Optional[ProductMatcher] = None
+
+
+def get_matcher(products: list[dict]) -> ProductMatcher:
+    """Матчер для текущей версии каталога; при смене списка обновляется инкрементально."""
+    global _matcher
+    if _matcher is None:
+        _matcher = ProductMatcher(products)
+    elif _matcher.products is not products:
+        _matcher.update(products)
+    return _matcher
 
 
 def filter_products(
@@ -22,28 +196,33 @@ def filter_products(
     limit: int = 3,
     threshold: int = 50
 ) -> list[dict]:
-    scored = []
+    return get_matcher(products).search(question, limit=limit, threshold=threshold)
 
-    for p in products:
-        score = product_score(p, question)
-        if score >= threshold:
-            scored.append((score, p))
 
-    scored.sort(key=lambda x: x[0], reverse=True)
+def filter_products_many(
+    products: list[dict],
+    questions: list[str],
+    limit: int = 3,
+    threshold: int = 50
+) -> list[list[dict]]:
+    return get_matcher(products).search_many(questions, limit=limit, threshold=threshold)
 
-    return [p for _, p in scored[:limit]]
+
+def score_products_many(
+    products: list[dict],
+    questions: list[str],
+    limit: int = 3,
+    threshold: int = 50
+) -> list[list[tuple[int, float]]]:
+    return get_matcher(products).search_many_scored(questions, limit=limit, threshold=threshold)
 
 
 def build_products_context(products: list[dict]) -> str:
-    blocks = []
-
+    """Одна строка на товар: "Название — цена руб. (группа)"."""
+    lines = []
     for p in products:
-        blocks.append(
-            f"""
-Название: {p.get('Название')}
-Цена: {p.get('Цена за шт в рублях', 'не указана')}
-Группа: {p.get('Группа', '—')}
-""".strip()
-        )
-
-    return "\n\n".join(blocks)
\ No newline at end of file
+        price = p.get('Цена за шт в рублях')
+        price = f"{price} руб." if price not in (None, "") else "цена не указана"
+        group = p.get('Группа')
+        lines.append(f"{p.get('Название')} — {price}" + (f" ({group})" if group else ""))
+    return "\n".join(lines)
@@ -0,0 +1,122 @@
+import logging
+from typing import Optional
+
+from rapidfuzz import fuzz
+
+from app.utils.ai.filter import normalize
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+PRICE = "price"
+AVAILABILITY = "availability"
+
+# Основы слов: токен вопроса совпадает, если начинается с основы
+INTENT_STEMS = {
+    # Только слова о цене: "сколько" само по себе бывает и "сколько весит"
+    PRICE: ("цен", "стоит", "стоим", "почем", "прайс", "руб"),
+    AVAILABILITY: ("есть", "налич", "продает", "продаете", "бывает"),
+}
+# Служебные слова, которые не относятся к названию товара
+FILLER_WORDS = {"а", "и", "у", "в", "ли", "вас", "нас", "мне", "на", "за", "шт", "это", "сколько"}
+FILLER_STEMS = ("штук", "скаж", "подскаж", "пожалуйст", "сейчас")
+# Вопросы, на которые шаблоном не ответить: сравнения, советы, характеристики.
+# Короткие слова — только целиком: "чем" не должно ловить "чемодан", "как" — "каструлю"
+COMPLEX_WORDS = {
+    "чем", "лучше", "как", "какой", "какая", "какое", "какие", "каким", "какую", "каком", "каких",
+    "почему", "зачем",
+}
+COMPLEX_STEMS = ("отлича", "сравн", "посовет")
+
+STOCK_COLUMNS = ("Наличие", "Остаток", "В наличии")
+OUT_OF_STOCK = {"0", "нет", "no", "false", "отсутствует"}
+
+FAST_PATH = metrics.counter(
+    "ai_fast_path_total",
+    "Вопросы о товарах по исходу быстрого пути (hit — ответ шаблоном без LLM)",
+    labels=("result",),
+)
+FAST_PATH_HIT_RATIO = metrics.gauge("ai_fast_path_hit_ratio", "Доля вопросов о товарах, отвеченных без LLM")
+
+
+def parse_question(question: str) -> tuple[Optional[str], str]:
+    """(намерение или None, слот — текст вопроса без слов намерения и служебных слов)."""
+    tokens = normalize(question).split()
+    intents = set()
+    slot = []
+    for token in tokens:
+        if token in COMPLEX_WORDS or token.startswith(COMPLEX_STEMS):
+            return None, ""
+        matched = [intent for intent, stems in INTENT_STEMS.items() if token.startswith(stems)]
+        if matched:
+            intents.update(matched)
+        elif token not in FILLER_WORDS and not token.startswith(FILLER_STEMS):
+            slot.append(token)
+    # "есть ли X и сколько стоит" — цена отвечает на оба вопроса
+    intent = PRICE if PRICE in intents else (AVAILABILITY if intents else None)
+    return intent, " ".join(slot)
+
+
+def _price(product: dict) -> Optional[str]:
+    price = product.get("Цена за шт в рублях")
+    return None if price in (None, "") else f"{price} руб."
+
+
+def _in_stock(product: dict) -> Optional[bool]:
+    for column in STOCK_COLUMNS:
+        if column in product:
+            return str(product[column]).strip().lower() not in OUT_OF_STOCK
+    return None
+
+
+def render(intent: str, product: dict) -> Optional[str]:
+    """
+    Ответ шаблоном по строке каталога; None — строка не отвечает на вопрос.
+    Без колонки наличия на "есть ли" отвечаем только ценой, не обещая, что товар есть.
+    """
+    name = str(product.get("Название", "")).lower()
+    price = _price(product)
+    in_stock = _in_stock(product)
+    if in_stock is False:
+        return f"{name} сейчас нет в наличии"
+    if intent == PRICE:
+        return f"{name} — {price}" if price else f"цена на {name} не указана"
+    if in_stock is None:
+        return f"{name} — {price}" if price else None
+    answer = f"да, {name} есть"
+    return f"{answer}, {price}" if price else answer
+
+
+def fast_answer(question: str, candidates: list[dict], min_score: int = 90, margin: int = 10) -> Optional[str]:
+    """
+    Ответ шаблоном, если вопрос — простой запрос цены/наличия и среди
+    кандидатов ровно один уверенно совпадает с названием. Иначе None (нужна LLM).
+    Слот сравнивается с названием целиком (token_sort_ratio): лишние слова вопроса
+    ("весит", "гарантия", "чехол") и неполное название ("чайник") снижают оценку.
+    """
+    intent, slot = parse_question(question)
+    if intent is None or not slot or not candidates:
+        _count("no_intent")
+        return None
+
+    scores = sorted(
+        ((fuzz.token_sort_ratio(slot, normalize(str(p.get("Название", "")))), i) for i, p in enumerate(candidates)),
+        reverse=True,
+    )
+    best, index = scores[0]
+    runner_up = scores[1][0] if len(scores) > 1 else 0
+    if best < min_score or best - runner_up < margin:
+        logger.debug("Быстрый путь: неоднозначно (%s vs %s)", best, runner_up)
+        _count("ambiguous")
+        return None
+
+    answer = render(intent, candidates[index])
+    _count("hit" if answer is not None else "no_data")
+    return answer
+
+
+def _count(result: str) -> None:
+    FAST_PATH.inc(result=result)
+    total = FAST_PATH.total()
+    FAST_PATH_HIT_RATIO.set(FAST_PATH.value(result="hit") / total if total else 0.0)
@@ -1,114 +1,305 @@
+import asyncio
 import json
 import logging
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Optional, Union
 
 import httpx
 
-OLLAMA_HOST = "http://ollama:11434"
-OLLAMA_MODEL= "llama3.2:3b"
+from app.utils.ai.backends import Backend, BackendPool
+from app.utils.ai.scheduler import LLMScheduler, SchedulerRejected, get_scheduler
+from app.utils.metrics import metrics
+from app.utils.timing import record
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-def classify_question_ollama(question: str) -> str:
-    prompt = f"""
-    Ты — точный ассистент.
-    Классифицируй вопрос как 'general' если общий про компанию,
-    или 'product' если про товар. Ответь строго одним словом: general или product 
-    Не добавляй в конце точку.
-    Не добавляй знаков, точек, других слов или символов.
-    Вопрос: "{question}"
-    
-    Правила:
-    - Никогда не придумывай, не дополняй, не объясняй и не извиняйся.
-    - Не добавляй пунктуацию, кроме необходимой (например, точки в конце не ставь).
-
-    """
-    url = f"{OLLAMA_HOST}/api/chat"
-    data = {
-        "model": OLLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False
-    }
-    try:
-        with httpx.stream("POST", url, json=data, timeout=120.0) as resp:
-            resp.raise_for_status()
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+LLM_TOKENS = metrics.histogram(
+    "ai_llm_tokens", "Токены на один вызов LLM (prompt — промпт, completion — ответ)",
+    labels=("kind",), buckets=TOKEN_BUCKETS,
+)
+# Длительности из финального чанка Ollama (наносекунды) -> этапы в секундах
+OLLAMA_DURATIONS = {
+    "load_duration": "llm_load",
+    "prompt_eval_duration": "llm_prompt_eval",
+    "eval_duration": "llm_eval",
+}
+
+
+def _record_llm_stats(chunk: dict) -> None:
+    """Статистика генерации из последнего (done) чанка /api/chat."""
+    for field, kind in (("prompt_eval_count", "prompt"), ("eval_count", "completion")):
+        if field in chunk:
+            LLM_TOKENS.observe(chunk[field], kind=kind)
+    for field, name in OLLAMA_DURATIONS.items():
+        if field in chunk:
+            record(name, chunk[field] / 1e9)
+
 
-            full_text = ""
+class OllamaClient:
+    """Асинхронный клиент Ollama поверх пула серверов с общими пулами соединений."""
 
-            for line in resp.iter_lines():
-                if not line.strip():
-                    continue
-                logger.debug(line)
+    def __init__(
+        self,
+        host: Union[str, list[str]],
+        model: str,
+        timeout: float = 120.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        keep_alive: Optional[str] = None,
+        probe_interval: float = 0.0,
+        eject_after: int = 2,
+        eject_seconds: float = 30.0,
+    ):
+        self.model = model
+        self.scheduler = scheduler
+        # Сколько Ollama держит модель в памяти после запроса ("30m", "-1" — всегда)
+        self.keep_alive = keep_alive
+        self.pool = BackendPool(
+            [host] if isinstance(host, str) else list(host),
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+            max_connections=max_connections,
+            transport=transport,
+            probe_interval=probe_interval,
+            eject_after=eject_after,
+            eject_seconds=eject_seconds,
+        )
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "OllamaClient":
+        return cls(
+            host=settings.ollama_hosts,
+            model=settings.OLLAMA_MODEL,
+            timeout=settings.OLLAMA_TIMEOUT,
+            connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            scheduler=get_scheduler(),
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            probe_interval=settings.OLLAMA_PROBE_INTERVAL,
+            eject_after=settings.OLLAMA_EJECT_AFTER,
+            eject_seconds=settings.OLLAMA_EJECT_SECONDS,
+        )
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    def _payload(self, messages: list[dict], stream: bool, **extra: Any) -> dict:
+        data = {"model": self.model, "messages": messages, "stream": stream, **extra}
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        return data
+
+    async def _post(self, path: str, payload: dict) -> httpx.Response:
+        """POST на наименее загруженный бэкенд; при недоступности — на следующий."""
+        tried: tuple = ()
+        while True:
+            try:
+                async with self.pool.lease(exclude=tried) as backend:
+                    tried += (backend,)
+                    resp = await backend.client.post(path, json=payload)
+                    resp.raise_for_status()
+                    return resp
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if len(tried) >= len(self.pool):
+                    raise
+
+    async def stream_chat(self, messages: list[dict], stream: bool = True) -> AsyncIterator[dict]:
+        """
+        Отдает распарсенные NDJSON-чанки ответа /api/chat.
+        Пока идет генерация, держит слот планировщика LLM и бэкенд пула.
+        Если бэкенд не принял соединение, запрос уходит на следующий.
+        """
+        data = self._payload(messages, stream)
+        slot = self.scheduler.slot() if self.scheduler is not None else nullcontext()
+        async with slot:
+            tried: tuple = ()
+            while True:
                 try:
-                    chunk = json.loads(line)
+                    async with self.pool.lease(exclude=tried) as backend:
+                        tried += (backend,)
+                        async with backend.client.stream("POST", "/api/chat", json=data) as resp:
+                            if resp.is_error:
+                                await resp.aread()
+                            resp.raise_for_status()
 
-                except json.JSONDecodeError:
-                    logging.error(f"Не могу распарсить строку: {line}")
-                    continue
+                            async for line in resp.aiter_lines():
+                                if not line.strip():
+                                    continue
+                                logger.debug(line)
+                                try:
+                                    chunk = json.loads(line)
+                                except json.JSONDecodeError:
+                                    logger.error(f"Не могу распарсить строку: {line}")
+                                    continue
+                                if chunk.get("done"):
+                                    _record_llm_stats(chunk)
+                                yield chunk
+                    return
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    # До ответа дело не дошло — повторить на другом бэкенде безопасно
+                    if len(tried) >= len(self.pool):
+                        raise
 
-                msg = chunk.get("message", {})
-                if "content" in msg:
-                    full_text += msg["content"]
+    async def warm_up(self, system_prompts: tuple[str, ...] = ()) -> None:
+        """
+        Загружает модель в память каждого бэкенда и прогоняет системные промпты,
+        чтобы их префикс уже лежал в KV-кэше к первому запросу пользователя.
+        Идет в обход планировщика: вызывается при старте, пока очереди нет.
+        """
+        async def warm(backend: Backend) -> None:
+            resp = await backend.client.post("/api/chat", json=self._payload([], stream=False))
+            resp.raise_for_status()
+            for prompt in system_prompts:
+                messages = [{"role": "system", "content": prompt}, {"role": "user", "content": "."}]
+                resp = await backend.client.post(
+                    "/api/chat",
+                    json=self._payload(messages, stream=False, options={"num_predict": 1}),
+                )
+                resp.raise_for_status()
 
-            return full_text.strip().lower()
+        results = await asyncio.gather(*(warm(b) for b in self.pool.backends), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if len(errors) == len(results):
+            raise errors[0]
+        for backend, result in zip(self.pool.backends, results):
+            if isinstance(result, Exception):
+                logger.warning("Не удалось прогреть %s: %r", backend.host, result)
 
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error: {e.response.status_code} - {e.response.text}")
-        return "Не удалось классифицировать"
+    async def embed(self, texts: list[str], model: str) -> list[list[float]]:
+        """Эмбеддинги пачкой через /api/embed."""
+        resp = await self._post("/api/embed", {"model": model, "input": texts})
+        return resp.json()["embeddings"]
+
+    async def chat(self, messages: list[dict]) -> str:
+        full_text = ""
+        async for chunk in self.stream_chat(messages, stream=False):
+            msg = chunk.get("message", {})
+            if "content" in msg:
+                full_text += msg["content"]
+        return full_text
+
+
+_client: Optional[OllamaClient] = None
+
+
+async def init_ollama_client(settings: Any) -> OllamaClient:
+    """Создает общий клиент при старте приложения."""
+    global _client
+    if _client is None:
+        _client = OllamaClient.from_settings(settings)
+    _client.pool.start()
+    return _client
 
-    except Exception as e:
-        logger.error(e)
-        logging.exception("Ошибка запроса к Ollama")
-        return "Не удалось классифицировать"
 
-def generate_answer_ollama(context: str, question: str) -> str:
-    prompt = f"""\
-    Ты — точный ассистент по товарам и бизнесу. Тебе даны только следующие данные:
+async def close_ollama_client() -> None:
+    """Закрывает общий клиент при остановке приложения."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
 
-    {context}
 
-    Ответь **строго и только** на основе этих данных на вопрос: "{question}"
+def get_ollama_client() -> OllamaClient:
+    """Общий клиент; вне lifespan (скрипты, тесты) создается лениво."""
+    global _client
+    if _client is None:
+        from app.config.settings import settings
 
-    Правила:
-    - Если в данных есть точный ответ — выведи его кратко и без пояснений.
-    - Если данных недостаточно или ответа нет — ответь только: "Не знаю".
-    - Никогда не придумывай, не дополняй, не объясняй и не извиняйся.
-    - Не добавляй пунктуацию, кроме необходимой (например, точки в конце не ставь).
-    - Ответ должен быть **одним предложением или фразой**, максимум — коротким перечислением.
+        _client = OllamaClient.from_settings(settings)
+    return _client
 
-    Ответ:"""
 
+# Системные промпты неизменны: Ollama переиспользует KV-кэш их префикса между запросами,
+# поэтому все переменное (вопрос, данные) идет только в сообщение пользователя
+CLASSIFY_SYSTEM_PROMPT = """\
+Ты — точный ассистент.
+Классифицируй вопрос пользователя как 'general', если он общий про компанию,
+или 'product', если он про товар. Ответь строго одним словом: general или product.
 
-    logger.debug(prompt)
-    url = f"{OLLAMA_HOST}/api/chat"
-    data = {
-        "model": OLLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False
-    }
+Правила:
+- Не добавляй знаков, точек, других слов или символов.
+- Никогда не придумывай, не дополняй, не объясняй и не извиняйся."""
+
+ANSWER_SYSTEM_PROMPT = """\
+Ты — точный ассистент по товарам и бизнесу.
+Пользователь пришлет данные и вопрос. Отвечай строго и только на основе этих данных.
+
+Правила:
+- Если в данных есть точный ответ — выведи его кратко и без пояснений.
+- Если данных недостаточно или ответа нет — ответь только: "Не знаю".
+- Никогда не придумывай, не дополняй, не объясняй и не извиняйся.
+- Не добавляй пунктуацию, кроме необходимой (например, точки в конце не ставь).
+- Ответ должен быть одним предложением или фразой, максимум — коротким перечислением."""
+
+SYSTEM_PROMPTS = (CLASSIFY_SYSTEM_PROMPT, ANSWER_SYSTEM_PROMPT)
+
+
+def _classify_messages(question: str) -> list[dict]:
+    return [
+        {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Вопрос: {question}"},
+    ]
+
+
+async def warm_up_ollama() -> None:
+    """Прогрев модели при старте API; ошибка не мешает запуску."""
     try:
-        with httpx.stream("POST", url, json=data, timeout=120.0) as resp:
-            resp.raise_for_status()
+        await get_ollama_client().warm_up(SYSTEM_PROMPTS)
+        logger.info("Модель Ollama прогрета")
+    except Exception:
+        logger.exception("Не удалось прогреть модель Ollama")
 
-            full_text = ""
 
-            for line in resp.iter_lines():
-                if not line.strip():
-                    continue
-                logger.debug(line)
-                try:
-                    chunk = json.loads(line)
+async def classify_question_ollama(question: str) -> str:
+    try:
+        answer = await get_ollama_client().chat(_classify_messages(question))
+        return answer.strip().lower()
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error: {e.response.status_code} - {e.response.text}")
+        return "Не удалось классифицировать"
 
-                except json.JSONDecodeError:
-                    logging.error(f"Не могу распарсить строку: {line}")
-                    continue
+    except SchedulerRejected:
+        raise
 
-                msg = chunk.get("message", {})
-                if "content" in msg:
-                    full_text += msg["content"]
+    except Exception as e:
+        logger.error(e)
+        logger.exception("Ошибка запроса к Ollama")
+        return "Не удалось классифицировать"
 
-            return full_text.strip().lower()
+
+def _answer_messages(context: str, question: str) -> list[dict]:
+    return [
+        {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Данные:\n{context}\n\nВопрос: {question}"},
+    ]
+
+
+async def generate_answer_ollama(context: str, question: str) -> str:
+    messages = _answer_messages(context, question)
+    logger.debug(messages)
+    try:
+        answer = await get_ollama_client().chat(messages)
+        return answer.strip().lower()
 
     except httpx.HTTPStatusError as e:
         logger.error(f"HTTP error: {e.response.status_code} - {e.response.text}")
         return "Не удалось классифицировать"
 
+
+async def stream_answer_ollama(context: str, question: str) -> AsyncIterator[str]:
+    """Тот же ответ, что и generate_answer_ollama, но по токенам."""
+    messages = _answer_messages(context, question)
+    logger.debug(messages)
+    started = False
+    async for chunk in get_ollama_client().stream_chat(messages):
+        token = chunk.get("message", {}).get("content", "")
+        if not started:
+            token = token.lstrip()
+            started = bool(token)
+        if token:
+            yield token.lower()
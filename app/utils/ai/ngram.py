@@ -0,0 +1,144 @@
+from array import array
+from typing import Iterable
+
+import numpy as np
+
+
+def trigrams(text: str) -> set[str]:
+    """Символьные триграммы нормализованной строки (с пробелами по краям слов)."""
+    text = f" {' '.join(text.split())} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Инвертированный индекс по символьным триграммам для отбора кандидатов.
+
+    Основная часть хранится компактно (CSR: indptr + postings в numpy),
+    добавления и правки копятся в дельте и периодически вливаются в основу.
+    Внешний id (номер строки каталога) при правке получает новый внутренний id,
+    старый просто помечается удаленным.
+    """
+
+    def __init__(self, max_df: float = 0.2, compact_ratio: float = 0.25):
+        self.max_df = max_df
+        self.compact_ratio = compact_ratio
+        self._gram_ids: dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._postings = np.empty(0, dtype=np.int32)
+        self._delta: dict[int, array] = {}
+        self._delta_size = 0
+        self._alive = bytearray()
+        self._external = array("q")
+        self._internal: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._internal)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], **kwargs) -> "TrigramIndex":
+        """Строит индекс сразу для всех строк; id документа — его позиция."""
+        index = cls(**kwargs)
+        grams_col = array("q")
+        docs_col = array("q")
+        for doc_id, text in enumerate(texts):
+            internal = index._new_internal(doc_id)
+            for gram in trigrams(text):
+                grams_col.append(index._gram_id(gram))
+                docs_col.append(internal)
+        index._set_base(np.frombuffer(grams_col, dtype=np.int64), np.frombuffer(docs_col, dtype=np.int64))
+        return index
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Добавляет или заменяет документ."""
+        self.remove(doc_id)
+        internal = self._new_internal(doc_id)
+        for gram in trigrams(text):
+            self._delta.setdefault(self._gram_id(gram), array("i")).append(internal)
+            self._delta_size += 1
+        if self._delta_size > max(1024, self.compact_ratio * len(self._postings)):
+            self.compact()
+
+    update = add
+
+    def remove(self, doc_id: int) -> None:
+        internal = self._internal.pop(doc_id, None)
+        if internal is not None:
+            self._alive[internal] = 0
+
+    def relabel(self, old_to_new: np.ndarray) -> None:
+        """
+        Меняет внешние id без переиндексации текстов: old_to_new[старый id] — новый id
+        или -1 (документ удаляется). Нужен, когда строки каталога сдвинулись.
+        """
+        if not self._internal:
+            return
+        olds = np.fromiter(self._internal.keys(), dtype=np.int64, count=len(self._internal))
+        internals = np.fromiter(self._internal.values(), dtype=np.int64, count=len(self._internal))
+        news = np.full(len(olds), -1, dtype=np.int64)
+        known = olds < len(old_to_new)
+        news[known] = old_to_new[olds[known]]
+        keep = news >= 0
+        np.frombuffer(self._alive, dtype=np.uint8)[internals[~keep]] = 0
+        np.frombuffer(self._external, dtype=np.int64)[internals[keep]] = news[keep]
+        self._internal = dict(zip(news[keep].tolist(), internals[keep].tolist()))
+
+    def candidates(self, query: str, limit: int) -> np.ndarray:
+        """Id документов с наибольшим числом общих с запросом триграмм."""
+        gram_ids = [self._gram_ids[g] for g in trigrams(query) if g in self._gram_ids]
+        if not gram_ids or limit <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        lists = {g: self._posting(g) for g in gram_ids}
+        # Слишком частые триграммы почти ничего не отсеивают, но дорого стоят
+        max_len = max(1, int(self.max_df * len(self)))
+        selective = [p for p in lists.values() if len(p) <= max_len]
+        alive = np.frombuffer(self._alive, dtype=bool)
+        # Редкие триграммы могут остаться только у удаленных документов — тогда берем все
+        for parts in filter(None, (selective, list(lists.values()))):
+            counts = np.bincount(np.concatenate(parts), minlength=len(self._alive))
+            counts[~alive] = 0
+            found = np.flatnonzero(counts)
+            if len(found):
+                break
+        if len(found) > limit:
+            found = found[np.argpartition(-counts[found], limit - 1)[:limit]]
+        return np.frombuffer(self._external, dtype=np.int64)[found]
+
+    def compact(self) -> None:
+        """Вливает дельту в основу и выкидывает удаленные документы."""
+        base_grams = np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))
+        delta_grams = [np.full(len(docs), g, dtype=np.int64) for g, docs in self._delta.items()]
+        delta_docs = [np.frombuffer(docs, dtype=np.int32) for docs in self._delta.values()]
+        grams = np.concatenate([base_grams, *delta_grams])
+        docs = np.concatenate([self._postings, *delta_docs]).astype(np.int64)
+        alive = np.frombuffer(self._alive, dtype=bool)[docs]
+        self._delta, self._delta_size = {}, 0
+        self._set_base(grams[alive], docs[alive])
+
+    def _posting(self, gram_id: int) -> np.ndarray:
+        base = self._postings[self._indptr[gram_id]:self._indptr[gram_id + 1]] \
+            if gram_id + 1 < len(self._indptr) else self._postings[:0]
+        delta = self._delta.get(gram_id)
+        if delta is None:
+            return base
+        return np.concatenate([base, np.frombuffer(delta, dtype=np.int32)])
+
+    def _gram_id(self, gram: str) -> int:
+        gram_id = self._gram_ids.get(gram)
+        if gram_id is None:
+            gram_id = self._gram_ids[gram] = len(self._gram_ids)
+        return gram_id
+
+    def _new_internal(self, doc_id: int) -> int:
+        internal = len(self._alive)
+        self._alive.append(1)
+        self._external.append(doc_id)
+        self._internal[doc_id] = internal
+        return internal
+
+    def _set_base(self, grams: np.ndarray, docs: np.ndarray) -> None:
+        order = np.argsort(grams, kind="stable")
+        self._postings = docs[order].astype(np.int32)
+        counts = np.bincount(grams, minlength=len(self._gram_ids))
+        self._indptr = np.concatenate([[0], np.cumsum(counts)])
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Hashable, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Кто и до какого момента (time.monotonic) ждет текущий запрос к LLM
+request_user: ContextVar[Optional[Hashable]] = ContextVar("request_user", default=None)
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+QUEUE_DEPTH = metrics.gauge("ai_llm_queue_depth", "Запросы к LLM, ожидающие слота")
+ACTIVE = metrics.gauge("ai_llm_active", "Запросы к LLM, выполняющиеся сейчас")
+QUEUE_WAIT = metrics.histogram("ai_llm_queue_wait_seconds", "Время ожидания слота LLM")
+REJECTED = metrics.counter("ai_llm_rejected_total", "Отказы планировщика LLM", labels=("reason",))
+
+
+class SchedulerRejected(Exception):
+    """Запрос к LLM не будет выполнен; клиенту стоит повторить через retry_after секунд."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM scheduler rejected request: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class QueueFull(SchedulerRejected):
+    """Общая очередь переполнена."""
+
+
+class UserQueueFull(SchedulerRejected):
+    """У пользователя слишком много запросов в очереди."""
+
+
+class DeadlineExpired(SchedulerRejected):
+    """Вызывающий уже не дождется ответа."""
+
+
+def bind_request(user: Optional[Hashable], timeout: Optional[float]) -> None:
+    """Привязывает к текущему контексту пользователя и дедлайн запроса."""
+    request_user.set(user)
+    request_deadline.set(time.monotonic() + timeout if timeout else None)
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    deadline: Optional[float]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class LLMScheduler:
+    """
+    Ограничивает число одновременных запросов к LLM.
+    Ожидающие стоят в очередях по пользователям, слоты раздаются по кругу,
+    поэтому один активный пользователь не занимает всю модель.
+    При переполнении запрос сразу отклоняется, а просроченные выбрасываются из очереди.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 32, max_queue_per_user: int = 3):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_user = max(1, max_queue_per_user)
+        self._active = 0
+        self._queues: OrderedDict[Any, deque[_Waiter]] = OrderedDict()
+        self._queued = 0
+        # Скользящее среднее времени работы слота — для оценки Retry-After
+        self._avg_service = 5.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def retry_after(self) -> float:
+        waves = (self._queued + 1) / self.max_concurrency
+        return max(1.0, round(waves * self._avg_service, 1))
+
+    def check_admission(self, user: Optional[Hashable] = None) -> None:
+        """Бросает SchedulerRejected, если запрос этого пользователя сейчас не примут."""
+        if self._active < self.max_concurrency and not self._queued:
+            return
+        if self._queued >= self.max_queue:
+            REJECTED.inc(reason="queue_full")
+            raise QueueFull("queue_full", self.retry_after())
+        if user is not None and len(self._queues.get(user, ())) >= self.max_queue_per_user:
+            REJECTED.inc(reason="user_queue_full")
+            raise UserQueueFull("user_queue_full", self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Слот LLM для текущего запроса (пользователь и дедлайн берутся из контекста)."""
+        await self._acquire(request_user.get(), request_deadline.get())
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_service = 0.8 * self._avg_service + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    async def _acquire(self, user: Optional[Hashable], deadline: Optional[float]) -> None:
+        if deadline is not None and time.monotonic() >= deadline:
+            REJECTED.inc(reason="deadline")
+            raise DeadlineExpired("deadline", self.retry_after())
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            ACTIVE.set(self._active)
+            QUEUE_WAIT.observe(0)
+            return
+
+        self.check_admission(user)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), deadline)
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._queued += 1
+        QUEUE_DEPTH.set(self._queued)
+        try:
+            if deadline is None:
+                await waiter.future
+            else:
+                await asyncio.wait_for(waiter.future, max(0.0, deadline - time.monotonic()))
+        except BaseException as exc:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Слот уже выдан, но вызывающий ушел — возвращаем слот
+                self._release()
+            else:
+                self._discard(user, waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                REJECTED.inc(reason="deadline")
+                raise DeadlineExpired("deadline", self.retry_after()) from None
+            raise
+        QUEUE_WAIT.observe(time.monotonic() - waiter.enqueued_at)
+
+    def _release(self) -> None:
+        self._active -= 1
+        while self._queued:
+            waiter = self._next_waiter()
+            if waiter.future.done():
+                continue
+            if waiter.deadline is not None and time.monotonic() >= waiter.deadline:
+                REJECTED.inc(reason="deadline")
+                waiter.future.set_exception(DeadlineExpired("deadline", self.retry_after()))
+                continue
+            self._active += 1
+            waiter.future.set_result(None)
+            break
+        ACTIVE.set(self._active)
+        QUEUE_DEPTH.set(self._queued)
+
+    def _next_waiter(self) -> _Waiter:
+        """Первый ожидающий следующего по кругу пользователя."""
+        user, queue = next(iter(self._queues.items()))
+        waiter = queue.popleft()
+        self._queued -= 1
+        del self._queues[user]
+        if queue:
+            # Пользователь с оставшимися запросами уходит в конец круга
+            self._queues[user] = queue
+        return waiter
+
+    def _discard(self, user: Optional[Hashable], waiter: _Waiter) -> None:
+        queue = self._queues.get(user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            del self._queues[user]
+        QUEUE_DEPTH.set(self._queued)
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        from app.config.settings import settings
+
+        # Слоты масштабируются числом бэкендов: пул сам разводит запросы по серверам
+        _scheduler = LLMScheduler(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY * len(settings.ollama_hosts),
+            max_queue=settings.LLM_MAX_QUEUE,
+            max_queue_per_user=settings.LLM_MAX_QUEUE_PER_USER,
+        )
+    return _scheduler
@@ -1,36 +1,196 @@
+import asyncio
+import hashlib
 import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
 
-import gspread
-from google.oauth2.service_account import Credentials
+import numpy as np
+
+from app.config.settings import settings
+from app.utils.ai.catalog import catalog_source
+from app.utils.ai.table import ProductTable
+from app.utils.singleflight import SingleFlight
 
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-# Авторизация через Service Account
-def get_sheet_all_data(sheet_url: str, sheet_name: str):
-    creds = Credentials.from_service_account_file("service_account.json", scopes=SCOPES)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    logger.debug(sheet_name)
-    sheet = sh.worksheet(sheet_name)
-    data = sheet.get_all_records()
-    logger.debug("DATA FROM SHEET")
-    logger.debug(data)
-    return data
-
-
-def get_sheet_all_values(sheet_url: str, sheet_name: str):
-    creds = Credentials.from_service_account_file("service_account.json", scopes=SCOPES)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    sheet = sh.worksheet(sheet_name)
-    data = sheet.get_all_values()
-    text = "\n".join(
+
+def _row_hash(row: list[str]) -> bytes:
+    # Разделитель ячеек — управляющий символ, которого не бывает в тексте таблиц
+    raw = "\x1f".join(row)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest()
+
+
+@dataclass
+class RowChanges:
+    """
+    Чем строки данных (без заголовка) снимка отличаются от снимка base_version.
+    source[i] — номер той же строки в старом снимке или -1, если строку нужно обработать заново.
+    """
+
+    base_version: str
+    source: np.ndarray
+    added: np.ndarray
+    changed: np.ndarray
+    removed: np.ndarray
+
+    @property
+    def fresh(self) -> np.ndarray:
+        """Новые и измененные строки (позиции в новом снимке)."""
+        return np.flatnonzero(self.source < 0)
+
+    def old_to_new(self, old_size: int) -> np.ndarray:
+        """Для каждой старой строки — ее новая позиция или -1."""
+        mapping = np.full(old_size, -1, dtype=np.int64)
+        kept = np.flatnonzero(self.source >= 0)
+        mapping[self.source[kept]] = kept
+        return mapping
+
+
+@dataclass
+class SheetSnapshot:
+    """
+    Снимок листа на момент загрузки + производные структуры от него.
+    Хэши строк и версия считаются сразу при создании.
+    """
+
+    values: list[list[str]]
+    fetched_at: float = field(default_factory=time.monotonic)
+    # Отличия от предыдущего снимка того же листа (None — сравнивать не с чем)
+    changes: Optional[RowChanges] = field(default=None, repr=False)
+    _derived: dict[str, Any] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self.row_hashes = [_row_hash(row) for row in self.values]
+        # Хэш содержимого листа: меняется только при реальной правке данных
+        self.version = hashlib.sha1(b"".join(self.row_hashes)).hexdigest()
+
+    def derive(self, name: str, factory: Callable[["SheetSnapshot"], Any]) -> Any:
+        """Считает производную структуру один раз на снимок."""
+        if name not in self._derived:
+            self._derived[name] = factory(self)
+        return self._derived[name]
+
+    def diff(self, previous: "SheetSnapshot") -> Optional[RowChanges]:
+        """
+        Отличия строк данных от предыдущего снимка. Строки сопоставляются по хэшу
+        содержимого (перестановки не считаются правкой), измененной считается строка
+        с тем же значением первой ячейки. None — если сменился заголовок.
+        """
+        if not self.values or not previous.values or self.values[0] != previous.values[0]:
+            return None
+        by_hash: dict[bytes, list[int]] = {}
+        for j, h in enumerate(previous.row_hashes[1:]):
+            by_hash.setdefault(h, []).append(j)
+
+        source = np.full(len(self.values) - 1, -1, dtype=np.int64)
+        for i, h in enumerate(self.row_hashes[1:]):
+            same = by_hash.get(h)
+            if same:
+                source[i] = same.pop(0)
+
+        removed = np.setdiff1d(np.arange(len(previous.values) - 1), source[source >= 0])
+        old_keys = {previous.values[j + 1][0] for j in removed.tolist() if previous.values[j + 1]}
+        fresh = np.flatnonzero(source < 0)
+        is_changed = np.array(
+            [bool(self.values[i + 1]) and self.values[i + 1][0] in old_keys for i in fresh.tolist()],
+            dtype=bool,
+        )
+        return RowChanges(
+            base_version=previous.version,
+            source=source,
+            added=fresh[~is_changed] if len(fresh) else fresh,
+            changed=fresh[is_changed] if len(fresh) else fresh,
+            # Старые версии измененных строк тоже считаются удаленными
+            removed=removed,
+        )
+
+    @property
+    def table(self) -> ProductTable:
+        """Строки в колоночном виде (значения как в Worksheet.get_all_records())."""
+        return self.derive("table", _values_to_table)
+
+    @property
+    def text(self) -> str:
+        """Лист одной строкой, непустые ячейки через пробел."""
+        return self.derive("text", _values_to_text)
+
+
+def _values_to_table(snapshot: SheetSnapshot) -> ProductTable:
+    table = ProductTable.from_values(snapshot.values)
+    # Версия и отличия нужны индексам, чтобы обновляться инкрементально
+    table.version = snapshot.version
+    table.changes = snapshot.changes
+    return table
+
+
+def _values_to_text(snapshot: SheetSnapshot) -> str:
+    return "\n".join(
         " ".join(cell for cell in row if cell)
-        for row in data
+        for row in snapshot.values
         if any(row)
     )
-    logger.debug("DATA FROM SHEET")
-    logger.debug(text)
-    return text
\ No newline at end of file
+
+
+class SheetSnapshotCache:
+    """
+    TTL-кэш снимков листов по ключу (doc, worksheet).
+    Просроченный снимок отдается сразу, а обновляется одной фоновой задачей;
+    одновременные промахи ждут одну общую загрузку.
+    """
+
+    def __init__(self, fetch: Callable[[str, str], list[list[str]]], ttl: float):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._snapshots: dict[tuple[str, str], SheetSnapshot] = {}
+        self._flight = SingleFlight()
+
+    async def get(self, doc: str, worksheet: str) -> SheetSnapshot:
+        key = (doc, worksheet)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return await self._flight.do(key, lambda: self._load(key))
+
+        if time.monotonic() - snapshot.fetched_at >= self.ttl and key not in self._flight:
+            task = self._flight.start(key, lambda: self._load(key))
+            task.add_done_callback(_log_refresh_error)
+        return snapshot
+
+    def invalidate(self, doc: Optional[str] = None, worksheet: Optional[str] = None) -> None:
+        for key in list(self._snapshots):
+            if (doc is None or key[0] == doc) and (worksheet is None or key[1] == worksheet):
+                del self._snapshots[key]
+
+    async def _load(self, key: tuple[str, str]) -> SheetSnapshot:
+        values = await asyncio.to_thread(self._fetch, *key)
+        snapshot = await asyncio.to_thread(SheetSnapshot, values)
+        previous = self._snapshots.get(key)
+        if previous is not None:
+            if previous.version == snapshot.version:
+                # Данные не менялись: оставляем старый снимок со всеми производными структурами
+                previous.fetched_at = snapshot.fetched_at
+                return previous
+            snapshot.changes = await asyncio.to_thread(snapshot.diff, previous)
+            if snapshot.changes is not None:
+                c = snapshot.changes
+                logger.info(
+                    "Лист %s изменился: +%s ~%s -%s строк",
+                    key[1], len(c.added), len(c.changed), len(c.removed) - len(c.changed),
+                )
+        self._snapshots[key] = snapshot
+        return snapshot
+
+
+def _log_refresh_error(task: asyncio.Task) -> None:
+    # Устаревший снимок продолжает отдаваться до следующей попытки
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Не удалось обновить лист", exc_info=task.exception())
+
+
+# Google Sheets или локальные файлы (CATALOG_PATH) — для работы без сети
+sheet_cache = SheetSnapshotCache(catalog_source(settings).fetch, ttl=settings.CACHE_TTL)
+
+
+async def get_sheet_snapshot(sheet_url: str, sheet_name: str) -> SheetSnapshot:
+    return await sheet_cache.get(sheet_url, sheet_name)
@@ -0,0 +1,136 @@
+import operator
+import sys
+from collections.abc import Iterator, Mapping, Sequence
+from typing import Any, Optional, Union
+
+import numpy as np
+from gspread.utils import numericise
+
+
+class _StringColumn:
+    """Словарное кодирование: коды int32 + уникальные интернированные строки."""
+
+    def __init__(self, cells: list[str]):
+        labels: dict[str, int] = {}
+        codes = np.empty(len(cells), dtype=np.int32)
+        for i, cell in enumerate(cells):
+            code = labels.get(cell)
+            if code is None:
+                code = labels[cell] = len(labels)
+            codes[i] = code
+        self.codes = codes
+        self.labels = tuple(sys.intern(label) for label in labels)
+
+    def __getitem__(self, i: int) -> str:
+        return self.labels[self.codes[i]]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(sys.getsizeof(label) for label in self.labels)
+
+
+class _NumberColumn:
+    """Числа в float64; пустые ячейки — NaN и отдаются как "" (как в get_all_records)."""
+
+    def __init__(self, values: list[Union[int, float, str]]):
+        self.values = np.array([np.nan if v == "" else v for v in values], dtype=np.float64)
+
+    def __getitem__(self, i: int) -> Union[int, float, str]:
+        value = self.values[i]
+        if np.isnan(value):
+            return ""
+        return int(value) if value.is_integer() else float(value)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+
+def _column(cells: list[str]) -> Union[_StringColumn, _NumberColumn]:
+    values = [numericise(cell, empty2zero=False, default_blank="") for cell in cells]
+    if any(v != "" for v in values) and all(isinstance(v, (int, float)) for v in values if v != ""):
+        return _NumberColumn(values)
+    return _StringColumn(cells)
+
+
+class ProductRow(Mapping):
+    """Строка таблицы как read-only dict: значения читаются из колонок по запросу."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "ProductTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        return self._table._columns[key][self._index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.columns)
+
+    def __len__(self) -> int:
+        return len(self._table.columns)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ProductRow) and other._table is self._table:
+            return other._index == self._index
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        return hash((id(self._table), self._index))
+
+    def __repr__(self) -> str:
+        return f"ProductRow({dict(self)!r})"
+
+
+class ProductTable(Sequence):
+    """
+    Каталог в колоночном виде: числовые колонки — массивы NumPy,
+    строковые — словарно закодированы. Строки отдаются как ProductRow,
+    поэтому таблицу можно передавать везде, где ожидался list[dict].
+    """
+
+    def __init__(self, columns: list[str], data: dict[str, Union[_StringColumn, _NumberColumn]], size: int):
+        self.columns = columns
+        self._columns = data
+        self._size = size
+        # Проставляются снимком листа: версия данных и отличия от предыдущей (RowChanges)
+        self.version: Optional[str] = None
+        self.changes = None
+
+    @classmethod
+    def from_values(cls, values: list[list[str]]) -> "ProductTable":
+        """Из сетки значений листа: первая строка — заголовки."""
+        if not values:
+            return cls([], {}, 0)
+        header, *rows = values
+        width = len(header)
+        rows = [list(row[:width]) + [""] * (width - len(row)) for row in rows]
+        # При повторе заголовка побеждает последняя колонка, как в to_records
+        data = {name: _column([row[j] for row in rows]) for j, name in enumerate(header)}
+        return cls(list(data), data, len(rows))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ProductRow(self, i) for i in range(*index.indices(self._size))]
+        index = operator.index(index)
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return ProductRow(self, index)
+
+    def column(self, name: str) -> np.ndarray:
+        """Колонка целиком: float64 для чисел, массив строк для текста."""
+        col = self._columns[name]
+        if isinstance(col, _NumberColumn):
+            return col.values
+        return np.asarray(col.labels, dtype=object)[col.codes]
+
+    @property
+    def nbytes(self) -> int:
+        """Примерный объем данных колонок в байтах."""
+        return sum(col.nbytes for col in self._columns.values())
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+Embedder = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+def product_text(product: dict) -> str:
+    """Текст строки каталога, по которому строится эмбеддинг."""
+    return f"{product.get('Название', '')} {product.get('Группа', '')}".strip()
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingIndex:
+    """
+    Локальный векторный индекс строк каталога.
+    Нормированные эмбеддинги лежат в float32-матрице на диске (memmap),
+    поиск top-k — одно матричное умножение. Вектор строки привязан к хэшу
+    ее текста, поэтому после рестарта и при правках переэмбеддятся только новые тексты.
+    """
+
+    def __init__(self, directory: str, model: str, name: str = "products", batch_size: int = 64):
+        self.directory = directory
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self._matrix_path = os.path.join(directory, f"{name}.f32")
+        self._meta_path = os.path.join(directory, f"{name}.json")
+        self._keys: list[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._source: Optional[list[dict]] = None
+        # Версия каталога, с которой синхронизированы _keys
+        self._version: Optional[str] = None
+        self._lock = asyncio.Lock()
+        # Фоновая синхронизация и каталог, под который она идет
+        self._sync_task: Optional[asyncio.Task] = None
+        self._sync_target: Optional[list[dict]] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _load(self) -> None:
+        if not (os.path.exists(self._meta_path) and os.path.exists(self._matrix_path)):
+            return
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model or not meta.get("keys"):
+            return
+        self._keys = meta["keys"]
+        self._matrix = np.memmap(
+            self._matrix_path, dtype=np.float32, mode="r", shape=(len(self._keys), meta["dim"])
+        )
+
+    def _save(self, keys: list[str], matrix: np.ndarray) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # Пишем во временные файлы и подменяем, чтобы не портить открытый memmap
+        tmp_matrix = f"{self._matrix_path}.tmp"
+        matrix.astype(np.float32).tofile(tmp_matrix)
+        os.replace(tmp_matrix, self._matrix_path)
+        tmp_meta = f"{self._meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": int(matrix.shape[1]), "keys": keys}, f)
+        os.replace(tmp_meta, self._meta_path)
+        self._keys = keys
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r", shape=matrix.shape)
+
+    def ready(self, products: list[dict]) -> bool:
+        """Индекс построен именно по этим строкам каталога (номера строк совпадают)."""
+        return products is self._source
+
+    def sync_in_background(self, products: list[dict], embed: Embedder) -> None:
+        """
+        Запускает sync фоновой задачей, если индекс еще не для этих строк.
+        Эмбеддинг всего каталога занимает секунды — запросы его не ждут.
+        """
+        if self.ready(products) or self._sync_target is products:
+            return
+        self._sync_target = products
+        self._sync_task = asyncio.create_task(self.sync(products, embed))
+        self._sync_task.add_done_callback(self._sync_done)
+
+    def _sync_done(self, task: asyncio.Task) -> None:
+        if task is self._sync_task:
+            self._sync_task = self._sync_target = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Не удалось построить векторный индекс", exc_info=task.exception())
+
+    async def sync(self, products: list[dict], embed: Embedder) -> None:
+        """Приводит индекс к строкам каталога, эмбеддя только отсутствующие тексты."""
+        if products is self._source:
+            return
+        async with self._lock:
+            if products is self._source:
+                return
+            keys = [
+                k if k is not None else _text_key(product_text(products[i]))
+                for i, k in enumerate(self._reused_keys(products))
+            ]
+            if keys == self._keys:
+                self._source = products
+                self._version = getattr(products, "version", None)
+                return
+
+            known = {k: i for i, k in enumerate(self._keys)}
+            missing = [i for i, k in enumerate(keys) if k not in known]
+            if missing:
+                fresh = await self._embed([product_text(products[i]) for i in missing], embed)
+                dim = fresh.shape[1]
+            elif keys:
+                dim = self._matrix.shape[1]
+
+            if keys:
+                matrix = np.empty((len(keys), dim), dtype=np.float32)
+                reused = [i for i, k in enumerate(keys) if k in known]
+                if reused:
+                    matrix[reused] = self._matrix[[known[keys[i]] for i in reused]]
+                if missing:
+                    matrix[missing] = fresh
+                self._save(keys, matrix)
+            else:
+                self._keys, self._matrix = [], None
+            self._source = products
+            self._version = getattr(products, "version", None)
+            logger.debug("Embedding index synced: %s rows, %s embedded", len(keys), len(missing))
+
+    def _reused_keys(self, products: list[dict]) -> list[Optional[str]]:
+        """Ключи строк, не изменившихся с прошлой синхронизации (по диффу снимка); None — посчитать."""
+        changes = getattr(products, "changes", None)
+        if changes is None or self._version is None or changes.base_version != self._version:
+            return [None] * len(products)
+        return [self._keys[j] if j >= 0 else None for j in changes.source.tolist()]
+
+    async def _embed(self, texts: list[str], embed: Embedder) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors = await embed(texts[start:start + self.batch_size])
+            batches.append(np.asarray(vectors, dtype=np.float32))
+        return _normalize(np.vstack(batches))
+
+    def search(self, query: np.ndarray, k: int) -> list[tuple[int, float]]:
+        """Индексы строк и косинусная близость для top-k ближайших."""
+        if self._matrix is None or not len(self._keys) or k <= 0:
+            return []
+        scores = self._matrix @ _normalize(np.asarray(query, dtype=np.float32))
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    async def query(self, text: str, embed: Embedder, k: int) -> list[tuple[int, float]]:
+        vectors = await embed([text])
+        return self.search(np.asarray(vectors[0], dtype=np.float32), k)
+
+    async def query_many(self, texts: list[str], embed: Embedder, k: int) -> list[list[tuple[int, float]]]:
+        """То же, что query, но эмбеддинги запросов считаются пачками."""
+        if not texts:
+            return []
+        vectors = await self._embed(texts, embed)
+        return [self.search(vector, k) for vector in vectors]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
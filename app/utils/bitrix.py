@@ -1,26 +1,163 @@
 import asyncio
+import importlib.util
 import logging
 from typing import Any, Dict, Optional
+from urllib.parse import quote
 
 import httpx
 
+from app.utils.metrics import metrics
+from app.utils.ratelimit import AdaptiveRateLimiter
+
 
 class BitrixClientError(Exception):
     """Ошибки при работе с Bitrix24."""
 
 
+class BitrixThrottled(BitrixClientError):
+    """Bitrix24 ответил QUERY_LIMIT_EXCEEDED: запросы идут чаще лимита портала."""
+
+
 logger = logging.getLogger(__name__)
 
+# Больше команд Bitrix24 в один batch не принимает
+BATCH_LIMIT = 50
+THROTTLE_ERROR = "QUERY_LIMIT_EXCEEDED"
+BATCH_COMMANDS = metrics.histogram(
+    "bitrix_batch_commands",
+    "Команд в одном HTTP-запросе к Bitrix24",
+    buckets=(1, 2, 5, 10, 20, 30, 40, 50),
+)
+
+
+def build_query(params: Any, prefix: str = "") -> str:
+    """
+    Параметры команды в виде query string, как их разбирает PHP
+    (fields[PHONE][0][VALUE]=...) — в таком виде команды передаются в batch.
+    """
+    if isinstance(params, dict):
+        items = params.items()
+    elif isinstance(params, (list, tuple)):
+        items = enumerate(params)
+    else:
+        value = "" if params is None else str(params)
+        return f"{quote(prefix, safe='[]')}={quote(value, safe='')}"
+    parts = [build_query(value, f"{prefix}[{key}]" if prefix else str(key)) for key, value in items]
+    return "&".join(part for part in parts if part)
+
+
+class BitrixBatcher:
+    """
+    Склеивает одиночные вызовы REST в batch-запросы Bitrix24.
+    Команды копятся window секунд или до max_size штук, уходят одним batch,
+    а результат и ошибка каждой команды возвращаются ее вызывающему.
+    """
+
+    def __init__(self, client: "Bitrix24Client", window: float = 0.05, max_size: int = BATCH_LIMIT):
+        self.client = client
+        self.window = window
+        self.max_size = max(1, min(max_size, BATCH_LIMIT))
+        self._pending: list[tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((method, params, future))
+        if len(self._pending) >= self.max_size:
+            self._flush_soon()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_soon)
+        return await future
+
+    def _flush_soon(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        commands, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_soon)
+        task = asyncio.create_task(self._send(commands))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _send(self, commands: list[tuple[str, Dict[str, Any], asyncio.Future]]) -> None:
+        BATCH_COMMANDS.observe(len(commands))
+        try:
+            if len(commands) == 1:
+                # Одна команда — обычный вызов, без обертки batch
+                method, params, future = commands[0]
+                results, errors = {"c0": (await self.client._post(method, params)).get("result")}, {}
+            else:
+                results, errors = await self.client.batch(
+                    {f"c{i}": (method, params) for i, (method, params, _) in enumerate(commands)}
+                )
+        except Exception as exc:
+            for _, _, future in commands:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for i, (method, _, future) in enumerate(commands):
+            if future.done():
+                continue
+            key = f"c{i}"
+            if key in errors:
+                future.set_exception(BitrixClientError(f"{method}: {errors[key]}"))
+            elif key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(BitrixClientError(f"{method}: no result in batch response"))
+
+    async def close(self) -> None:
+        """Отправляет накопленное и дожидается всех batch-запросов."""
+        if self._pending:
+            self._flush_soon()
+        while self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
 
 class Bitrix24Client:
     """Клиент для работы по входящему вебхуку Bitrix24."""
 
-    def __init__(self, base_url: str, retries: int = 3, backoff: float = 0.5):
+    def __init__(
+        self,
+        base_url: str,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        batch_window: float = 0.0,
+        batch_size: int = BATCH_LIMIT,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+    ):
         if not base_url:
             raise ValueError("Bitrix24 base_url is required")
         self.base_url = base_url.rstrip("/")
         self.retries = max(1, retries)
         self.backoff = max(0.0, backoff)
+        # Общий темп всех вызовов вебхука (у портала лимит ~2 запроса/с)
+        self.limiter = limiter
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("Пакет h2 не установлен, Bitrix24 работает по HTTP/1.1")
+            http2 = False
+        # Один пул соединений на все запросы: TCP/TLS-рукопожатие платится один раз
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+        # batch_window > 0 — операции с лидами склеиваются в batch-запросы
+        self.batcher = BitrixBatcher(self, batch_window, batch_size) if batch_window > 0 else None
 
     @classmethod
     def from_settings(cls, settings: Any) -> Optional["Bitrix24Client"]:
@@ -28,38 +165,99 @@ class Bitrix24Client:
         Создает клиент из настроек.
         """
         if settings.BITRIX24_WEBHOOK_URL:
-            return cls(settings.BITRIX24_WEBHOOK_URL)
+            return cls(
+                settings.BITRIX24_WEBHOOK_URL,
+                timeout=settings.BITRIX24_TIMEOUT,
+                connect_timeout=settings.BITRIX24_CONNECT_TIMEOUT,
+                max_connections=settings.BITRIX24_MAX_CONNECTIONS,
+                keepalive_expiry=settings.BITRIX24_KEEPALIVE_EXPIRY,
+                http2=settings.BITRIX24_HTTP2,
+                batch_window=settings.BITRIX24_BATCH_WINDOW,
+                batch_size=settings.BITRIX24_BATCH_SIZE,
+                limiter=AdaptiveRateLimiter(
+                    settings.BITRIX24_RATE_LIMIT,
+                    burst=settings.BITRIX24_RATE_BURST,
+                    name="bitrix24",
+                ) if settings.BITRIX24_RATE_LIMIT > 0 else None,
+            )
 
         return None
 
+    async def close(self) -> None:
+        if self.batcher is not None:
+            await self.batcher.close()
+        await self.client.aclose()
+
     async def create_lead(self, fields: Dict[str, Any]) -> int:
-        response = await self._post("crm.lead.add", {"fields": fields})
-        result = response.get("result")
+        result = await self._call("crm.lead.add", {"fields": fields})
+        if isinstance(result, str) and result.isdigit():
+            result = int(result)
         if not isinstance(result, int):
             raise BitrixClientError("Unexpected response for lead creation")
         return result
 
     async def update_lead(self, lead_id: int, fields: Dict[str, Any]) -> None:
-        await self._post("crm.lead.update", {"ID": lead_id, "fields": fields})
+        await self._call("crm.lead.update", {"ID": lead_id, "fields": fields})
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> Any:
+        """Результат одной команды: через batcher, если он включен, иначе отдельным запросом."""
+        if self.batcher is not None:
+            return await self.batcher.call(method, params)
+        response = await self._post(method, params)
+        return response.get("result")
+
+    async def batch(
+        self, commands: Dict[str, tuple[str, Dict[str, Any]]], halt: bool = False
+    ) -> tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        Выполняет до 50 команд одним запросом batch.
+        Возвращает (результаты, ошибки) по ключам команд.
+        """
+        if len(commands) > BATCH_LIMIT:
+            raise ValueError(f"Bitrix24 batch accepts at most {BATCH_LIMIT} commands")
+        cmd = {key: f"{method}?{build_query(params)}" for key, (method, params) in commands.items()}
+        response = await self._post("batch", {"halt": int(halt), "cmd": cmd})
+        result = response.get("result") or {}
+        # PHP отдает массив с ключами 0..n-1 (и пустой) как JSON-список, а не объект
+        results = _keyed(result.get("result"))
+        errors = {
+            key: f"{error.get('error')}: {error.get('error_description')}" if isinstance(error, dict) else str(error)
+            for key, error in _keyed(result.get("result_error")).items()
+        }
+        # Сам batch прошел, но портал мог отказать отдельным командам по лимиту
+        if self.limiter is not None and any(e.startswith(f"{THROTTLE_ERROR}:") for e in errors.values()):
+            self.limiter.on_throttle()
+        return results, errors
 
     async def _post(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """POST with simple retry/backoff on transport and HTTP errors."""
+        """
+        POST with simple retry/backoff on transport and HTTP errors.
+        Each attempt waits for the rate limiter; on throttling the limiter slows down
+        and paces the retry itself, so no extra backoff sleep.
+        """
         url = f"{self.base_url}/{method}.json"
         delay = self.backoff
         last_exc: Exception | None = None
 
         for attempt in range(1, self.retries + 1):
             try:
-                async with httpx.AsyncClient(timeout=10) as client:
-                    response = await client.post(url, json=payload)
+                if self.limiter is not None:
+                    await self.limiter.acquire()
+                response = await self.client.post(url, json=payload)
+                data = _json_or_none(response)
+                if isinstance(data, dict) and data.get("error") == THROTTLE_ERROR:
+                    if self.limiter is not None:
+                        self.limiter.on_throttle()
+                    raise BitrixThrottled(f"{THROTTLE_ERROR}: {data.get('error_description')}")
                 response.raise_for_status()
-                data = response.json()
                 if isinstance(data, dict) and data.get("error"):
                     raise BitrixClientError(
                         f"{data.get('error')}: {data.get('error_description')}"
                     )
                 if not isinstance(data, dict):
                     raise BitrixClientError("Unexpected response format from Bitrix24")
+                if self.limiter is not None:
+                    self.limiter.on_success()
                 return data
             except (httpx.HTTPError, BitrixClientError) as exc:
                 last_exc = exc
@@ -71,8 +269,51 @@ class Bitrix24Client:
                     self.retries,
                     exc,
                 )
+                if isinstance(exc, BitrixThrottled) and self.limiter is not None:
+                    continue
                 await asyncio.sleep(delay)
                 delay *= 2
 
         raise BitrixClientError(f"Bitrix request failed after {self.retries} attempts") from last_exc
 
+
+
+def _keyed(value: Any) -> Dict[str, Any]:
+    """Результаты batch по ключам команд: список превращается в {"0": ..., "1": ...}."""
+    if isinstance(value, list):
+        return {str(i): item for i, item in enumerate(value)}
+    return value or {}
+
+
+def _json_or_none(response: httpx.Response) -> Any:
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+_client: Optional[Bitrix24Client] = None
+
+
+async def init_bitrix_client(settings: Any) -> Optional[Bitrix24Client]:
+    """Создает общий клиент при старте приложения (None, если вебхук не задан)."""
+    global _client
+    if _client is None:
+        _client = Bitrix24Client.from_settings(settings)
+    return _client
+
+
+async def close_bitrix_client() -> None:
+    """Закрывает пул соединений при остановке приложения."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_bitrix_client() -> Optional[Bitrix24Client]:
+    """
+    Общий клиент (FastAPI dependency). Вне lifespan — None: без запущенного
+    воркера outbox поставленные в очередь операции никто бы не отправил.
+    """
+    return _client
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from app.utils.metrics import metrics
+
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+WAIT_SECONDS = metrics.histogram(
+    "rate_limit_wait_seconds", "Ожидание токена лимитера перед вызовом", labels=("limiter",), buckets=WAIT_BUCKETS,
+)
+THROTTLED = metrics.counter("rate_limit_throttled_total", "Ответы «превышен лимит запросов»", labels=("limiter",))
+RATE = metrics.gauge("rate_limit_rate", "Текущая разрешенная скорость, запросов в секунду", labels=("limiter",))
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket с подстройкой скорости (AIMD): при ответе «слишком часто»
+    скорость делится на decrease, после каждого успешного вызова растет
+    на increase, но не выше исходной. Ожидающие получают токены по очереди.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        min_rate: float = 0.1,
+        decrease: float = 0.5,
+        increase: float = 0.05,
+        cooldown: float = 1.0,
+        name: str = "default",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min(min_rate, rate)
+        self.decrease = decrease
+        self.increase = increase
+        # Одна пачка отказов на один всплеск — скорость режется не чаще раза в cooldown
+        self.cooldown = cooldown
+        self.name = name
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._last_decrease: Optional[float] = None
+        self._lock = asyncio.Lock()
+        RATE.set(rate, limiter=name)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Ждет токен; возвращает время ожидания в секундах."""
+        started = self._clock()
+        async with self._lock:
+            self._refill(self._clock())
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill(self._clock())
+            self._tokens -= 1
+        waited = self._clock() - started
+        WAIT_SECONDS.observe(waited, limiter=self.name)
+        return waited
+
+    def on_throttle(self) -> None:
+        """Сервер ответил, что лимит превышен."""
+        THROTTLED.inc(limiter=self.name)
+        now = self._clock()
+        if self._last_decrease is not None and now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        # Запас токенов сгорает: следующий вызов пойдет уже в новом темпе
+        self._tokens = min(self._tokens, 0.0)
+        RATE.set(self.rate, limiter=self.name)
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            self._refill(self._clock())
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            RATE.set(self.rate, limiter=self.name)
+
@@ -0,0 +1,126 @@
+import asyncio
+import contextvars
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Optional
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых конкурентных вызовов.
+    Пока по ключу идет вызов, остальные ждут его результат, а не запускают свой.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def start(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        context: Optional[contextvars.Context] = None,
+    ) -> asyncio.Task:
+        """
+        Возвращает задачу по ключу, запуская fn, только если ее еще нет.
+        context — в каком контексте идет общий вызов (по умолчанию копия контекста первого вызывающего).
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn(), context=context)
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        context: Optional[contextvars.Context] = None,
+    ) -> Any:
+        # shield: отмена одного ожидающего не отменяет общий вызов для остальных
+        return await asyncio.shield(self.start(key, fn, context))
+
+
+class _Broadcast:
+    """Элементы одного потока, которые раздаются всем подписчикам с самого начала."""
+
+    def __init__(self):
+        self.items: list[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except BaseException as exc:
+            self.error = exc
+            if not isinstance(exc, Exception):
+                raise
+        finally:
+            self.done = True
+            self._notify()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class StreamFlight:
+    """
+    Склейка одинаковых конкурентных потоков: источник по ключу читается один раз,
+    каждый подписчик получает все его элементы с начала, в том числе подключившийся позже.
+    Уход подписчика источник не останавливает.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, _Broadcast] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def stream(
+        self,
+        key: Hashable,
+        fn: Callable[[], AsyncIterator[Any]],
+        context: Optional[contextvars.Context] = None,
+    ) -> AsyncIterator[Any]:
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = self._inflight[key] = _Broadcast()
+            task = asyncio.create_task(broadcast.pump(fn()), context=context)
+            self._tasks.add(task)
+            task.add_done_callback(lambda t: self._forget(key, broadcast, t))
+        async for item in broadcast.follow():
+            yield item
+
+    def _forget(self, key: Hashable, broadcast: _Broadcast, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._inflight.get(key) is broadcast:
+            del self._inflight[key]
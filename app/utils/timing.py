@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from app.utils.metrics import metrics
+
+STAGE_SECONDS = metrics.histogram("ai_stage_seconds", "Время этапов ответа ИИ", labels=("stage",))
+
+# Тайминги текущего запроса: этап -> секунды (повторные замеры этапа суммируются).
+# Задачи и потоки, запущенные из запроса, получают копию контекста с тем же словарем.
+_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("timings", default=None)
+
+
+def start_timing() -> dict[str, float]:
+    """Начинает сбор таймингов для текущего запроса и возвращает их словарь."""
+    timings: dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[dict[str, float]]:
+    """Словарь таймингов текущего запроса (None — тайминги не собираются)."""
+    return _timings.get()
+
+
+def bind_timings(timings: Optional[dict[str, float]]) -> None:
+    """Пишет тайминги текущего контекста в уже начатый словарь (например, из общей задачи)."""
+    _timings.set(timings)
+
+
+def record(name: str, seconds: float) -> None:
+    """Записывает уже измеренную длительность этапа."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Замер этапа по монотонным часам; прерванный ошибкой или отменой этап не пишется."""
+    started = time.perf_counter()
+    yield
+    record(name, time.perf_counter() - started)
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Значение заголовка Server-Timing (длительности в миллисекундах)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -1,6 +1,7 @@
 import asyncio
+import json
 import logging
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any
 
 import httpx
 
@@ -9,6 +10,18 @@ from bot.config import BotConfig
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Перегрузка API (очередь к LLM полна): повтор только добавит нагрузки
+OVERLOAD_STATUSES = (429, 503)
+
+
+class AIBusyError(Exception):
+    """API перегружено и просит повторить позже."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"AI is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
 class APIClient:
     """Клиент для работы с API"""
 
@@ -21,11 +34,19 @@ class APIClient:
         url = f"{self.base_url}{path}"
         delay = self.backoff
         last_exc: Exception | None = None
+        timeout = kwargs.pop("timeout", 10)
 
         for attempt in range(1, self.retries + 1):
             try:
-                async with httpx.AsyncClient(timeout=kwargs.pop("timeout", 10)) as client:
+                async with httpx.AsyncClient(timeout=timeout) as client:
                     response = await client.request(method, url, **kwargs)
+                if response.status_code in OVERLOAD_STATUSES:
+                    logger.warning(
+                        "API is overloaded (%s), retry after %ss",
+                        response.status_code,
+                        response.headers.get("Retry-After", "?"),
+                    )
+                    return response
                 if response.status_code >= 500:
                     raise httpx.HTTPStatusError(
                         f"Server error {response.status_code}", request=response.request, response=response
@@ -121,11 +142,46 @@ class APIClient:
             logger.error("Error getting statistics: %s - %s", response.status_code, response.text)
         return {"total": 0, "active": 0}
 
-    async def get_ai_answer(self, text: str) -> Optional[str]:
+    async def get_ai_answer(self, text: str, telegram_id: Optional[int] = None) -> Optional[str]:
         """Получить ответ от AI"""
-        response = await self._request("post", "/answer", json={"text": text}, timeout=300)
+        response = await self._request(
+            "post", "/answer", json={"text": text, "telegram_id": telegram_id}, timeout=300
+        )
         if response and response.status_code == 200:
             data = response.json()
             return data.get("answer")
         return None
 
+    async def stream_ai_answer(self, text: str, telegram_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Получить ответ от AI потоком (SSE /answer/stream).
+        Отдает токены по мере генерации; при ошибке или обрыве потока без события done
+        бросает httpx.HTTPError, при перегрузке API — AIBusyError.
+        """
+        url = f"{self.base_url}/answer/stream"
+        timeout = httpx.Timeout(300, connect=10)
+        payload = {"text": text, "telegram_id": telegram_id}
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("POST", url, json=payload) as response:
+                if response.status_code in OVERLOAD_STATUSES:
+                    raise AIBusyError(float(response.headers.get("Retry-After", 5)))
+                response.raise_for_status()
+                event = "message"
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[len("data:"):].strip() or "{}")
+                        if event == "error":
+                            if "retry_after" in data:
+                                raise AIBusyError(float(data["retry_after"]))
+                            raise httpx.HTTPError(data.get("detail", "stream error"))
+                        if event == "done":
+                            return
+                        token = data.get("token")
+                        if token:
+                            yield token
+                    elif not line:
+                        event = "message"
+                # Поток закрылся без события done — ответ недописан
+                raise httpx.HTTPError("stream ended without done event")
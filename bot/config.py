@@ -14,6 +14,10 @@ class BotSettings(BaseSettings):
     API_PORT: int = 8000
     API_URL: Optional[str] = None
     WEBAPP_URL: Optional[str] = None
+
+    # ========== AI ==========
+    # Минимальный интервал между правками сообщения при потоковом ответе (сек)
+    AI_STREAM_EDIT_INTERVAL: float = 1.5
     
     # ========== Docker ==========
     DOCKER_ENV: bool = False
@@ -56,3 +60,4 @@ class BotConfig:
     TOKEN: str = settings.BOT_TOKEN
     API_URL: str = settings.API_URL
     WEBAPP_URL: str = settings.WEBAPP_URL
+    AI_STREAM_EDIT_INTERVAL: float = settings.AI_STREAM_EDIT_INTERVAL
@@ -1,11 +1,40 @@
+import asyncio
+import logging
+import time
+
+import httpx
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
-from bot.api_client import APIClient
+from bot.api_client import AIBusyError, APIClient
+from bot.config import BotConfig
 
 router = Router()
 api_client = APIClient()
+logger = logging.getLogger(__name__)
+
+# Лимит длины сообщения в Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+UNAVAILABLE_TEXT = "Извините, сервис временно недоступен. Попробуйте позже."
+BUSY_TEXT = "Сейчас слишком много вопросов. Попробуйте через {seconds} сек."
+INTERRUPTED_TEXT = "\n\n⚠️ Ответ прервался. Попробуйте спросить еще раз."
+
+
+async def _edit(message: Message, text: str) -> float:
+    """
+    Правит сообщение. Возвращает паузу, которую просит Telegram
+    перед следующей правкой (0, если ограничений нет).
+    """
+    try:
+        await message.edit_text(text[:TELEGRAM_MESSAGE_LIMIT])
+    except TelegramRetryAfter as exc:
+        return float(exc.retry_after)
+    except TelegramBadRequest:
+        # message is not modified и подобное — не критично
+        pass
+    return 0.0
 
 
 @router.message(F.text)
@@ -13,21 +42,51 @@ async def handle_text_message(message: Message, state: FSMContext):
     """
     Обработчик сообщений вне контекста бота.
     Если пользователь не находится в состоянии FSM  отправляем в ии.
+    Ответ приходит потоком и дописывается правками одного сообщения.
     """
     # Проверяем находится ли пользователь в состоянии FSM
     current_state = await state.get_state()
-    
+
     # Если пользователь заполняет форму не лезем
     if current_state is not None:
         return
-    
+
     if message.text.startswith('/'):
         return
-    
-    answer = await api_client.get_ai_answer(message.text)
-    
-    if answer:
-        await message.answer(answer)
-    else:
-        await message.answer("Извините, сервис временно недоступен. Попробуйте позже.")
 
+    reply = await message.answer("⏳")
+    text = ""
+    shown = ""
+    # Первую правку делаем сразу, дальше не чаще AI_STREAM_EDIT_INTERVAL
+    next_edit_at = 0.0
+
+    try:
+        async for token in api_client.stream_ai_answer(message.text, message.from_user.id):
+            text += token
+            now = time.monotonic()
+            if now >= next_edit_at and text.strip() and text != shown:
+                pause = await _edit(reply, text)
+                # Правку, отклоненную по flood control, не считаем показанной
+                if not pause:
+                    shown = text
+                next_edit_at = now + max(BotConfig.AI_STREAM_EDIT_INTERVAL, pause)
+    except AIBusyError as exc:
+        # Перегрузку не ретраим через /answer — это только добавит нагрузки
+        if not text.strip():
+            text = BUSY_TEXT.format(seconds=int(exc.retry_after + 0.999))
+        else:
+            text += INTERRUPTED_TEXT
+    except (httpx.HTTPError, ValueError) as exc:
+        logger.warning("AI stream failed: %s", exc)
+        if not text.strip():
+            text = await api_client.get_ai_answer(message.text, message.from_user.id) or UNAVAILABLE_TEXT
+        else:
+            # Обрыв посреди ответа: недописанный текст не должен выглядеть полным
+            text += INTERRUPTED_TEXT
+
+    text = text.strip() or UNAVAILABLE_TEXT
+    if text != shown:
+        pause = await _edit(reply, text)
+        if pause:
+            await asyncio.sleep(pause)
+            await _edit(reply, text)